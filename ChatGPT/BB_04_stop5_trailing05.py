@@ -2,8 +2,13 @@ import time
 import logging
 import os
 from dotenv import load_dotenv
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from telegram_message import send_message_to_telegram
+from price_service import get_price_service
+from position_tracker import get_position_tracker
+from instruments import get_instrument_registry
+from order_entry import OrderEntry
+from metrics import LOOP_LAG, STOP_UPDATES
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -21,27 +26,36 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000)
+session = get_gateway(key, secret)
+
+# Общий снимок цен linear-тикеров (один запрос на все символы)
+price_service = get_price_service(session, category="linear", max_staleness=1.0)
+
+# Позиции из приватного WebSocket
+position_tracker = get_position_tracker(session, key, secret)
+
+# Справочник инструментов: загружается один раз и обновляется в фоне
+instrument_registry = get_instrument_registry(session)
+
+# Ордера входа с приложенным стоп-лоссом
+order_entry = OrderEntry(session, instrument_registry)
 
 
 def get_current_price(symbol):
-    """Получает текущую цену символа."""
+    """Получает текущую цену символа из общего снимка тикеров."""
     try:
-        response = session.get_tickers(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            return float(response["result"]["list"][0]["lastPrice"])
+        return price_service.get_price(symbol)
     except Exception as e:
         logger.error(f"Ошибка получения цены {symbol}: {e}")
     return 0
 
 
 def get_min_qty_and_step(symbol):
-    """Получает минимальное количество и шаг изменения для символа."""
+    """Получает минимальное количество и шаг изменения для символа из справочника инструментов."""
     try:
-        response = session.get_instruments_info(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            instrument = response["result"]["list"][0]
-            return float(instrument["lotSizeFilter"]["minOrderQty"]), float(instrument["lotSizeFilter"]["qtyStep"])
+        instrument = instrument_registry.get(symbol)
+        if instrument:
+            return instrument["minOrderQty"], instrument["qtyStep"]
     except Exception as e:
         logger.error(f"Ошибка получения данных {symbol}: {e}")
     return 1, 1  # Значения по умолчанию
@@ -56,6 +70,8 @@ def round_qty(qty, step):
 def get_position(symbol):
     """Получает текущую открытую позицию."""
     try:
+        if position_tracker.running:
+            return position_tracker.get_position(symbol)
         response = session.get_positions(category="linear", symbol=symbol)
         if response.get("retCode") == 0:
             for position in response["result"]["list"]:
@@ -77,36 +93,13 @@ def open_position_with_stop(symbol, side, dollar_value, stop_loss_percent=5):
         qty = round_qty(dollar_value / entry_price, qty_step)
         qty = max(qty, min_qty)
 
-        # Размещаем рыночный ордер
-        response = session.place_order(
-            category="linear",
-            symbol=symbol,
-            side=side.capitalize(),
-            orderType="Market",
-            qty=str(qty),
-            timeInForce="IOC"
-        )
+        # Размещаем рыночный ордер сразу с первоначальным стоп-лоссом
+        response = order_entry.open(symbol, side, qty, entry_price, stop_loss_percent)
 
         if response.get("retCode") == 0:
-            logger.info(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
+            logger.info(f"Открыта позиция {side} {qty} {symbol} по {entry_price} со стоп-лоссом {stop_loss_percent}%")
             send_message_to_telegram(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
-
-            # Установка первоначального стоп-лосса
-            stop_loss_price = entry_price * (1 - stop_loss_percent / 100) if side == "Buy" else \
-                entry_price * (1 + stop_loss_percent / 100)
-
-            response = session.set_trading_stop(
-                category="linear",
-                symbol=symbol,
-                stopLoss=str(stop_loss_price),
-                side=side.capitalize()
-            )
-
-            if response.get("retCode") == 0:
-                logger.info(f"Установлен стоп-лосс {stop_loss_percent}% для {symbol}")
-                monitor_position(symbol, entry_price, side)
-            else:
-                logger.error(f"Ошибка установки стоп-лосса: {response.get('retMsg')}")
+            monitor_position(symbol, entry_price, side)
         else:
             logger.error(f"Ошибка открытия позиции: {response.get('retMsg')}")
 
@@ -117,7 +110,16 @@ def open_position_with_stop(symbol, side, dollar_value, stop_loss_percent=5):
 def monitor_position(symbol, entry_price, side, move_to_entry_at=1.2, stop_profit_percent=1, trailing_stop_percent=0.5):
     """Мониторинг позиции и установка динамических стопов."""
     try:
+        # Позиция появляется в потоке позиций не сразу после ответа на ордер
+        if not position_tracker.wait_position_opened(symbol, timeout=10):
+            logger.warning(f"Позиция {symbol} не открылась. Мониторинг не запускается.")
+            return
+
+        next_check = time.monotonic()
         while True:
+            # Насколько проверка опоздала относительно расписания (раз в 2 секунды)
+            LOOP_LAG.labels("monitor_position").observe(max(0.0, time.monotonic() - next_check))
+            next_check = time.monotonic() + 2
             position = get_position(symbol)
             if not position:
                 logger.info(f"Позиция {symbol} закрыта. Завершаем мониторинг.")
@@ -125,6 +127,7 @@ def monitor_position(symbol, entry_price, side, move_to_entry_at=1.2, stop_profi
 
             current_price = get_current_price(symbol)
             if current_price <= 0:
+                time.sleep(2)  # Позиция и цена читаются из памяти: без паузы цикл крутился бы вхолостую
                 continue
 
             # Вычисление прибыли в процентах
@@ -147,10 +150,12 @@ def monitor_position(symbol, entry_price, side, move_to_entry_at=1.2, stop_profi
                 )
 
                 if response.get("retCode") == 0:
+                    STOP_UPDATES.labels("ok").inc()
                     logger.info(f"Обновлен стоп-лосс {symbol} на {stop_profit_percent}% прибыли и трейлинг-стоп {trailing_stop_percent}%")
                     send_message_to_telegram(f"Обновлен стоп-лосс {symbol} на {stop_profit_percent}% прибыли и трейлинг-стоп {trailing_stop_percent}%")
                     break
                 else:
+                    STOP_UPDATES.labels("error").inc()
                     logger.error(f"Ошибка обновления стопов: {response.get('retMsg')}")
 
             time.sleep(2)  # Пауза перед следующей проверкой
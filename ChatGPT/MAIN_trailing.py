@@ -1,8 +1,10 @@
 import logging
 import os
 from dotenv import load_dotenv
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from telegram_message import send_message_to_telegram
+from price_service import get_price_service
+from instruments import get_instrument_registry
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -20,19 +22,22 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000)
+session = get_gateway(key, secret)
+
+# Общий снимок цен linear-тикеров (один запрос на все символы)
+price_service = get_price_service(session, category="linear", max_staleness=1.0)
+
+# Справочник инструментов: загружается один раз и обновляется в фоне
+instrument_registry = get_instrument_registry(session)
 
 
 def get_current_price(symbol):
-    """Получение текущей цены символа."""
+    """Получение текущей цены символа из общего снимка тикеров."""
     try:
-        response = session.get_tickers(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            result = response.get("result", {}).get("list", [])
-            for ticker in result:
-                if ticker.get("symbol") == symbol:
-                    return float(ticker.get("lastPrice", 0))
-        logger.error(f"Ошибка получения цены {symbol}: {response.get('retMsg')}")
+        price = price_service.get_price(symbol)
+        if price:
+            return price
+        logger.error(f"Тикер для {symbol} не найден в снимке цен.")
     except Exception as e:
         logger.error(f"Ошибка при получении цены {symbol}: {e}")
     return 0
@@ -89,18 +94,12 @@ def set_trailing_stop(symbol, side, qty, entry_price, retracement_percent):
 
 
 def get_min_qty_and_step(symbol):
-    """Получение минимального количества и шага изменения для символа."""
+    """Получение минимального количества и шага изменения для символа из справочника инструментов."""
     try:
-        response = session.get_instruments_info(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            instruments = response.get("result", {}).get("list", [])
-            for instrument in instruments:
-                if instrument.get("symbol") == symbol:
-                    lot_size_filter = instrument.get("lotSizeFilter", {})
-                    min_qty = float(lot_size_filter.get("minOrderQty", 1))
-                    qty_step = float(lot_size_filter.get("qtyStep", 1))
-                    return min_qty, qty_step
-        logger.error(f"Ошибка получения данных для {symbol}: {response.get('retMsg')}")
+        instrument = instrument_registry.get(symbol)
+        if instrument:
+            return instrument["minOrderQty"], instrument["qtyStep"]
+        logger.error(f"Инструмент {symbol} не найден в справочнике.")
     except Exception as e:
         logger.error(f"Ошибка при получении данных для {symbol}: {e}")
     return 1, 1  # Значения по умолчанию
@@ -2,9 +2,12 @@ import logging
 import os
 import time
 from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
 from dotenv import load_dotenv
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from telegram_message import send_message_to_telegram
+from price_service import get_price_service
+from position_tracker import get_position_tracker
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -13,7 +16,13 @@ logger = logging.getLogger("SmartTrailingStopBot")
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
 
-session = HTTP(api_key=key, api_secret=secret, testnet=False)
+session = get_gateway(key, secret)
+
+# Общий снимок цен linear-тикеров (один запрос на все символы)
+price_service = get_price_service(session, category="linear", max_staleness=1.0)
+
+# Позиции из приватного WebSocket
+position_tracker = get_position_tracker(session, key, secret)
 
 
 class AdvancedTrailingManager:
@@ -71,6 +80,97 @@ class AdvancedTrailingManager:
         return self.best_price * (1 + self.trailing_percent / 100)
 
 
+class BatchTrailingManager:
+    """AdvancedTrailingManager rules for many positions at once, state kept in NumPy arrays."""
+
+    def __init__(self):
+        self.symbols = []
+        self.is_buy = np.zeros(0, dtype=bool)
+        self.entry_price = np.zeros(0)
+        self.activation_percent = np.zeros(0)
+        self.initial_stop_percent = np.zeros(0)
+        self.trailing_percent = np.zeros(0)
+        self.tick_size = np.zeros(0)
+        self.activated = np.zeros(0, dtype=bool)
+        self.best_price = np.zeros(0)
+        self.current_stop = np.zeros(0)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def add(self, symbol, side, entry_price,
+            activation_percent=1,
+            initial_stop_percent=2,
+            trailing_percent=1,
+            tick_size=0):
+        is_buy = side == "Buy"
+        initial_stop = entry_price * (1 - initial_stop_percent / 100) if is_buy else \
+            entry_price * (1 + initial_stop_percent / 100)
+        self.symbols.append(symbol)
+        self.is_buy = np.append(self.is_buy, is_buy)
+        self.entry_price = np.append(self.entry_price, entry_price)
+        self.activation_percent = np.append(self.activation_percent, activation_percent)
+        self.initial_stop_percent = np.append(self.initial_stop_percent, initial_stop_percent)
+        self.trailing_percent = np.append(self.trailing_percent, trailing_percent)
+        self.tick_size = np.append(self.tick_size, tick_size)
+        self.activated = np.append(self.activated, False)
+        self.best_price = np.append(self.best_price, entry_price)
+        self.current_stop = np.append(self.current_stop, initial_stop)
+        return len(self.symbols) - 1
+
+    def remove(self, symbol):
+        keep = np.array([s != symbol for s in self.symbols], dtype=bool)
+        self.symbols = [s for s in self.symbols if s != symbol]
+        for name in ("is_buy", "entry_price", "activation_percent", "initial_stop_percent",
+                     "trailing_percent", "tick_size", "activated", "best_price", "current_stop"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def price_vector(self, prices):
+        """Builds a price array aligned with self.symbols from a {symbol: price} dict (NaN if missing)."""
+        return np.array([prices.get(symbol, np.nan) for symbol in self.symbols], dtype=float)
+
+    def calculate_stops(self, prices):
+        """Applies one price per position and returns the indices whose stop changed.
+
+        Same transitions as AdvancedTrailingManager.calculate_stop; NaN prices are skipped.
+        """
+        prices = np.asarray(prices, dtype=float)
+        valid = ~np.isnan(prices)
+        was_activated = self.activated.copy()
+        old_stop = self.current_stop.copy()
+        buy = self.is_buy
+
+        with np.errstate(invalid="ignore"):
+            activation_price = np.where(buy,
+                                        self.entry_price * (1 + self.activation_percent / 100),
+                                        self.entry_price * (1 - self.activation_percent / 100))
+            hit = valid & ~was_activated & np.where(buy, prices >= activation_price, prices <= activation_price)
+            # Move to breakeven
+            self.activated |= hit
+            self.current_stop[hit] = self.entry_price[hit]
+
+            improved = valid & was_activated & np.where(buy, prices > self.best_price, prices < self.best_price)
+            self.best_price[improved] = prices[improved]
+            trailing_stop = np.where(buy,
+                                     self.best_price * (1 - self.trailing_percent / 100),
+                                     self.best_price * (1 + self.trailing_percent / 100))
+            self.current_stop[improved] = trailing_stop[improved]
+
+            # Before activation the best price simply follows the market
+            waiting = valid & ~was_activated & ~hit & (prices != self.best_price)
+            self.best_price[waiting] = prices[waiting]
+
+        return np.flatnonzero(self.current_stop != old_stop)
+
+    def rounded_stop(self, index):
+        """Decimal-exact stop for output: rounded to the position tick size (4 digits if unknown)."""
+        tick = self.tick_size[index]
+        if tick > 0:
+            tick = Decimal(str(tick))
+            return float((Decimal(str(self.current_stop[index])) / tick).quantize(Decimal(1), rounding=ROUND_HALF_UP) * tick)
+        return round_float_to_precision(self.current_stop[index])
+
+
 def monitor_and_update_stop(symbol, side, entry_price):
     manager = AdvancedTrailingManager(
         symbol=symbol,
@@ -81,6 +181,11 @@ def monitor_and_update_stop(symbol, side, entry_price):
         trailing_percent=1
     )
 
+    # Позиция появляется в потоке позиций не сразу после ответа на ордер
+    if not position_tracker.wait_position_opened(symbol, timeout=10):
+        logger.warning(f"Position {symbol} did not open, monitoring is not started")
+        return
+
     logger.info(f"Initial stop set at: {manager.current_stop}")
     send_message_to_telegram(f"🚀 Initial stop set at {manager.current_stop:.4f}")
 
@@ -108,8 +213,7 @@ def monitor_and_update_stop(symbol, side, entry_price):
 
 def get_current_price(symbol):
     try:
-        response = session.get_tickers(category="linear", symbol=symbol)
-        return float(response['result']['list'][0]['lastPrice'])
+        return price_service.get_price(symbol) or None
     except Exception as e:
         logger.error(f"Price check error: {e}")
         return None
@@ -117,6 +221,8 @@ def get_current_price(symbol):
 
 def get_position_info(symbol):
     try:
+        if position_tracker.running:
+            return position_tracker.get_position(symbol)
         response = session.get_positions(category="linear", symbol=symbol)
         positions = [p for p in response['result']['list'] if p['symbol'] == symbol]
         return positions[0] if positions else None
@@ -2,8 +2,12 @@ import time
 import logging
 import os
 from dotenv import load_dotenv
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from telegram_message import send_message_to_telegram
+from price_service import get_price_service
+from position_tracker import get_position_tracker
+from instruments import get_instrument_registry
+from order_entry import OrderEntry
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -21,27 +25,36 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000)
+session = get_gateway(key, secret)
+
+# Общий снимок цен linear-тикеров (один запрос на все символы)
+price_service = get_price_service(session, category="linear", max_staleness=1.0)
+
+# Позиции из приватного WebSocket
+position_tracker = get_position_tracker(session, key, secret)
+
+# Справочник инструментов: загружается один раз и обновляется в фоне
+instrument_registry = get_instrument_registry(session)
+
+# Ордера входа с приложенным стоп-лоссом
+order_entry = OrderEntry(session, instrument_registry)
 
 
 def get_current_price(symbol):
-    """Получает текущую цену символа."""
+    """Получает текущую цену символа из общего снимка тикеров."""
     try:
-        response = session.get_tickers(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            return float(response["result"]["list"][0]["lastPrice"])
+        return price_service.get_price(symbol)
     except Exception as e:
         logger.error(f"Ошибка получения цены {symbol}: {e}")
     return 0
 
 
 def get_min_qty_and_step(symbol):
-    """Получает минимальное количество и шаг изменения для символа."""
+    """Получает минимальное количество и шаг изменения для символа из справочника инструментов."""
     try:
-        response = session.get_instruments_info(category="linear", symbol=symbol)
-        if response.get("retCode") == 0:
-            instrument = response["result"]["list"][0]
-            return float(instrument["lotSizeFilter"]["minOrderQty"]), float(instrument["lotSizeFilter"]["qtyStep"])
+        instrument = instrument_registry.get(symbol)
+        if instrument:
+            return instrument["minOrderQty"], instrument["qtyStep"]
     except Exception as e:
         logger.error(f"Ошибка получения данных {symbol}: {e}")
     return 1, 1  # Значения по умолчанию
@@ -52,18 +65,13 @@ def round_qty(qty, step):
     return round(qty - (qty % step), len(str(step).split('.')[1]))
 
 
-def get_position(symbol):
-    """Получает текущую открытую позицию и ждет обновления в API."""
+def get_position(symbol, timeout=10):
+    """Получает текущую открытую позицию, ожидая ее появления не дольше timeout секунд."""
     try:
-        for _ in range(5):  # Пытаемся 5 раз получить данные (с задержкой)
-            response = session.get_positions(category="linear", symbol=symbol)
-            if response.get("retCode") == 0:
-                positions = response["result"]["list"]
-                for position in positions:
-                    if float(position["size"]) > 0:
-                        logger.info(f"Позиция найдена: {position}")
-                        return position
-            time.sleep(2)  # Ждем обновления API
+        position = position_tracker.wait_position_opened(symbol, timeout)
+        if position:
+            logger.debug(f"Позиция найдена: {position}")
+            return position
     except Exception as e:
         logger.error(f"Ошибка получения позиции {symbol}: {e}")
     return None
@@ -80,52 +88,22 @@ def open_position_manage(symbol, side, dollar_value, trailing_stop_percent=2):
         qty = round_qty(dollar_value / entry_price, qty_step)
         qty = max(qty, min_qty)
 
-        response = session.place_order(
-            category="linear",
-            symbol=symbol,
-            side=side.capitalize(),
-            orderType="Market",
-            qty=str(qty),
-            timeInForce="IOC"
-        )
+        # Стоп-лосс на расстоянии трейлинг-стопа приложен к ордеру, трейлинг-стоп — следующим запросом
+        response = order_entry.open(symbol, side, qty, entry_price, trailing_stop_percent=trailing_stop_percent)
 
         if response.get("retCode") == 0:
             logger.info(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
             send_message_to_telegram(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
-            set_trailing_stop(symbol, side, entry_price, trailing_stop_percent)
         else:
             logger.error(f"Ошибка открытия позиции: {response.get('retMsg')}")
     except Exception as e:
         logger.error(f"Ошибка при открытии позиции: {e}")
 
 
-def set_trailing_stop(symbol, side, entry_price, trailing_stop_percent):
-    """Устанавливает трейлинг-стоп."""
-    try:
-        trailing_stop_value = entry_price * (trailing_stop_percent / 100)
-        trigger_direction = 2 if side == "Buy" else 1
-
-        response = session.set_trading_stop(
-            category="linear",
-            symbol=symbol,
-            side=side.capitalize(),
-            trailingStop=str(trailing_stop_value),
-            triggerDirection=trigger_direction
-        )
-
-        if response.get("retCode") == 0:
-            logger.info(f"Установлен трейлинг-стоп {trailing_stop_percent}% для {symbol}")
-        else:
-            logger.error(f"Ошибка установки трейлинг-стопа: {response.get('retMsg')}")
-    except Exception as e:
-        logger.error(f"Ошибка установки трейлинг-стопа: {e}")
-
-
 def update_trailing_stop(symbol, move_to_entry_at=1, follow_distance=1):
     """Обновляет трейлинг-стоп только при росте прибыли на 1% и корректно работает для Buy и Sell."""
     try:
-        time.sleep(2)  # Ждем обновления позиции в API
-        position = get_position(symbol)
+        position = get_position(symbol)  # Ждем появления позиции в потоке позиций
         if not position:
             logger.warning(f"Нет открытой позиции по {symbol}, трейлинг-стоп не обновляется.")
             return
@@ -143,7 +121,7 @@ def update_trailing_stop(symbol, move_to_entry_at=1, follow_distance=1):
         logger.info(f"Мониторинг трейлинг-стопа {symbol}, вход: {entry_price}")
 
         while True:
-            position = get_position(symbol)  # Проверяем, открыта ли позиция
+            position = get_position(symbol, timeout=0)  # Проверяем, открыта ли позиция
             if not position:
                 logger.info(f"Позиция {symbol} закрыта. Остановка трейлинг-стопа.")
                 break  # Выход из цикла, если позиция закрыта
@@ -151,6 +129,7 @@ def update_trailing_stop(symbol, move_to_entry_at=1, follow_distance=1):
             current_price = get_current_price(symbol)
             if current_price <= 0:
                 logger.warning(f"Не удалось получить цену {symbol}")
+                time.sleep(5)  # Позиция и цена читаются из памяти: без паузы цикл крутился бы вхолостую
                 continue
 
             # Вычисляем процент прибыли
@@ -170,9 +149,11 @@ def update_trailing_stop(symbol, move_to_entry_at=1, follow_distance=1):
                 if last_stop_price is not None:
                     if side == "Buy" and new_stop_price <= last_stop_price:
                         logger.warning(f"Пропущено обновление трейлинг-стопа: {new_stop_price} ниже предыдущего {last_stop_price}")
+                        time.sleep(5)
                         continue
                     if side == "Sell" and new_stop_price >= last_stop_price:
                         logger.warning(f"Пропущено обновление трейлинг-стопа: {new_stop_price} выше предыдущего {last_stop_price}")
+                        time.sleep(5)
                         continue
 
                 # Устанавливаем трейлинг-стоп
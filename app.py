@@ -1,15 +1,26 @@
-from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from flask import Flask, Response, request, jsonify
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
-from threading import Thread
-from datetime import datetime, timedelta
+from datetime import timedelta
 # from open_order_tekprofit_stoploss import open_position_with_protection
-from ChatGPT.test_trailing_stop import open_position_manage, update_trailing_stop
+from ChatGPT.test_trailing_stop import open_position_manage
+from orderbook_stream import OrderBookStream
+from position_tracker import get_position_tracker
+from instruments import get_instrument_registry
+from trailing_engine import TrailingStopEngine
+from watch_scheduler import WatchScheduler
+from orderbook_features import FeatureStage
+from signal_confirmation import SignalConfirmation
+from orderbook_recorder import OrderBookRecorder
+from event_journal import EventJournal, JOURNAL_DIR
+from clock_sync import get_clock_sync
+from latency_trace import get_latency_trace
+from metrics import SIGNALS, registry as metrics_registry
+from telegram_message import send_message_to_telegram
 
 # Параметры для открытия ордера
 dollar_value = 6
@@ -17,6 +28,11 @@ retracement_percent = 1
 # stop_loss_percent = 1
 # take_profit_percent = 1
 
+# Подтверждение сигнала: дисбаланс должен быть в 3 из 5 последних оценок книги
+confirm_k = 3
+confirm_n = 5
+confirm_duration = 0  # Или дисбаланс держится столько секунд подряд (0 — только k из n)
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -34,9 +50,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # API-ключи
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -46,35 +59,48 @@ if not key or not secret:
     exit(1)
 
 # Сессия API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=10000)
+session = get_gateway(key, secret)
 
-# Глобальный флаг состояния сделки
-is_trade_open = False
+# Локальные книги ордеров из WebSocket
+order_book_stream = OrderBookStream(category="linear", depth=50)
+
+# Признаки книг (дисбалансы, микроцена, спред, z-score), пересчитываемые на каждое обновление
+feature_stage = FeatureStage(order_book_stream, levels=10, band_bps=10)
 
+# Запись книг для последующего разбора сигналов (включается переменной ORDERBOOK_RECORD_DIR)
+record_dir = os.getenv("ORDERBOOK_RECORD_DIR")
+recorder = OrderBookRecorder(order_book_stream, root=record_dir).start() if record_dir else None
 
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            requests.post(url, json=payload).raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+# Журнал событий стратегии для разбора сделок (каталог можно задать переменной EVENT_JOURNAL_DIR)
+journal = EventJournal(os.getenv("EVENT_JOURNAL_DIR", JOURNAL_DIR)).start()
 
+# Позиции из приватного WebSocket
+position_tracker = get_position_tracker(session, key, secret)
 
-# Форматирование книги ордеров
-def format_order_book(response):
-    bids = response.get('b', [])
-    asks = response.get('a', [])
-    return bids, asks
+# Трейлинг-стопы всех открытых позиций
+trailing_engine = TrailingStopEngine(session, position_tracker, get_instrument_registry(session))
+
+# Подтверждение сигналов по последним обновлениям книги
+signal_confirmation = SignalConfirmation(k=confirm_k, n=confirm_n, duration=confirm_duration)
+
+# Время этапов от вебхука до ордера и стопа
+latency_trace = get_latency_trace()
+
+# Глобальный флаг состояния сделки
+is_trade_open = False
 
 
 # Функция проверки закрытия позиции
 def is_position_closed(symbol):
     global is_trade_open
     try:
+        # Позиции из приватного WebSocket; REST — только если поток недоступен
+        if position_tracker.running:
+            if position_tracker.is_open(symbol):
+                return False
+            logger.info(f"Позиция для {symbol} закрыта.")
+            return True
+
         # Получаем позиции через API
         response = session.get_positions(
             category="linear",
@@ -91,7 +117,7 @@ def is_position_closed(symbol):
         if isinstance(positions, list):  # Если позиции представлены списком
             for position in positions:
                 if position.get('symbol') == symbol and float(position.get('size', 0)) > 0:
-                    logger.info(f"Позиция для {symbol} все еще открыта: {position}")
+                    logger.debug("Позиция для %s все еще открыта: %s", symbol, position)
                     return False  # Позиция все еще открыта
         else:
             logger.error(f"Неверный формат данных позиций: {positions}")
@@ -105,75 +131,97 @@ def is_position_closed(symbol):
         return False
 
 
-# Основной анализ
-def analyze_order_book(symbol):
+# Анализ книги ордеров: вызывается планировщиком на каждое обновление книги
+def evaluate_order_book(symbol, book):
+    global is_trade_open
+    if is_trade_open:
+        return  # Новые сигналы не обрабатываются, пока сделка открыта
+
+    bid_percentage, ask_percentage = book.percentages()
+    latency_trace.mark(symbol, "first_book_read")
+
+    if bid_percentage > 85:
+        side = "Sell"
+    elif ask_percentage > 85:
+        side = "Buy"
+    else:
+        side = None
+
+    # Каждая оценка — запись фиксированного размера в журнале; текст лога формируется, только если включен DEBUG
+    journal.record(symbol, "evaluate", side, bid_percentage, ask_percentage, ts=book.ts)
+    logger.debug("Символ: %s, Биды: %.2f%%, Аски: %.2f%%, признаки: %s",
+                 symbol, bid_percentage, ask_percentage, feature_stage.get(symbol))
+
+    # Один снимок с перекосом не открывает сделку: сигнал должен продержаться
+    if signal_confirmation.update(symbol, side, book.ts) is None:
+        return
+    signal_confirmation.reset(symbol)
+    latency_trace.mark(symbol, "signal")
+    journal.record(symbol, "signal", side, bid_percentage, ask_percentage, ts=book.ts)
+    SIGNALS.labels(side).inc()
+    is_trade_open = True
+    if side == "Sell":
+        watch_scheduler.submit(trade_position, symbol, side, f"Биды превышают 85% для {symbol}. Открытие позиции SELL.")
+    else:
+        watch_scheduler.submit(trade_position, symbol, side, f"Аски превышают 85% для {symbol}. Открытие позиции BUY.")
+
+
+# Завершение наблюдения за символом
+def finish_analysis(symbol):
+    journal.record(symbol, "watch_end")
+    latency_trace.end(symbol)
+    feature_stage.remove(symbol)
+    signal_confirmation.reset(symbol)
+    logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
+    send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
+
+
+# Сделка в пуле планировщика: открытие, сопровождение и ожидание закрытия позиции
+def trade_position(symbol, side, message):
     global is_trade_open
-    end_time = datetime.now() + timedelta(hours=1)
-    logger.info(f"Начат анализ для символа {symbol}. Время окончания: {end_time}")
-    send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
-
     try:
-        while datetime.now() < end_time:
-            if is_trade_open:
-                logger.info("Ожидание закрытия позиции.")
-                while not is_position_closed(symbol):
-                    time.sleep(5)  # Ждём 10 секунд перед повторной проверкой
-                is_trade_open = False
-                logger.info("Позиция закрыта. Анализ продолжается.")
-
-            response = session.get_orderbook(
-                category="linear",
-                symbol=symbol,
-                limit=50
-            ).get('result')
-
-            if not response:
-                raise ValueError(f"Нет данных для символа {symbol}.")
-
-            bids, asks = format_order_book(response)
-
-            bid_volumes = [float(bid[1]) for bid in bids if len(bid) > 1]
-            ask_volumes = [float(ask[1]) for ask in asks if len(ask) > 1]
-
-            total_bid_volume = sum(bid_volumes)
-            total_ask_volume = sum(ask_volumes)
-
-            bid_percentage = (total_bid_volume / (
-                        total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
-            ask_percentage = (total_ask_volume / (
-                        total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
+        send_message_to_telegram(message)
+        open_position(symbol, side)
 
-            logger.info(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
-
-            if bid_percentage > 85:
-                send_message_to_telegram(f"Биды превышают 85% для {symbol}. Открытие позиции SELL.")
-                open_position(symbol, "Sell")
-                is_trade_open = True
-            elif ask_percentage > 85:
-                send_message_to_telegram(f"Аски превышают 85% для {symbol}. Открытие позиции BUY.")
-                open_position(symbol, "Buy")
-                is_trade_open = True
-
-            time.sleep(5)
-
-        logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
-        send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
-
-    except Exception as e:
-        logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
-        send_message_to_telegram(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
+        logger.info("Ожидание закрытия позиции.")
+        while not is_position_closed(symbol):
+            position_tracker.wait_position_closed(symbol, timeout=5)
+        # Закрытие могло быть замечено опросом REST, без события приватного потока
+        trailing_engine.remove_position(symbol)
+        journal.record(symbol, "position_closed", side)
+        logger.info("Позиция закрыта. Анализ продолжается.")
+    finally:
+        latency_trace.finish_trade(symbol)
+        is_trade_open = False
 
 
 # Функция открытия позиции
 def open_position(symbol, side):
     try:
+        journal.record(symbol, "order", side)
         open_position_manage(symbol, side, dollar_value, retracement_percent)
-        update_trailing_stop(symbol, move_to_entry_at=1, follow_distance=1)
+        # Одна запись об открытии с ценой входа и размером, когда биржа подтвердила позицию
+        position = position_tracker.wait_position_opened(symbol, timeout=10)
+        if position:
+            journal.record(symbol, "position_open", position.get("side"),
+                           price=float(position.get("avgPrice") or 0), size=float(position.get("size") or 0))
+        # Трейлинг-стоп ведет общий движок по тикам цены, поток не блокируется
+        trailing_engine.add_position(symbol, move_to_entry_at=1, follow_distance=1)
         logger.info(f"Позиция {side} для {symbol} успешно открыта.")
     except Exception as e:
         logger.error(f"Ошибка при открытии позиции для {symbol}: {e}")
 
 
+# Планировщик наблюдений: один диспетчер на все символы и пул для сделок
+watch_scheduler = WatchScheduler(
+    order_book_stream,
+    evaluate=evaluate_order_book,
+    on_expire=finish_analysis,
+    duration=timedelta(hours=1),
+    max_workers=4
+)
+
+
 # Вебхук для получения символа
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -187,14 +235,57 @@ def webhook():
         symbol = data.upper()
         logger.info(f'Получен символ из вебхука: {symbol}')
 
-        Thread(target=analyze_order_book, args=(symbol,)).start()
+        if symbol not in watch_scheduler.watches:
+            latency_trace.begin(symbol)
 
-        return jsonify({'status': 'success', 'symbol': symbol}), 200
+        # Повторный вебхук по тому же символу только продлевает наблюдение
+        if watch_scheduler.watch(symbol):
+            latency_trace.mark(symbol, "watch_started")
+            journal.record(symbol, "watch_start")
+            end_time = watch_scheduler.watches[symbol]["expires_at"]
+            logger.info(f"Начат анализ для символа {symbol}. Время окончания: {end_time}")
+            send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
+
+        return jsonify({'status': 'success', 'symbol': symbol, 'watching': watch_scheduler.watched_count()}), 200
     except Exception as e:
         logger.error(f"Ошибка в обработке вебхука: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+# Состояние наблюдений: число символов и задержка по каждому
+@app.route('/watches', methods=['GET'])
+def watches():
+    return jsonify({
+        'watching': watch_scheduler.watched_count(),
+        'symbols': watch_scheduler.stats(),
+        'features': {symbol: feature_stage.get(symbol) for symbol in watch_scheduler.watches},
+    }), 200
+
+
+# Очередь запросов к Bybit и ожидания из-за лимитов
+@app.route('/gateway', methods=['GET'])
+def gateway():
+    return jsonify(session.stats()), 200
+
+
+# Время от вебхука до каждого этапа: p50/p95/p99, мс
+@app.route('/latency', methods=['GET'])
+def latency():
+    return jsonify(latency_trace.percentiles()), 200
+
+
+# Метрики в текстовом формате Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Смещение часов относительно сервера Bybit
+@app.route('/clock', methods=['GET'])
+def clock():
+    return jsonify(get_clock_sync().metrics()), 200
+
+
 if __name__ == "__main__":
     public_url = ngrok.connect(5000, bind_tls=True).public_url
     webhook_url = f"{public_url}/webhook"
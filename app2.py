@@ -1,16 +1,17 @@
 from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
 from threading import Thread
 from datetime import datetime, timedelta
+from orderbook_stream import OrderBookStream
 # from open_order_tekprofit_stoploss import open_position_with_protection
 # from ChatGPT.test_trailing_stop import open_position_manage, update_trailing_stop
 from ChatGPT.BB_04_stop5_trailing05 import open_position_with_stop
+from telegram_message import send_message_to_telegram
 
 # Параметры для открытия ордера
 dollar_value = 21
@@ -35,9 +36,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # API-ключи
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -47,31 +45,15 @@ if not key or not secret:
     exit(1)
 
 # Сессия API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=10000)
+session = get_gateway(key, secret)
+
+# Локальные книги ордеров из WebSocket
+order_book_stream = OrderBookStream(category="linear", depth=50)
 
 # Глобальный флаг состояния сделки
 is_trade_open = False
 
 
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            requests.post(url, json=payload).raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
-
-
-# Форматирование книги ордеров
-def format_order_book(response):
-    bids = response.get('b', [])
-    asks = response.get('a', [])
-    return bids, asks
-
-
 # Функция проверки закрытия позиции
 def is_position_closed(symbol):
     global is_trade_open
@@ -114,6 +96,11 @@ def analyze_order_book(symbol):
     logger.info(f"Начат анализ для символа {symbol}. Время окончания: {end_time}")
     send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
 
+    # Книга обновляется из WebSocket, условие проверяется на каждом delta
+    book = order_book_stream.subscribe(symbol)
+    version = 0
+    last_signal = None  # Уведомляем только при смене сигнала, а не на каждом delta
+
     try:
         while datetime.now() < end_time:
             if is_trade_open:
@@ -123,41 +110,28 @@ def analyze_order_book(symbol):
                 is_trade_open = False
                 logger.info("Позиция закрыта. Анализ продолжается.")
 
-            response = session.get_orderbook(
-                category="linear",
-                symbol=symbol,
-                limit=50
-            ).get('result')
-
-            if not response:
-                raise ValueError(f"Нет данных для символа {symbol}.")
-
-            bids, asks = format_order_book(response)
+            version = book.wait_update(version, timeout=5)
+            if not book.ready:
+                continue  # Книга еще не получена или ждет нового snapshot
 
-            bid_volumes = [float(bid[1]) for bid in bids if len(bid) > 1]
-            ask_volumes = [float(ask[1]) for ask in asks if len(ask) > 1]
+            bid_percentage, ask_percentage = book.percentages()
 
-            total_bid_volume = sum(bid_volumes)
-            total_ask_volume = sum(ask_volumes)
+            logger.debug(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
 
-            bid_percentage = (total_bid_volume / (
-                        total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
-            ask_percentage = (total_ask_volume / (
-                        total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
+            signal = "Sell" if bid_percentage > 70 else "Buy" if ask_percentage > 70 else None
+            if signal == last_signal:
+                continue
+            last_signal = signal
 
-            logger.info(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
-
-            if bid_percentage > 70:
+            if signal == "Sell":
                 send_message_to_telegram(f"Биды {bid_percentage} для {symbol}. Открытие позиции SELL.")
                 # open_position(symbol, "Sell")
                 # is_trade_open = True
-            elif ask_percentage > 70:
+            elif signal == "Buy":
                 send_message_to_telegram(f"Аски {ask_percentage} для {symbol}. Открытие позиции BUY.")
                 # open_position(symbol, "Buy")
                 # is_trade_open = True
 
-            time.sleep(5)
-
         logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
         send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
 
@@ -165,6 +139,9 @@ def analyze_order_book(symbol):
         logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
         send_message_to_telegram(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
 
+    finally:
+        order_book_stream.unsubscribe(symbol)
+
 
 # Функция открытия позиции
 def open_position(symbol, side):
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+from async_ws import AsyncBybitWebSocket
+from bybit_rest import BASE_URL, sign_headers
+from clock_sync import get_clock_sync
+from position_tracker import PositionTracker
+
+# Настройка логирования
+logger = logging.getLogger("AsyncBybit")
+
+
+class AsyncBybitClient:
+    """REST API Bybit v5 поверх общего httpx.AsyncClient (пул соединений keep-alive).
+
+    Ответы возвращаются в том же виде, что и у pybit: словарь с retCode, retMsg и result.
+    """
+
+    def __init__(self, api_key, api_secret, recv_window=5000, base_url=BASE_URL, max_connections=20):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.recv_window = recv_window
+        self.clock = get_clock_sync()
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=10,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _headers(self, payload):
+        return sign_headers(self.api_key, self.api_secret, self.recv_window, self.clock.now_ms(), payload)
+
+    async def request(self, method, path, params=None, auth=False):
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if method == "GET":
+            payload = urlencode(params)
+            url = f"{path}?{payload}" if payload else path
+            headers = self._headers(payload) if auth else None
+            response = await self._client.get(url, headers=headers)
+        else:
+            payload = json.dumps(params)
+            headers = self._headers(payload) if auth else {"Content-Type": "application/json"}
+            response = await self._client.post(path, content=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_tickers(self, **params):
+        return await self.request("GET", "/v5/market/tickers", params)
+
+    async def get_instruments_info(self, **params):
+        return await self.request("GET", "/v5/market/instruments-info", params)
+
+    async def get_orderbook(self, **params):
+        return await self.request("GET", "/v5/market/orderbook", params)
+
+    async def get_positions(self, **params):
+        return await self.request("GET", "/v5/position/list", params, auth=True)
+
+    async def place_order(self, **params):
+        return await self.request("POST", "/v5/order/create", params, auth=True)
+
+    async def cancel_all_orders(self, **params):
+        return await self.request("POST", "/v5/order/cancel-all", params, auth=True)
+
+    async def set_trading_stop(self, **params):
+        return await self.request("POST", "/v5/position/trading-stop", params, auth=True)
+
+
+class AsyncPositionTracker(PositionTracker):
+    """PositionTracker для цикла событий: приватный WebSocket и REST без потоков."""
+
+    def __init__(self, client, api_key, api_secret, category="linear", settle_coin="USDT", poll_interval=5):
+        super().__init__(client, api_key, api_secret, category, settle_coin, poll_interval, ws_class=AsyncBybitWebSocket)
+        self._changed = asyncio.Event()
+        self.add_listener(lambda topic, data: self._changed.set())
+
+    def start(self):
+        """Подписывается на приватные топики и загружает позиции через REST в фоне."""
+        self._ws.subscribe([f"position.{self.category}", f"order.{self.category}", f"execution.{self.category}"])
+        self._ws.start()
+        asyncio.get_running_loop().create_task(self._safe_refresh())
+        return self
+
+    async def refresh(self, symbol=None):
+        params = {"category": self.category}
+        if symbol:
+            params["symbol"] = symbol
+        else:
+            params["settleCoin"] = self.settle_coin
+        response = await self.session.get_positions(**params)
+        if response.get("retCode") != 0:
+            logger.error(f"Ошибка получения позиций: {response.get('retMsg')}")
+            return
+        with self._cond:
+            if symbol:
+                for key in [key for key in self.positions if key[0] == symbol]:
+                    del self.positions[key]
+            else:
+                self.positions.clear()
+            for position in response.get("result", {}).get("list", []):
+                self._store_position(position)
+        self._changed.set()
+
+    async def wait_position_opened(self, symbol, timeout=10):
+        return await self._wait(symbol, lambda: self._find_open(symbol), timeout)
+
+    async def wait_position_closed(self, symbol, timeout=None):
+        return await self._wait(symbol, lambda: self._find_open(symbol) is None, timeout)
+
+    async def _wait(self, symbol, predicate, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if not self.running:
+                # Без WebSocket состояние обновляется опросом REST
+                try:
+                    await self.refresh(symbol)
+                except Exception as e:
+                    logger.error(f"Ошибка получения позиции {symbol}: {e}")
+            result = predicate()
+            if result:
+                return result
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return result
+            wait_time = min(self.poll_interval, remaining or self.poll_interval)
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), wait_time)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_reconnect(self):
+        # За время разрыва могли быть пропущены события — перечитываем позиции
+        asyncio.get_running_loop().create_task(self._safe_refresh())
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления позиций после переподключения: {e}")
@@ -0,0 +1,239 @@
+from quart import Quart, request, jsonify
+from dotenv import load_dotenv
+from pyngrok import ngrok
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from async_bybit import AsyncBybitClient, AsyncPositionTracker
+from async_ws import AsyncBybitWebSocket
+from bybit_gateway import get_gateway
+from instruments import format_price, get_instrument_registry, round_qty
+from orderbook_stream import OrderBookStream
+from telegram_message import send_message_to_telegram
+
+# Параметры для открытия ордера
+dollar_value = 6
+retracement_percent = 1  # Трейлинг-стоп, % от цены входа
+activation_percent = 1  # Трейлинг-стоп включается при такой прибыли, %
+analysis_duration = timedelta(hours=1)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Настройка приложения Quart: вебхук и анализ книг выполняются в одном цикле событий
+app = Quart(__name__)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# API-ключи
+key = os.getenv("API_KEY")
+secret = os.getenv("API_SECRET")
+
+if not key or not secret:
+    logger.error("API_KEY или API_SECRET не заданы. Проверьте файл .env.")
+    exit(1)
+
+# Асинхронный клиент REST API с пулом соединений
+client = AsyncBybitClient(key, secret)
+
+# Локальные книги ордеров и позиции из WebSocket, обслуживаемые циклом событий
+order_book_stream = OrderBookStream(category="linear", depth=50, ws_class=AsyncBybitWebSocket)
+position_tracker = AsyncPositionTracker(client, key, secret)
+
+# Наблюдения: символ -> {"task", "event", "expires_at", "updates"}
+watches = {}
+
+# Справочник инструментов (общий с синхронными модулями): загружается один раз и обновляется в фоне
+instrument_registry = get_instrument_registry(get_gateway(key, secret))
+
+# Глобальный флаг состояния сделки
+is_trade_open = False
+
+
+@app.before_serving
+async def startup():
+    order_book_stream.add_listener(on_book_update)
+    position_tracker.start()
+
+
+@app.after_serving
+async def shutdown():
+    for watch in list(watches.values()):
+        watch["task"].cancel()
+    await client.aclose()
+
+
+# Обновление книги: будим корутину анализа символа (несколько обновлений сливаются в одно)
+def on_book_update(symbol, book, message):
+    watch = watches.get(symbol)
+    if watch:
+        watch["event"].set()
+
+
+# Анализ книги ордеров символа до истечения срока наблюдения
+async def analyze_order_book(symbol):
+    global is_trade_open
+    watch = watches[symbol]
+    book = order_book_stream.subscribe(symbol)
+    try:
+        while True:
+            remaining = (watch["expires_at"] - datetime.now()).total_seconds()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(watch["event"].wait(), remaining)
+            except asyncio.TimeoutError:
+                continue
+            watch["event"].clear()
+
+            if is_trade_open or not book.ready:
+                continue  # Новые сигналы не обрабатываются, пока сделка открыта
+
+            watch["updates"] += 1
+            bid_percentage, ask_percentage = book.percentages()
+            logger.debug(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
+
+            if bid_percentage > 85:
+                await trade_position(symbol, "Sell", f"Биды превышают 85% для {symbol}. Открытие позиции SELL.")
+            elif ask_percentage > 85:
+                await trade_position(symbol, "Buy", f"Аски превышают 85% для {symbol}. Открытие позиции BUY.")
+
+        logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
+        send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
+    except Exception as e:
+        logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
+    finally:
+        watches.pop(symbol, None)
+        order_book_stream.unsubscribe(symbol)
+
+
+# Сделка: открытие позиции и ожидание ее закрытия
+async def trade_position(symbol, side, message):
+    global is_trade_open
+    is_trade_open = True
+    try:
+        send_message_to_telegram(message)
+        if await open_position(symbol, side):
+            # Событие позиции из приватного потока приходит позже ответа на ордер:
+            # без ожидания проверка закрытия сразу проходит и сделки наслаиваются
+            if not await position_tracker.wait_position_opened(symbol, timeout=10):
+                logger.warning(f"Позиция {side} для {symbol} не появилась. Анализ продолжается.")
+                return
+            logger.info("Ожидание закрытия позиции.")
+            await position_tracker.wait_position_closed(symbol)
+            logger.info("Позиция закрыта. Анализ продолжается.")
+    finally:
+        is_trade_open = False
+
+
+# Параметры инструмента из справочника
+async def get_instrument(symbol):
+    instrument = instrument_registry.instruments.get("linear", {}).get(symbol)
+    if instrument is None:
+        # Неизвестный символ перезагружает справочник блокирующим запросом — вне цикла событий
+        instrument = await asyncio.to_thread(instrument_registry.get, symbol)
+    if instrument is None:
+        raise ValueError(f"Нет данных инструмента {symbol}")
+    return instrument
+
+
+# Функция открытия позиции с трейлинг-стопом на стороне биржи
+async def open_position(symbol, side):
+    try:
+        response = await client.get_tickers(category="linear", symbol=symbol)
+        entry_price = float(response["result"]["list"][0]["lastPrice"])
+        instrument = await get_instrument(symbol)
+        tick_size = instrument["tickSize"]
+        qty = max(round_qty(dollar_value / entry_price, instrument["qtyStep"]), instrument["minOrderQty"])
+
+        response = await client.place_order(
+            category="linear",
+            symbol=symbol,
+            side=side,
+            orderType="Market",
+            qty=str(qty),
+            timeInForce="IOC"
+        )
+        if response.get("retCode") != 0:
+            logger.error(f"Ошибка открытия позиции: {response.get('retMsg')}")
+            return False
+        logger.info(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
+        send_message_to_telegram(f"Открыта позиция {side} {qty} {symbol} по {entry_price}")
+
+        direction = 1 if side == "Buy" else -1
+        response = await client.set_trading_stop(
+            category="linear",
+            symbol=symbol,
+            trailingStop=format_price(entry_price * retracement_percent / 100, tick_size),
+            activePrice=format_price(entry_price * (1 + direction * activation_percent / 100), tick_size),
+            positionIdx=0
+        )
+        if response.get("retCode") != 0:
+            logger.error(f"Ошибка установки трейлинг-стопа: {response.get('retMsg')}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при открытии позиции для {symbol}: {e}")
+        return False
+
+
+# Вебхук для получения символа
+@app.route('/webhook', methods=['POST'])
+async def webhook():
+    try:
+        data = (await request.get_data()).decode('utf-8').strip()
+
+        if not data:
+            logger.error("Пустое сообщение из вебхука.")
+            return jsonify({'error': 'Пустое сообщение'}), 400
+
+        symbol = data.upper()
+        logger.info(f'Получен символ из вебхука: {symbol}')
+
+        expires_at = datetime.now() + analysis_duration
+        watch = watches.get(symbol)
+        if watch:
+            # Повторный вебхук по тому же символу только продлевает наблюдение
+            watch["expires_at"] = max(watch["expires_at"], expires_at)
+        else:
+            watches[symbol] = {"event": asyncio.Event(), "expires_at": expires_at, "updates": 0}
+            watches[symbol]["task"] = asyncio.create_task(analyze_order_book(symbol))
+            logger.info(f"Начат анализ для символа {symbol}. Время окончания: {expires_at}")
+            send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {expires_at.strftime('%H:%M:%S')}")
+
+        return jsonify({'status': 'success', 'symbol': symbol, 'watching': len(watches)}), 200
+    except Exception as e:
+        logger.error(f"Ошибка в обработке вебхука: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+# Состояние наблюдений
+@app.route('/watches', methods=['GET'])
+async def list_watches():
+    now_ms = time.time() * 1000
+    symbols = {}
+    for symbol, watch in watches.items():
+        book = order_book_stream.get_book(symbol)
+        symbols[symbol] = {
+            "expires_at": watch["expires_at"].isoformat(timespec="seconds"),
+            "updates": watch["updates"],
+            "lag_ms": int(now_ms - book.ts) if book and book.ts else None,
+        }
+    return jsonify({'watching': len(watches), 'symbols': symbols}), 200
+
+
+if __name__ == "__main__":
+    public_url = ngrok.connect(5000, bind_tls=True).public_url
+    webhook_url = f"{public_url}/webhook"
+    logger.info(f"Публичный URL вебхука: {webhook_url}")
+
+    send_message_to_telegram(f"Сервер доступен по адресу: {webhook_url}")
+
+    config = Config()
+    config.bind = ["0.0.0.0:5000"]
+    asyncio.run(serve(app, config))
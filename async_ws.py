@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import ssl
+from urllib.parse import urlparse
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import (
+    AcceptConnection, BytesMessage, CloseConnection, Message, Ping, RejectConnection, Request, TextMessage
+)
+
+from bybit_ws import BybitWebSocket, PING_INTERVAL, RECONNECT_DELAY
+
+# Настройка логирования
+logger = logging.getLogger("AsyncBybitWebSocket")
+
+READ_CHUNK = 65536
+
+
+class AsyncBybitWebSocket(BybitWebSocket):
+    """Соединение с WebSocket Bybit v5 как задача asyncio вместо фоновых потоков.
+
+    Интерфейс тот же, что у BybitWebSocket (start, subscribe, unsubscribe, resubscribe),
+    поэтому подходит для OrderBookStream и PositionTracker. Все методы вызываются из
+    потока цикла событий; обработчики сообщений выполняются в нем же.
+    """
+
+    def __init__(self, url, on_message, on_reconnect=None, api_key=None, api_secret=None):
+        super().__init__(url, on_message, on_reconnect, api_key, api_secret)
+        self._outbox = None
+        self._task = None
+
+    def start(self):
+        """Запускает соединение задачей в текущем цикле событий."""
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    def stop(self):
+        self._running = False
+        self._connected.clear()
+        self._authenticated.clear()
+        if self._task:
+            self._task.cancel()
+
+    def _send(self, message):
+        if not self._connected.is_set():
+            return  # Подписки будут отправлены при подключении
+        self._outbox.put_nowait(message)
+
+    async def _run_forever(self):
+        while self._running:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка WebSocket {self.url}: {e}")
+            self._connected.clear()
+            self._authenticated.clear()
+            if self._running:
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _session(self):
+        url = urlparse(self.url)
+        secure = url.scheme == "wss"
+        reader, writer = await asyncio.open_connection(
+            url.hostname,
+            url.port or (443 if secure else 80),
+            ssl=ssl.create_default_context() if secure else None,
+            server_hostname=url.hostname if secure else None
+        )
+        ws = WSConnection(ConnectionType.CLIENT)
+        self._outbox = asyncio.Queue()
+        tasks = []
+        text = []
+        writer.write(ws.send(Request(host=url.hostname, target=url.path or "/")))
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    raise ConnectionError("соединение закрыто сервером")
+                ws.receive_data(data)
+                for event in ws.events():
+                    if isinstance(event, AcceptConnection):
+                        self._on_accept()
+                        tasks = [
+                            asyncio.create_task(self._writer_loop(ws, writer)),
+                            asyncio.create_task(self._ping_loop()),
+                        ]
+                    elif isinstance(event, TextMessage):
+                        text.append(event.data)
+                        if event.message_finished:
+                            self._on_message(None, "".join(text))
+                            text = []
+                    elif isinstance(event, BytesMessage):
+                        continue
+                    elif isinstance(event, Ping):
+                        writer.write(ws.send(event.response()))
+                    elif isinstance(event, CloseConnection):
+                        logger.warning(f"WebSocket закрыт {self.url}: {event.code} {event.reason}")
+                        writer.write(ws.send(event.response()))
+                        return
+                    elif isinstance(event, RejectConnection):
+                        raise ConnectionError(f"подключение отклонено: {event.status_code}")
+        finally:
+            self._connected.clear()
+            self._authenticated.clear()
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    def _on_accept(self):
+        logger.info(f"WebSocket подключен: {self.url}")
+        self._connected.set()
+        if self.api_key and self.api_secret:
+            self._outbox.put_nowait(self._auth_message())
+        if self.topics:
+            self._outbox.put_nowait({"op": "subscribe", "args": sorted(self.topics)})
+        if self.on_reconnect:
+            self.on_reconnect()
+
+    async def _writer_loop(self, ws, writer):
+        while True:
+            message = await self._outbox.get()
+            writer.write(ws.send(Message(data=json.dumps(message))))
+            await writer.drain()
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            self._send({"op": "ping"})
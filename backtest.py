@@ -0,0 +1,326 @@
+import argparse
+import glob
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from orderbook_recorder import RECORDINGS_DIR, record_paths
+from orderbook_replay import OrderBookReplay
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Backtest")
+
+# Ряд состояний книги после каждого сообщения: все, что нужно сигналу и стопам
+SERIES_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("bid_pct", "<f4"),
+    ("ask_pct", "<f4"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+])
+
+# Параметры по умолчанию — как в app.py и модулях сопровождения позиции; у каждого правила стопов свои
+DEFAULT_PARAMS = {
+    "threshold": 85.0,  # Порог доли бидов/асков, %
+    "confirm_k": 3,  # Подтверждение: k из n последних обновлений
+    "confirm_n": 5,
+    "confirm_duration": 0.0,  # Или сигнал держится столько секунд подряд (0 — только k из n)
+    "watch_minutes": 60.0,  # Длительность наблюдения после вебхука (если заданы вебхуки)
+    "rule": "engine",  # Правила стопов: engine, bb04, advanced
+    # engine: TrailingPosition (update_trailing_stop) + трейлинг-стоп биржи из open_position_manage
+    "move_to_entry_at": 1.0,
+    "follow_distance": 1.0,
+    "retracement_percent": 1.0,
+    # bb04: BB_04_stop5_trailing05.open_position_with_stop + monitor_position (свой порог, как в monitor_position)
+    "bb04_move_to_entry_at": 1.2,
+    "stop_loss_percent": 5.0,
+    "stop_profit_percent": 1.0,
+    "trailing_stop_percent": 0.5,
+    # advanced: AdvancedTrailingManager
+    "activation_percent": 1.0,
+    "initial_stop_percent": 2.0,
+    "trailing_percent": 1.0,
+    # Исполнение
+    "dollar_value": 6.0,
+    "fee_rate": 0.00055,  # Комиссия тейкера за сторону
+    "slippage_bps": 1.0,  # Проскальзывание рыночного ордера сверх лучшей цены
+    "latency_ms": 0,  # Задержка от сигнала до исполнения ордера
+    "tick_size": 0.0,
+}
+
+
+def series_path(root, symbol, start_ts, end_ts, sources=""):
+    return os.path.join(root, symbol, f"series_{start_ts}_{end_ts}_{sources}.npy")
+
+
+def sources_key(replay, start_ts, end_ts):
+    """Ключ исходных файлов записи: дни и размеры .bin. Меняется, когда запись дописывается."""
+    sizes = ",".join(
+        f"{day}:{os.path.getsize(record_paths(replay.root, replay.symbol, day)[0])}"
+        for day in replay.days(start_ts, end_ts)
+    )
+    return f"{zlib.crc32(sizes.encode()):08x}"
+
+
+def build_series(symbol, root=RECORDINGS_DIR, start_ts=None, end_ts=None):
+    """Один проход по записи книги: ряд SERIES_DTYPE сохраняется в .npy рядом с записью.
+
+    Повторные прогоны (и все процессы перебора параметров) открывают файл через mmap.
+    Размеры исходных .bin входят в имя файла, поэтому после дозаписи ряд строится заново.
+    """
+    replay = OrderBookReplay(symbol, root)
+    path = series_path(root, symbol, start_ts or 0, end_ts or 0, sources_key(replay, start_ts, end_ts))
+    if os.path.exists(path):
+        return path
+    # Ряды того же диапазона по прежнему состоянию записи больше не нужны
+    for stale in glob.glob(series_path(root, symbol, start_ts or 0, end_ts or 0, "*")):
+        os.remove(stale)
+    rows = []
+    for ts, book in replay.books(start_ts, end_ts):
+        bid, ask = book.best_bid(), book.best_ask()
+        if bid and ask:
+            bid_pct, ask_pct = book.percentages()
+            rows.append((ts, bid_pct, ask_pct, bid, ask))
+    series = np.array(rows, dtype=SERIES_DTYPE)
+    np.save(f"{path}.tmp.npy", series)
+    os.replace(f"{path}.tmp.npy", path)
+    logger.info(f"Ряд {symbol}: {len(series)} обновлений книги -> {path}")
+    return path
+
+
+def load_series(path):
+    return np.load(path, mmap_mode="r")
+
+
+def signal_codes(series, threshold):
+    """Сигнал на каждом обновлении, как в evaluate_order_book: -1 — Sell (перевес бидов), 1 — Buy."""
+    codes = np.zeros(len(series), dtype=np.int8)
+    codes[series["ask_pct"] > threshold] = 1
+    codes[series["bid_pct"] > threshold] = -1
+    return codes
+
+
+def _round_to_tick(stops, side, tick_size):
+    if not tick_size:
+        return stops
+    return side * np.round(side * stops / tick_size) * tick_size
+
+
+# Правила стопов. Цены передаются в «знаковом» виде p' = side * p (side = 1 для Buy, -1 для Sell),
+# чтобы обе стороны считались одинаково: позиция закрывается, когда p' опускается до стопа.
+# seg[0] — цена в момент входа; стоп, рассчитанный на тике j, действует с тика j + 1.
+
+def engine_stops(seg, entry, side, params):
+    """TrailingPosition (правила update_trailing_stop) и трейлинг-стоп биржи от open_position_manage."""
+    entry_signed = side * entry
+    profit = (seg - entry_signed) / entry * 100
+    active = profit >= params["move_to_entry_at"]
+    extreme = np.maximum.accumulate(np.where(active, seg, entry_signed))
+    stops = np.where(
+        np.maximum.accumulate(active),
+        _round_to_tick(extreme * (1 - side * params["follow_distance"] / 100), side, params["tick_size"]),
+        -np.inf
+    )
+    if params["retracement_percent"]:
+        # Трейлинг-стоп биржи: дистанция в процентах от цены входа от лучшей цены с момента входа
+        stops = np.maximum(stops, np.maximum.accumulate(seg) - entry * params["retracement_percent"] / 100)
+    return stops
+
+
+def bb04_stops(seg, entry, side, params):
+    """Стоп-лосс stop_loss_percent, после прибыли bb04_move_to_entry_at — стоп в прибыль и трейлинг биржи."""
+    entry_signed = side * entry
+    stops = np.full(len(seg), entry_signed * (1 - side * params["stop_loss_percent"] / 100))
+    reached = np.flatnonzero((seg - entry_signed) / entry * 100 >= params["bb04_move_to_entry_at"])
+    if len(reached):
+        a = reached[0]
+        trailing = np.maximum.accumulate(seg[a:]) - entry * params["trailing_stop_percent"] / 100
+        stops[a:] = np.maximum(entry_signed * (1 + side * params["stop_profit_percent"] / 100), trailing)
+    return stops
+
+
+def advanced_stops(seg, entry, side, params):
+    """AdvancedTrailingManager: начальный стоп, перенос в безубыток при активации, затем трейлинг."""
+    entry_signed = side * entry
+    stops = np.full(len(seg), entry_signed * (1 - side * params["initial_stop_percent"] / 100))
+    reached = np.flatnonzero((seg - entry_signed) / entry * 100 >= params["activation_percent"])
+    if len(reached):
+        a = reached[0]
+        # До активации лучшая цена — предыдущая цена; на тике активации стоп — цена входа
+        best = seg[a - 1] if a > 0 else entry_signed
+        stops[a] = entry_signed
+        run = np.maximum.accumulate(seg[a + 1:])
+        stops[a + 1:] = np.where(run > best, run * (1 - side * params["trailing_percent"] / 100), entry_signed)
+    return stops
+
+
+STOP_RULES = {"engine": engine_stops, "bb04": bb04_stops, "advanced": advanced_stops}
+
+
+def find_signal(ts, codes, start, end, params):
+    """Первый подтвержденный сигнал в [start, end) с пустой историей на start (как SignalConfirmation после reset).
+
+    Возвращает (индекс, сторона) или (None, 0).
+    """
+    k, n = params["confirm_k"], params["confirm_n"]
+    duration_ms = params["confirm_duration"] * 1000
+    length = 4096
+    while start < end:
+        hi = min(end, start + length)
+        seg = codes[start:hi]
+        # Начало текущей серии одинаковых сигналов — для подтверждения по длительности
+        changes = np.ones(len(seg), dtype=bool)
+        changes[1:] = seg[1:] != seg[:-1]
+        run_start = np.maximum.accumulate(np.where(changes, np.arange(len(seg)), 0))
+        if duration_ms:
+            held = ts[start:hi] - ts[start + run_start] >= duration_ms
+        else:
+            held = np.zeros(len(seg), dtype=bool)
+
+        found = len(seg)
+        found_side = 0
+        for side in (1, -1):
+            counts = np.cumsum(seg == side)
+            window = counts.copy()
+            window[n:] -= counts[:-n]
+            hits = np.flatnonzero((seg == side) & ((window >= k) | held))
+            if len(hits) and hits[0] < found:
+                found, found_side = hits[0], side
+        if found_side:
+            return start + int(found), found_side
+        if hi == end:
+            return None, 0
+        length *= 4
+    return None, 0
+
+
+def find_exit(prices_signed, entry_index, entry, side, params):
+    """Индекс тика, на котором срабатывает стоп, или None, если позиция не закрылась до конца данных."""
+    stop_rule = STOP_RULES[params["rule"]]
+    length = 1024
+    while True:
+        seg = prices_signed[entry_index:entry_index + length]
+        stops = stop_rule(seg, entry, side, params)
+        hits = np.flatnonzero(seg[1:] <= stops[:-1])
+        if len(hits):
+            return entry_index + 1 + int(hits[0])
+        if entry_index + length >= len(prices_signed):
+            return None
+        length *= 4
+
+
+def watch_windows(ts, alerts, watch_minutes):
+    """Интервалы индексов наблюдения: вебхук начинает наблюдение или продлевает текущее."""
+    if alerts is None:
+        return [(0, len(ts))]
+    windows = []
+    duration = int(watch_minutes * 60000)
+    for alert in sorted(alerts):
+        if windows and alert <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], alert + duration)
+        else:
+            windows.append([alert, alert + duration])
+    return [(int(np.searchsorted(ts, start)), int(np.searchsorted(ts, end))) for start, end in windows]
+
+
+def run_backtest(series, params=None, alerts=None):
+    """Прогон стратегии по ряду книги. Возвращает (сделки, статистика)."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    ts = np.asarray(series["ts"])
+    bid = np.asarray(series["bid"])
+    ask = np.asarray(series["ask"])
+    mid = (bid + ask) / 2
+    codes = signal_codes(series, params["threshold"])
+    slippage = params["slippage_bps"] / 10000
+    prices_signed = {1: mid, -1: -mid}
+
+    trades = []
+    position_free = 0
+    for window_start, window_end in watch_windows(ts, alerts, params["watch_minutes"]):
+        start = max(window_start, position_free)
+        while start < window_end:
+            signal_index, side = find_signal(ts, codes, start, window_end, params)
+            if signal_index is None:
+                break
+            entry_index = int(np.searchsorted(ts, ts[signal_index] + params["latency_ms"])) if params["latency_ms"] else signal_index
+            if entry_index >= len(ts):
+                break
+
+            entry = ask[entry_index] * (1 + slippage) if side == 1 else bid[entry_index] * (1 - slippage)
+            exit_index = find_exit(prices_signed[side], entry_index, entry, side, params)
+            closed = exit_index is not None
+            if not closed:
+                exit_index = len(ts) - 1
+            exit_price = bid[exit_index] * (1 - slippage) if side == 1 else ask[exit_index] * (1 + slippage)
+
+            qty = params["dollar_value"] / entry
+            pnl = side * (exit_price - entry) * qty - params["fee_rate"] * (entry + exit_price) * qty
+            trades.append({
+                "entry_ts": int(ts[entry_index]),
+                "exit_ts": int(ts[exit_index]),
+                "side": "Buy" if side == 1 else "Sell",
+                "entry": float(entry),
+                "exit": float(exit_price),
+                "pnl": float(pnl),
+                "pnl_percent": float(pnl / params["dollar_value"] * 100),
+                "closed": closed,
+            })
+            # После закрытия анализ продолжается с пустой историей сигналов
+            position_free = start = exit_index + 1
+    return trades, summarize(trades)
+
+
+def summarize(trades):
+    """PnL, доля прибыльных сделок и максимальная просадка по кривой капитала."""
+    pnl = np.array([trade["pnl"] for trade in trades])
+    if not len(pnl):
+        return {"trades": 0, "pnl": 0.0, "hit_rate": 0.0, "max_drawdown": 0.0, "profit_factor": 0.0, "avg_pnl": 0.0}
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    losses = -pnl[pnl < 0].sum()
+    return {
+        "trades": len(pnl),
+        "pnl": float(equity[-1]),
+        "hit_rate": float((pnl > 0).mean() * 100),
+        "max_drawdown": float(drawdown.max()),
+        "profit_factor": float(pnl[pnl > 0].sum() / losses) if losses > 0 else float("inf"),
+        "avg_pnl": float(pnl.mean()),
+    }
+
+
+def parse_ts(value):
+    """Время в мс из числа или даты ISO (UTC)."""
+    if value is None or value.isdigit():
+        return int(value) if value else None
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def load_alerts(path):
+    """Время вебхуков из файла: по одному значению (мс или ISO) в строке."""
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return [parse_ts(line.strip()) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бэктест стратегии дисбаланса книги ордеров по записям")
+    parser.add_argument("symbol")
+    parser.add_argument("--root", default=RECORDINGS_DIR)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--alerts", help="файл со временем вебхуков")
+    for name, value in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS}
+    series = load_series(build_series(args.symbol.upper(), args.root, parse_ts(args.start), parse_ts(args.end)))
+    trades, stats = run_backtest(series, params, load_alerts(args.alerts))
+    for trade in trades:
+        logger.info(trade)
+    logger.info(stats)
@@ -0,0 +1,110 @@
+import argparse
+import csv
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backtest import DEFAULT_PARAMS, build_series, load_alerts, load_series, parse_ts, run_backtest
+from orderbook_recorder import RECORDINGS_DIR
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("BacktestSweep")
+
+# Сетки параметров по умолчанию: общие параметры сигнала и параметры своего правила стопов
+SIGNAL_GRID = {
+    "threshold": [75, 80, 85, 90],
+    "watch_minutes": [15, 30, 60],
+}
+GRIDS = {
+    "engine": {**SIGNAL_GRID, "move_to_entry_at": [0.5, 1, 1.5], "follow_distance": [0.5, 1, 1.5]},
+    "bb04": {**SIGNAL_GRID, "bb04_move_to_entry_at": [0.8, 1.2, 1.6], "stop_profit_percent": [0.5, 1]},
+    "advanced": {**SIGNAL_GRID, "activation_percent": [0.5, 1, 1.5], "trailing_percent": [0.5, 1, 1.5]},
+}
+
+# Колонки отчета после параметров
+RESULT_COLUMNS = ["trades", "pnl", "hit_rate", "max_drawdown", "profit_factor", "avg_pnl"]
+
+# Ряд книги и вебхуки процесса-исполнителя: открываются один раз при старте процесса
+_series = None
+_alerts = None
+
+
+def grid_configs(grid):
+    """Все сочетания значений сетки."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configs(grid, count, seed=None):
+    """count случайных сочетаний значений сетки без повторов."""
+    configs = grid_configs(grid)
+    return random.Random(seed).sample(configs, min(count, len(configs)))
+
+
+def _init_worker(path, alerts):
+    # Каждый процесс отображает файл ряда в память сам: страницы общие через кэш ОС, копий нет
+    global _series, _alerts
+    _series = load_series(path)
+    _alerts = alerts
+
+
+def _run_config(config):
+    try:
+        _, stats = run_backtest(_series, config, _alerts)
+    except Exception as e:
+        logger.error(f"Ошибка прогона {config}: {e}")
+        stats = {}
+    return config, stats
+
+
+def run_sweep(symbol, configs, root=RECORDINGS_DIR, start_ts=None, end_ts=None, alerts=None,
+              base_params=None, workers=None, output=None):
+    """Прогоняет конфигурации параллельно и пишет CSV, отсортированный по PnL. Возвращает строки отчета."""
+    path = build_series(symbol, root, start_ts, end_ts)
+    configs = [{**(base_params or {}), **config} for config in configs]
+    started = time.time()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(path, alerts)) as executor:
+        for config, stats in executor.map(_run_config, configs, chunksize=max(1, len(configs) // 64)):
+            if stats:
+                rows.append({**config, **stats})
+    rows.sort(key=lambda row: row["pnl"], reverse=True)
+    logger.info(f"Перебор {symbol}: {len(configs)} конфигураций за {time.time() - started:.1f} с")
+
+    if output and rows:
+        names = [name for name in rows[0] if name not in RESULT_COLUMNS]
+        with open(output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=names + RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        logger.info(f"Результаты записаны в {output}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельный перебор параметров бэктеста")
+    parser.add_argument("symbol")
+    parser.add_argument("--root", default=RECORDINGS_DIR)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--alerts", help="файл со временем вебхуков")
+    parser.add_argument("--rule", default=DEFAULT_PARAMS["rule"], choices=list(GRIDS))
+    parser.add_argument("--random", type=int, default=0, help="число случайных конфигураций вместо полной сетки")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    grid = GRIDS[args.rule]
+    configs = random_configs(grid, args.random, args.seed) if args.random else grid_configs(grid)
+    results = run_sweep(
+        args.symbol.upper(), configs, args.root, parse_ts(args.start), parse_ts(args.end),
+        load_alerts(args.alerts), {"rule": args.rule}, args.workers, args.output
+    )
+    for row in results[:10]:
+        logger.info(row)
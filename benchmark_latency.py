@@ -0,0 +1,172 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from latency_trace import STAGES
+
+# Настройка логирования
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger("LatencyBenchmark")
+logger.setLevel(logging.INFO)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Цена синтетических символов симулятора
+SYMBOL_PRICE = 100
+# Позиция закрывается бенчмарком, если стоп не установлен за столько секунд
+POSITION_TIMEOUT = 5
+
+
+def start_simulator(symbols, port, skew, interval, latency_ms):
+    """Запускает exchange_simulator.py отдельным процессом и ждет готовности REST."""
+    command = [
+        sys.executable, os.path.join(ROOT, "exchange_simulator.py"), "--port", str(port),
+        "--interval", str(interval), "--skew", str(skew), "--latency-ms", str(latency_ms),
+        "--rate-limit", "1000", "--synthetic", *(f"{symbol}:{SYMBOL_PRICE}" for symbol in symbols)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/v5/market/time", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Симулятор биржи не запустился")
+
+
+def load_app(simulator_port):
+    """Импортирует app.py с клиентами Bybit, направленными на симулятор."""
+    os.environ["BYBIT_REST_URL"] = f"http://127.0.0.1:{simulator_port}"
+    os.environ["BYBIT_WS_URL"] = f"ws://127.0.0.1:{simulator_port}"
+    for name in ("API_KEY", "API_SECRET", "TELEGRAM_BOT_TOKEN"):
+        os.environ.setdefault(name, "benchmark")
+    import telegram_message
+    telegram_message.dispatcher.chat_ids = []  # Сообщения в Telegram во время замеров не отправляются
+    return importlib.import_module("app")
+
+
+def serve_app(app_module, port):
+    """HTTP-сервер Flask-приложения в фоновом потоке (как app.run, но без ngrok)."""
+    server = make_server("127.0.0.1", port, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-app", daemon=True).start()
+    return server
+
+
+def close_positions(app_module, stop_event):
+    """Закрывает позиции после установки стопа, чтобы следующий сигнал мог открыть сделку."""
+    opened = {}
+    while not stop_event.is_set():
+        traces = app_module.latency_trace.traces
+        for (symbol, _), position in list(app_module.position_tracker.positions.items()):
+            if float(position.get("size") or 0) <= 0:
+                opened.pop(symbol, None)
+                continue
+            opened.setdefault(symbol, time.time())
+            if "stop_set" in traces.get(symbol, {}) or time.time() - opened[symbol] > POSITION_TIMEOUT:
+                try:
+                    app_module.session.place_order(
+                        category="linear", symbol=symbol, side="Sell" if position["side"] == "Buy" else "Buy",
+                        orderType="Market", qty=position["size"], reduceOnly=True
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка закрытия позиции {symbol}: {e}")
+        stop_event.wait(0.1)
+
+
+def run_bursts(app_port, symbols, bursts, burst_size, interval):
+    """Пачки вебхуков: burst_size новых символов одновременно, пауза interval секунд между пачками."""
+    url = f"http://127.0.0.1:{app_port}/webhook"
+    with ThreadPoolExecutor(max_workers=burst_size) as executor:
+        for burst in range(bursts):
+            batch = symbols[burst * burst_size:(burst + 1) * burst_size]
+            statuses = list(executor.map(lambda symbol: requests.post(url, data=symbol, timeout=10).status_code, batch))
+            logger.info(f"Пачка {burst + 1}/{bursts}: {len(batch)} вебхуков, ответы {statuses}")
+            time.sleep(interval)
+
+
+def print_report(result):
+    logger.info(f"{'этап':<16}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (мс от вебхука)")
+    for stage in STAGES:
+        item = result[stage]
+        if not item["count"]:
+            logger.info(f"{stage:<16}{0:>6}")
+            continue
+        logger.info(f"{stage:<16}{item['count']:>6}{item['p50']:>10.2f}{item['p95']:>10.2f}{item['p99']:>10.2f}{item['max']:>10.2f}")
+
+
+def find_regressions(result, baseline, tolerance):
+    """Этапы, у которых p99 вырос больше чем в tolerance раз относительно базового прогона."""
+    regressions = []
+    for stage, item in baseline.items():
+        current = result.get(stage, {})
+        if not item.get("count"):
+            continue
+        if not current.get("count"):
+            regressions.append(f"{stage}: нет замеров (в базовом прогоне {item['count']})")
+        elif current["p99"] > item["p99"] * tolerance:
+            regressions.append(f"{stage}: p99 {current['p99']:.2f} мс > {item['p99']:.2f} мс x {tolerance}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка от вебхука до подтверждения ордера на симуляторе биржи")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst-size", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=3.0, help="пауза между пачками, секунды")
+    parser.add_argument("--book-interval", type=float, default=0.05, help="период обновления книг симулятора, секунды")
+    parser.add_argument("--skew", type=float, default=10.0, help="перевес асков в книгах симулятора (сигналы Buy)")
+    parser.add_argument("--exchange-latency-ms", type=float, default=0)
+    parser.add_argument("--simulator-port", type=int, default=8790)
+    parser.add_argument("--app-port", type=int, default=5090)
+    parser.add_argument("--output", help="файл JSON с результатом")
+    parser.add_argument("--baseline", help="результат прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="допустимый рост p99 относительно базового прогона")
+    args = parser.parse_args()
+
+    symbols = [f"BENCH{i}USDT" for i in range(args.bursts * args.burst_size)]
+    simulator = start_simulator(symbols, args.simulator_port, args.skew, args.book_interval, args.exchange_latency_ms)
+    stop_event = threading.Event()
+    try:
+        app_module = load_app(args.simulator_port)
+        server = serve_app(app_module, args.app_port)
+        threading.Thread(target=close_positions, args=(app_module, stop_event), daemon=True).start()
+        app_module.latency_trace.reset()
+
+        run_bursts(args.app_port, symbols, args.bursts, args.burst_size, args.interval)
+        result = app_module.latency_trace.percentiles()
+        # Последняя сделка должна закрыться, пока симулятор еще работает
+        deadline = time.time() + POSITION_TIMEOUT * 2
+        while app_module.is_trade_open and time.time() < deadline:
+            time.sleep(0.1)
+        server.shutdown()
+    finally:
+        stop_event.set()
+        simulator.terminate()
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Регрессия: {regression}")
+
+    # Потоки приложения (пулы планировщика, WebSocket) не рассчитаны на остановку — выходим сразу
+    logging.shutdown()
+    os._exit(1 if regressions else 0)
@@ -0,0 +1,292 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import requests
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+from pybit.unified_trading import HTTP
+
+from bybit_rest import sign_headers
+from clock_sync import REST_URL_OVERRIDE, get_clock_sync
+from latency_trace import get_latency_trace
+from metrics import API_ERRORS, API_LATENCY, API_QUEUE_WAIT, ORDERS
+
+# Настройка логирования
+logger = logging.getLogger("BybitGateway")
+
+# Приоритеты очереди: меньше — раньше
+PRIORITY_ORDER = 0  # размещение ордеров и стопы
+PRIORITY_ACCOUNT = 1  # позиции и аккаунт
+PRIORITY_MARKET = 2  # рыночные данные
+
+ORDER_PATHS = ("/v5/order/", "/v5/position/trading-stop")
+ACCOUNT_PATHS = ("/v5/position/", "/v5/account/", "/v5/asset/")
+# Эндпоинты, ответы которых отмечаются в LatencyTrace, и соответствующий этап
+TRACED_PATHS = {"/v5/order/create": "order_acked", "/v5/position/trading-stop": "stop_set"}
+
+# Код ошибки Bybit: время подписи вне recv_window
+RECV_WINDOW_ERROR = 10002
+
+# Лимит по IP для всех запросов: 600 запросов за 5 секунд
+IP_RATE = 120
+IP_CAPACITY = 600
+# Лимит по умолчанию для приватного эндпоинта, пока биржа не прислала X-Bapi-Limit
+DEFAULT_ENDPOINT_RATE = 10
+
+# Общий экземпляр на процесс
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def request_priority(path):
+    if path.startswith(ORDER_PATHS):
+        return PRIORITY_ORDER
+    if path.startswith(ACCOUNT_PATHS):
+        return PRIORITY_ACCOUNT
+    return PRIORITY_MARKET
+
+
+class TokenBucket:
+    """Ведро токенов; синхронизируется с заголовками X-Bapi-Limit-* ответов Bybit."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self):
+        """Берет токен без ожидания. Возвращает 0 или сколько секунд ждать до следующей попытки."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+    def release(self):
+        """Возвращает взятый токен (запрос не был отправлен)."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def sync(self, limit, remaining, reset_timestamp_ms):
+        """Подстраивает ведро под лимит окна (1 секунда) и остаток, сообщенные биржей."""
+        with self._lock:
+            self.rate = self.capacity = max(limit, 1)
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset_timestamp_ms:
+                # Время сброса задано по часам биржи; переводим в монотонное время
+                delay = max(0.0, reset_timestamp_ms / 1000 - time.time())
+                self.blocked_until = time.monotonic() + delay
+
+
+class BybitGateway(HTTP):
+    """Общая на процесс сессия pybit с приоритетной очередью и лимитами по эндпоинтам.
+
+    Все методы HTTP (place_order, get_tickers, ...) работают как обычно, но запросы
+    выполняются пулом рабочих потоков по приоритету: ордера и стопы раньше рыночных данных.
+    Запрос, упершийся в лимит, не занимает рабочий поток: он откладывается до освобождения
+    токена и возвращается в очередь со своим приоритетом.
+    """
+
+    workers = 4
+
+    def __post_init__(self):
+        super().__post_init__()
+        if REST_URL_OVERRIDE:
+            self.endpoint = REST_URL_OVERRIDE
+        self.clock = get_clock_sync(self.testnet)
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._delayed = []  # куча (время готовности, элемент очереди) для запросов, ждущих лимит
+        self._delayed_cond = threading.Condition()
+        self._buckets = {}
+        self._ip_bucket = TokenBucket(IP_RATE, IP_CAPACITY)
+        self._stats_lock = threading.Lock()
+        self.throttle_stats = {}  # путь -> {"waits", "wait_time"}
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"bybit-gateway-{i}", daemon=True).start()
+        threading.Thread(target=self._delay_loop, name="bybit-gateway-delay", daemon=True).start()
+
+    def _submit_request(self, method=None, path=None, query=None, auth=False):
+        endpoint = path[len(self.endpoint):] if path.startswith(self.endpoint) else path
+        future = Future()
+        self._queue.put((request_priority(endpoint), next(self._counter), endpoint, future,
+                         (method, path, query, auth, time.perf_counter(), None)))
+        if endpoint not in TRACED_PATHS or (query or {}).get("reduceOnly"):
+            # Закрывающие ордера не относятся к сделке по сигналу и в трассу не попадают
+            return future.result()
+
+        # Этапы ордера и стопа для трассы вебхука
+        symbol = (query or {}).get("symbol")
+        trace = get_latency_trace()
+        if endpoint == "/v5/order/create":
+            trace.mark(symbol, "order_sent")
+        response = future.result()
+        trace.mark(symbol, TRACED_PATHS[endpoint])
+        if endpoint == "/v5/order/create" and query.get("stopLoss"):
+            # Стоп-лосс передан вместе с ордером входа
+            trace.mark(symbol, "stop_set")
+        return response
+
+    def queue_depth(self):
+        return self._queue.qsize() + len(self._delayed)
+
+    def stats(self):
+        """Глубина очереди, ожидания из-за лимитов и текущие лимиты по эндпоинтам."""
+        with self._stats_lock:
+            throttle = {endpoint: dict(item) for endpoint, item in self.throttle_stats.items()}
+        return {
+            "queue_depth": self.queue_depth(),
+            "throttle": throttle,
+            "limits": {
+                endpoint: {"limit": bucket.capacity, "tokens": round(bucket.tokens, 2)}
+                for endpoint, bucket in list(self._buckets.items())
+            },
+        }
+
+    def _bucket(self, endpoint):
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            bucket = self._buckets.setdefault(endpoint, TokenBucket(DEFAULT_ENDPOINT_RATE))
+        return bucket
+
+    def _acquire(self, endpoint, auth):
+        """Токены лимита эндпоинта и IP. Возвращает 0 или через сколько секунд повторить."""
+        bucket = self._bucket(endpoint) if auth else None
+        if bucket:
+            delay = bucket.try_acquire()
+            if delay:
+                return delay
+        delay = self._ip_bucket.try_acquire()
+        if delay and bucket:
+            bucket.release()
+        return delay
+
+    def _defer(self, item, delay):
+        with self._delayed_cond:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, item))
+            self._delayed_cond.notify()
+
+    def _delay_loop(self):
+        # Возвращает отложенные запросы в очередь, когда для них должен освободиться токен
+        while True:
+            with self._delayed_cond:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                    self._delayed_cond.wait(timeout)
+                _, item = heapq.heappop(self._delayed)
+            self._queue.put(item)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            priority, seq, endpoint, future, (method, path, query, auth, enqueued, throttled_at) = item
+            try:
+                delay = self._acquire(endpoint, auth)
+                if delay:
+                    if throttled_at is None:
+                        item = (priority, seq, endpoint, future, (method, path, query, auth, enqueued, time.perf_counter()))
+                    self._defer(item, delay)
+                    continue
+                if throttled_at is not None:
+                    self._record_wait(endpoint, time.perf_counter() - throttled_at)
+
+                started = time.perf_counter()
+                API_QUEUE_WAIT.labels(endpoint).observe(started - enqueued)
+                response, headers = self._send(method, path, query, auth)
+                API_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+                self._sync_limits(endpoint, headers)
+                if endpoint == "/v5/order/create":
+                    ORDERS.labels("placed").inc()
+                future.set_result(response)
+            except Exception as e:
+                API_ERRORS.labels(endpoint).inc()
+                if endpoint == "/v5/order/create":
+                    ORDERS.labels("rejected").inc()
+                future.set_exception(e)
+
+    def _send(self, method, path, query, auth):
+        """Отправляет запрос, подписанный временем сервера из ClockSync. Возвращает (ответ, заголовки).
+
+        Ошибки те же, что у pybit: FailedRequestError для HTTP-ошибок, InvalidRequestError
+        для ответа с retCode. Ошибка recv_window повторяется со свежей подписью.
+        """
+        query = {
+            key: int(value) if isinstance(value, float) and value == int(value) else value
+            for key, value in (query or {}).items()
+        }
+        payload = self.prepare_payload(method, query)
+        for attempt in range(self.max_retries):
+            headers = (
+                sign_headers(self.api_key, self.api_secret, self.recv_window, self.clock.now_ms(), payload)
+                if auth else {}
+            )
+            if method == "GET":
+                request = self.client.prepare_request(requests.Request(
+                    method, f"{path}?{payload}" if payload else path, headers=headers))
+            else:
+                request = self.client.prepare_request(requests.Request(method, path, data=payload, headers=headers))
+            response = self.client.send(request, timeout=self.timeout)
+            if response.status_code != 200:
+                raise FailedRequestError(
+                    request=f"{method} {path}: {payload}",
+                    message=f"HTTP {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code,
+                    time=datetime.utcnow().strftime("%H:%M:%S"),
+                    resp_headers=response.headers,
+                )
+            body = response.json()
+            code = body.get("retCode")
+            if not code or code in self.ignore_codes:
+                return body, response.headers
+            if code == RECV_WINDOW_ERROR and auth and attempt + 1 < self.max_retries:
+                logger.warning(f"Подпись {path} вне recv_window, повтор: {body.get('retMsg')}")
+                continue
+            raise InvalidRequestError(
+                request=f"{method} {path}: {payload}",
+                message=body.get("retMsg"),
+                status_code=code,
+                time=datetime.utcnow().strftime("%H:%M:%S"),
+                resp_headers=response.headers,
+            )
+
+    def _sync_limits(self, endpoint, headers):
+        limit = headers.get("X-Bapi-Limit")
+        remaining = headers.get("X-Bapi-Limit-Status")
+        if limit is None or remaining is None:
+            return
+        self._bucket(endpoint).sync(int(limit), int(remaining), int(headers.get("X-Bapi-Limit-Reset-Timestamp", 0)))
+
+    def _record_wait(self, endpoint, waited):
+        with self._stats_lock:
+            item = self.throttle_stats.setdefault(endpoint, {"waits": 0, "wait_time": 0.0})
+            item["waits"] += 1
+            item["wait_time"] = round(item["wait_time"] + waited, 3)
+        logger.debug(f"Ожидание лимита {endpoint}: {waited:.3f} с")
+
+
+def get_gateway(api_key, api_secret, testnet=False, recv_window=5000):
+    """Возвращает общую для процесса сессию Bybit (создается при первом вызове).
+
+    Время подписи берется из ClockSync, поэтому recv_window может быть узким;
+    recv_window общей сессии — наибольший из запрошенных модулями.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = BybitGateway(api_key=api_key, api_secret=api_secret, testnet=testnet, recv_window=recv_window)
+        _gateway.recv_window = max(_gateway.recv_window, recv_window)
+        return _gateway
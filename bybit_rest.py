@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import json
+import logging
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from clock_sync import BASE_URL, get_clock_sync
+
+# Настройка логирования
+logger = logging.getLogger("BybitRestClient")
+
+
+def sign_headers(api_key, api_secret, recv_window, timestamp, payload):
+    """Заголовки подписи запроса Bybit v5: HMAC-SHA256 от timestamp + key + recv_window + payload."""
+    signature = hmac.new(
+        bytes(api_secret, "utf-8"),
+        f"{timestamp}{api_key}{recv_window}{payload}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+    return {
+        "X-BAPI-API-KEY": api_key,
+        "X-BAPI-TIMESTAMP": str(timestamp),
+        "X-BAPI-SIGN": signature,
+        "X-BAPI-RECV-WINDOW": str(recv_window),
+        "Content-Type": "application/json",
+    }
+
+
+class BybitRestClient:
+    """Синхронный клиент REST API Bybit v5 с постоянным соединением (keep-alive).
+
+    Время подписи берется из общего ClockSync, который обновляет смещение часов
+    в фоне, поэтому подписанный запрос уходит за один сетевой обмен.
+    """
+
+    def __init__(self, api_key, api_secret, base_url=BASE_URL, recv_window=5000):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url
+        self.recv_window = recv_window
+        self.clock = None
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+    def start(self):
+        """Запускает синхронизацию часов с сервером Bybit."""
+        self.clock = get_clock_sync()
+        return self
+
+    def timestamp(self):
+        """Текущее время сервера Bybit в миллисекундах."""
+        return self.clock.now_ms() if self.clock else get_clock_sync().now_ms()
+
+    def request(self, method, path, params=None, auth=False):
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if method == "GET":
+            payload = urlencode(params)
+            url = f"{self.base_url}{path}?{payload}" if payload else f"{self.base_url}{path}"
+            headers = sign_headers(self.api_key, self.api_secret, self.recv_window, self.timestamp(), payload) if auth else None
+            response = self._http.get(url, headers=headers, timeout=10)
+        else:
+            payload = json.dumps(params)
+            headers = (
+                sign_headers(self.api_key, self.api_secret, self.recv_window, self.timestamp(), payload)
+                if auth else {"Content-Type": "application/json"}
+            )
+            response = self._http.post(f"{self.base_url}{path}", data=payload, headers=headers, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def place_order(self, **params):
+        return self.request("POST", "/v5/order/create", params, auth=True)
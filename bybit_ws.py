@@ -0,0 +1,173 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+import websocket
+
+from clock_sync import get_clock_sync
+
+# Настройка логирования
+logger = logging.getLogger("BybitWebSocket")
+
+# Адреса WebSocket Bybit v5; BYBIT_WS_URL позволяет подключиться к симулятору биржи (exchange_simulator.py)
+WS_BASE_URL = os.getenv("BYBIT_WS_URL", "wss://stream.bybit.com")
+PUBLIC_WS_URLS = {
+    "linear": f"{WS_BASE_URL}/v5/public/linear",
+    "spot": f"{WS_BASE_URL}/v5/public/spot",
+    "inverse": f"{WS_BASE_URL}/v5/public/inverse",
+}
+PRIVATE_WS_URL = f"{WS_BASE_URL}/v5/private"
+
+# Bybit разрывает соединение без пинга дольше 20 секунд
+PING_INTERVAL = 20
+RECONNECT_DELAY = 3
+
+
+class BybitWebSocket:
+    """Одно соединение с WebSocket Bybit v5: подписки, пинг и переподключение."""
+
+    def __init__(self, url, on_message, on_reconnect=None, api_key=None, api_secret=None):
+        self.url = url
+        self.on_message = on_message
+        self.on_reconnect = on_reconnect
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.topics = set()
+        self._lock = threading.Lock()
+        self._ws = None
+        self._connected = threading.Event()
+        self._authenticated = threading.Event()  # биржа подтвердила auth приватного соединения
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Запускает соединение в фоновом потоке."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run_forever, name=f"ws-{self.url}", daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._ping_loop, name=f"ws-ping-{self.url}", daemon=True).start()
+
+    def stop(self):
+        """Закрывает соединение без переподключения."""
+        self._running = False
+        self._connected.clear()
+        self._authenticated.clear()
+        if self._ws:
+            self._ws.close()
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def is_ready(self):
+        """Соединение подключено, а приватное — еще и прошло аутентификацию (по ответу биржи)."""
+        if self.api_key and self.api_secret:
+            return self._authenticated.is_set()
+        return self._connected.is_set()
+
+    def subscribe(self, topics):
+        """Добавляет подписки; после переподключения они восстанавливаются автоматически."""
+        topics = [topic for topic in topics if topic not in self.topics]
+        if not topics:
+            return
+        self.topics.update(topics)
+        self._send({"op": "subscribe", "args": topics})
+
+    def unsubscribe(self, topics):
+        topics = [topic for topic in topics if topic in self.topics]
+        if not topics:
+            return
+        self.topics.difference_update(topics)
+        self._send({"op": "unsubscribe", "args": topics})
+
+    def resubscribe(self, topic):
+        """Переподписка на топик: Bybit в ответ присылает новый snapshot."""
+        self._send({"op": "unsubscribe", "args": [topic]})
+        self._send({"op": "subscribe", "args": [topic]})
+
+    def _send(self, message):
+        if not self._connected.is_set():
+            return  # Подписки будут отправлены при подключении
+        try:
+            self._ws.send(json.dumps(message))
+        except Exception as e:
+            logger.error(f"Ошибка отправки в WebSocket {self.url}: {e}")
+
+    def _auth_message(self):
+        # Срок действия подписи по часам сервера Bybit
+        expires = get_clock_sync().now_ms() + 10000
+        signature = hmac.new(
+            bytes(self.api_secret, "utf-8"),
+            f"GET/realtime{expires}".encode("utf-8"),
+            hashlib.sha256
+        ).hexdigest()
+        return {"op": "auth", "args": [self.api_key, expires, signature]}
+
+    def _on_open(self, ws):
+        logger.info(f"WebSocket подключен: {self.url}")
+        if self.api_key and self.api_secret:
+            ws.send(json.dumps(self._auth_message()))
+        self._connected.set()
+        if self.topics:
+            ws.send(json.dumps({"op": "subscribe", "args": sorted(self.topics)}))
+        if self.on_reconnect:
+            self.on_reconnect()
+
+    def _on_message(self, ws, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.error(f"Некорректное сообщение WebSocket: {raw}")
+            return
+
+        if "topic" not in message:
+            # Служебные ответы: pong, subscribe, auth
+            if message.get("op") == "auth":
+                if message.get("success"):
+                    self._authenticated.set()
+                    logger.info(f"WebSocket аутентифицирован: {self.url}")
+                else:
+                    self._authenticated.clear()
+                    logger.error(f"Ошибка аутентификации WebSocket {self.url}: {message}")
+            elif message.get("success") is False:
+                logger.error(f"Ошибка WebSocket {self.url}: {message}")
+            return
+
+        try:
+            self.on_message(message)
+        except Exception as e:
+            logger.error(f"Ошибка обработки сообщения {message.get('topic')}: {e}")
+
+    def _on_error(self, ws, error):
+        logger.error(f"Ошибка WebSocket {self.url}: {error}")
+
+    def _on_close(self, ws, status_code, reason):
+        self._connected.clear()
+        self._authenticated.clear()
+        logger.warning(f"WebSocket закрыт {self.url}: {status_code} {reason}")
+
+    def _run_forever(self):
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close
+            )
+            self._ws.run_forever()
+            self._connected.clear()
+            self._authenticated.clear()
+            if self._running:
+                time.sleep(RECONNECT_DELAY)
+
+    def _ping_loop(self):
+        while self._running:
+            time.sleep(PING_INTERVAL)
+            self._send({"op": "ping"})
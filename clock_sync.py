@@ -0,0 +1,120 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+# Настройка логирования
+logger = logging.getLogger("ClockSync")
+
+# Адрес REST API; BYBIT_REST_URL позволяет направить все клиенты на симулятор биржи (exchange_simulator.py)
+REST_URL_OVERRIDE = os.getenv("BYBIT_REST_URL")
+BASE_URL = REST_URL_OVERRIDE or "https://api.bybit.com"
+TESTNET_URL = REST_URL_OVERRIDE or "https://api-testnet.bybit.com"
+
+# Раз в столько секунд делается серия замеров
+SYNC_INTERVAL = 60
+# Замеров в одной серии
+SYNC_BURST = 4
+# Сколько последних замеров участвует в фильтре
+SYNC_WINDOW = 16
+
+# Общие экземпляры на процесс: адрес REST API -> ClockSync
+_clocks = {}
+_clock_lock = threading.Lock()
+
+
+class ClockSync:
+    """Оценка смещения локальных часов относительно сервера Bybit по схеме NTP.
+
+    Каждый замер дает смещение (время сервера минус середина запроса) и RTT.
+    Из окна последних замеров берется смещение замера с наименьшим RTT —
+    у него наименьшая погрешность из-за асимметрии сети; разброс смещений
+    в окне относительно выбранного — джиттер.
+    """
+
+    def __init__(self, base_url=BASE_URL, interval=SYNC_INTERVAL, burst=SYNC_BURST, window=SYNC_WINDOW):
+        self.base_url = base_url
+        self.interval = interval
+        self.burst = burst
+        self.samples = deque(maxlen=window)  # (offset_ms, rtt_ms)
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.jitter_ms = None
+        self.last_sync = None
+        self._http = requests.Session()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Делает первую серию замеров и запускает фоновую синхронизацию."""
+        self.sync()
+        if not self._thread:
+            self._thread = threading.Thread(target=self._sync_loop, name="clock-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def sample(self):
+        """Один замер: (смещение, RTT) в миллисекундах."""
+        sent = time.time() * 1000
+        response = self._http.get(f"{self.base_url}/v5/market/time", timeout=5)
+        received = time.time() * 1000
+        response.raise_for_status()
+        server_time = int(response.json()["result"]["timeNano"]) / 1e6
+        return server_time - (sent + received) / 2, received - sent
+
+    def sync(self):
+        """Серия замеров и пересчет смещения. Возвращает False, если ни один замер не удался."""
+        samples = []
+        for _ in range(self.burst):
+            try:
+                samples.append(self.sample())
+            except Exception as e:
+                logger.error(f"Ошибка при запросе времени сервера Bybit: {e}")
+        if not samples:
+            return False
+
+        with self._lock:
+            self.samples.extend(samples)
+            offset, rtt = min(self.samples, key=lambda item: item[1])
+            self.offset_ms = offset
+            self.rtt_ms = rtt
+            self.jitter_ms = math.sqrt(sum((item[0] - offset) ** 2 for item in self.samples) / len(self.samples))
+            self.last_sync = time.time()
+        logger.debug(f"Смещение часов {self.offset_ms:.1f} мс, RTT {self.rtt_ms:.1f} мс, джиттер {self.jitter_ms:.1f} мс")
+        return True
+
+    def now_ms(self):
+        """Текущее время сервера Bybit в миллисекундах."""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "offset_ms": round(self.offset_ms, 2),
+                "rtt_ms": None if self.rtt_ms is None else round(self.rtt_ms, 2),
+                "jitter_ms": None if self.jitter_ms is None else round(self.jitter_ms, 2),
+                "last_sync": self.last_sync,
+                "samples": len(self.samples),
+            }
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.sync()
+
+
+def get_clock_sync(testnet=False):
+    """Возвращает общий для процесса ClockSync боевого или тестового сервера (запускается при первом вызове).
+
+    Клиенты сами подписывают запросы временем now_ms().
+    """
+    base_url = TESTNET_URL if testnet else BASE_URL
+    with _clock_lock:
+        clock = _clocks.get(base_url)
+        if clock is None:
+            clock = _clocks[base_url] = ClockSync(base_url).start()
+        return clock
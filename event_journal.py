@@ -0,0 +1,196 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from orderbook_recorder import record_day
+
+# Настройка логирования
+logger = logging.getLogger("EventJournal")
+
+# Каталог журнала по умолчанию: <каталог>/<дата UTC>.bin
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal")
+
+# Одна запись журнала фиксированного размера (54 байта)
+JOURNAL_DTYPE = np.dtype([
+    ("ts", "<i8"),  # время, мс
+    ("symbol", "S20"),
+    ("action", "u1"),
+    ("side", "i1"),  # 1 — Buy, -1 — Sell, 0 — нет
+    ("bid_pct", "<f4"),
+    ("ask_pct", "<f4"),
+    ("price", "<f8"),
+    ("size", "<f8"),
+])
+
+# Коды действий
+ACTIONS = {
+    "watch_start": 1,
+    "evaluate": 2,
+    "signal": 3,
+    "order": 4,
+    "position_open": 5,
+    "position_closed": 6,
+    "watch_end": 7,
+}
+ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+SIDES = {"Buy": 1, "Sell": -1}
+SIDE_NAMES = {1: "Buy", -1: "Sell", 0: None}
+
+# Как часто фоновый поток забирает накопленные записи, секунды
+WRITE_INTERVAL = 0.2
+# Как часто сбрасывать буфер файла на диск, секунды
+FLUSH_INTERVAL = 1.0
+
+
+class EventJournal:
+    """Журнал событий стратегии в бинарных файлах по дням (записи JOURNAL_DTYPE).
+
+    record() только добавляет кортеж в deque (атомарно, без блокировок); преобразование
+    пачками в массив NumPy и запись выполняет фоновый поток. Выключенный журнал
+    (enabled=False) ничего не делает.
+    """
+
+    def __init__(self, root=JOURNAL_DIR, enabled=True):
+        self.root = root
+        self.enabled = enabled
+        self.records = 0
+        self._buffer = deque()
+        self._stopped = threading.Event()
+        self._file = None
+        self._day = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self.enabled and not self._running:
+            os.makedirs(self.root, exist_ok=True)
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="event-journal", daemon=True)
+            self._thread.start()
+            # При завершении процесса дописываем накопленную очередь
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=5):
+        """Дописывает очередь и закрывает файл."""
+        self._running = False
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record(self, symbol, action, side=None, bid_pct=0.0, ask_pct=0.0, price=0.0, size=0.0, ts=None):
+        if not self._running:
+            return
+        self._buffer.append((
+            ts or int(time.time() * 1000), symbol, ACTIONS[action], SIDES.get(side, 0), bid_pct, ask_pct, price, size
+        ))
+
+    def stats(self):
+        return {"queue_depth": len(self._buffer), "records": self.records}
+
+    def _run(self):
+        last_flush = time.time()
+        while self._running or self._buffer:
+            self._stopped.wait(WRITE_INTERVAL)
+            items = []
+            while self._buffer:
+                items.append(self._buffer.popleft())
+
+            if items:
+                try:
+                    self._write(np.array(items, dtype=JOURNAL_DTYPE))
+                except Exception as e:
+                    logger.error(f"Ошибка записи журнала событий: {e}")
+
+            if self._file and time.time() - last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                last_flush = time.time()
+
+    def _write(self, rows):
+        # Пачка может перейти через полночь UTC: делим по дням
+        days = [record_day(ts) for ts in rows["ts"][[0, -1]]]
+        if days[0] == days[1]:
+            groups = [(days[0], rows)]
+        else:
+            day_of_row = np.array([record_day(ts) for ts in rows["ts"]])
+            groups = [(day, rows[day_of_row == day]) for day in dict.fromkeys(day_of_row)]
+        for day, group in groups:
+            if day != self._day:
+                if self._file:
+                    self._file.close()
+                self._file = open(os.path.join(self.root, f"{day}.bin"), "ab")
+                self._day = day
+            self._file.write(group.tobytes())
+            self.records += len(group)
+
+
+def read_journal(root=JOURNAL_DIR, start_ts=None, end_ts=None, symbol=None, actions=None):
+    """Записи журнала за диапазон времени как структурированный массив JOURNAL_DTYPE.
+
+    Файлы дней отображаются в память; фильтры по времени, символу и действиям — векторные.
+    """
+    if not os.path.isdir(root):
+        return np.empty(0, JOURNAL_DTYPE)
+    first = record_day(start_ts) if start_ts is not None else None
+    last = record_day(end_ts) if end_ts is not None else None
+    parts = []
+    for name in sorted(os.listdir(root)):
+        day = name[:-4]
+        if not name.endswith(".bin") or (first and day < first) or (last and day > last):
+            continue
+        path = os.path.join(root, name)
+        rows = os.path.getsize(path) // JOURNAL_DTYPE.itemsize
+        if not rows:
+            continue
+        data = np.memmap(path, dtype=JOURNAL_DTYPE, mode="r", shape=(rows,))
+        mask = np.ones(rows, dtype=bool)
+        if start_ts is not None:
+            mask &= data["ts"] >= start_ts
+        if end_ts is not None:
+            mask &= data["ts"] < end_ts
+        if symbol:
+            mask &= data["symbol"] == symbol.encode()
+        if actions:
+            mask &= np.isin(data["action"], [ACTIONS[action] for action in actions])
+        parts.append(np.array(data[mask]))
+    return np.concatenate(parts) if parts else np.empty(0, JOURNAL_DTYPE)
+
+
+def to_dicts(rows):
+    """Записи журнала в виде словарей (для вывода и выгрузки)."""
+    return [
+        {
+            "ts": int(row["ts"]),
+            "symbol": row["symbol"].decode(),
+            "action": ACTION_NAMES.get(int(row["action"])),
+            "side": SIDE_NAMES.get(int(row["side"])),
+            "bid_pct": round(float(row["bid_pct"]), 2),
+            "ask_pct": round(float(row["ask_pct"]), 2),
+            "price": float(row["price"]),
+            "size": float(row["size"]),
+        }
+        for row in rows
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка журнала событий в JSON Lines")
+    parser.add_argument("--root", default=JOURNAL_DIR)
+    parser.add_argument("--start", type=int, help="время начала, мс")
+    parser.add_argument("--end", type=int, help="время окончания, мс")
+    parser.add_argument("--symbol")
+    parser.add_argument("--action", action="append", choices=list(ACTIONS))
+    args = parser.parse_args()
+
+    for record in to_dicts(read_journal(args.root, args.start, args.end, args.symbol, args.action)):
+        print(json.dumps(record, ensure_ascii=False))
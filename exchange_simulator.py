@@ -0,0 +1,667 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+
+from quart import Quart, request, jsonify, websocket
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+
+from order_book import LocalOrderBook
+from orderbook_recorder import RECORDINGS_DIR
+from orderbook_replay import OrderBookReplay
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ExchangeSimulator")
+
+# Комиссия тейкера за исполнение рыночного ордера
+TAKER_FEE = 0.00055
+# Лимит приватных эндпоинтов по умолчанию, запросов в секунду (как у Bybit для ордеров)
+DEFAULT_RATE_LIMIT = 10
+# Глубина книги синтетического рынка, уровней на сторону
+SYNTHETIC_LEVELS = 50
+
+# Коды ошибок Bybit v5
+RET_PARAMS_ERROR = 10001
+RET_AUTH_ERROR = 10003
+RET_RATE_LIMIT = 10006
+RET_SYMBOL_NOT_FOUND = 110001
+
+
+def _tick_size(price):
+    """Шаг цены синтетического инструмента: около 0.01% цены, степень десяти."""
+    return 10 ** math.floor(math.log10(price * 1e-4))
+
+
+def _qty_step(price):
+    return min(1.0, 10 ** math.floor(math.log10(10 / price)))
+
+
+def _fmt(value):
+    return f"{value:.10f}".rstrip("0").rstrip(".") if value else "0"
+
+
+class SimulatedMarket:
+    """Книга одного символа на симуляторе: применяет обновления ленты и рассылает delta подписчикам."""
+
+    def __init__(self, symbol, tick_size, qty_step):
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.qty_step = qty_step
+        self.book = LocalOrderBook(symbol)
+        self.update_id = 0
+        self.last_price = 0.0
+
+    def instrument(self):
+        return {
+            "symbol": self.symbol,
+            "status": "Trading",
+            "priceFilter": {"tickSize": _fmt(self.tick_size)},
+            "lotSizeFilter": {"minOrderQty": _fmt(self.qty_step), "qtyStep": _fmt(self.qty_step), "maxOrderQty": "1000000"},
+        }
+
+    def levels(self, limit=None):
+        """Стороны книги от лучшей цены: (bids, asks) — списки [цена, объем]."""
+        def read(bids, asks):
+            bid_levels = list(zip(reversed(bids.prices), reversed(bids.sizes)))
+            ask_levels = list(zip(asks.prices, asks.sizes))
+            return bid_levels[:limit], ask_levels[:limit]
+        return self.book.read_locked(read)
+
+    def apply(self, bids, asks, snapshot):
+        """Применяет обновление ленты. Возвращает delta (bids, asks) для рассылки."""
+        if snapshot:
+            # Снимок из записи рассылается как delta к текущей книге, чтобы поток клиентов не прерывался
+            old_bids, old_asks = self.levels() if self.book.ready else ([], [])
+            new_bids, new_asks = dict(bids), dict(asks)
+            bids = list(new_bids.items()) + [(price, 0.0) for price, _ in old_bids if price not in new_bids]
+            asks = list(new_asks.items()) + [(price, 0.0) for price, _ in old_asks if price not in new_asks]
+        self.update_id += 1
+        if not self.book.ready:
+            self.book.apply_snapshot(bids, asks, self.update_id, 0, int(time.time() * 1000))
+        else:
+            self.book.apply_delta(bids, asks, self.update_id, 0, int(time.time() * 1000))
+        best_bid, best_ask = self.book.best_bid(), self.book.best_ask()
+        if best_bid and best_ask:
+            self.last_price = (best_bid + best_ask) / 2
+        return bids, asks
+
+    def fill(self, side, qty):
+        """Исполнение рыночного ордера по противоположной стороне книги: (средняя цена, исполненный объем)."""
+        bids, asks = self.levels()
+        remaining, value = qty, 0.0
+        for price, size in (asks if side == "Buy" else bids):
+            take = min(size, remaining)
+            value += take * price
+            remaining -= take
+            if remaining <= 0:
+                break
+        filled = qty - max(remaining, 0.0)
+        return (value / filled if filled else 0.0), filled
+
+    def ticker(self):
+        bids, asks = self.levels(1)
+        return {
+            "symbol": self.symbol,
+            "lastPrice": _fmt(self.last_price),
+            "markPrice": _fmt(self.last_price),
+            "indexPrice": _fmt(self.last_price),
+            "bid1Price": _fmt(bids[0][0]) if bids else "",
+            "bid1Size": _fmt(bids[0][1]) if bids else "",
+            "ask1Price": _fmt(asks[0][0]) if asks else "",
+            "ask1Size": _fmt(asks[0][1]) if asks else "",
+        }
+
+
+class SimulatedAccount:
+    """Позиции одного аккаунта (one-way mode): рыночные ордера, стоп-лосс, тейк-профит и трейлинг-стоп."""
+
+    def __init__(self, taker_fee=TAKER_FEE):
+        self.taker_fee = taker_fee
+        self.positions = {}  # символ -> позиция
+        self.realised_pnl = 0.0
+
+    def position(self, symbol):
+        position = self.positions.get(symbol)
+        if position is None:
+            position = self.positions[symbol] = {
+                "symbol": symbol, "side": "", "size": 0.0, "avgPrice": 0.0, "positionIdx": 0,
+                "stopLoss": 0.0, "takeProfit": 0.0, "trailingStop": 0.0, "activePrice": 0.0,
+                "trailingActive": False, "extreme": 0.0, "cumRealisedPnl": 0.0,
+            }
+        return position
+
+    def execute(self, symbol, side, qty, price, reduce_only=False):
+        """Применяет исполнение к позиции. Возвращает реально исполненный объем."""
+        position = self.position(symbol)
+        if position["size"] and position["side"] != side:
+            closing = min(qty, position["size"])
+            direction = 1 if position["side"] == "Buy" else -1
+            pnl = direction * (price - position["avgPrice"]) * closing
+            position["cumRealisedPnl"] += pnl
+            self.realised_pnl += pnl
+            position["size"] -= closing
+            rest = 0.0 if reduce_only else qty - closing
+            if position["size"] <= 1e-12:
+                self._flat(position)
+                if rest > 0:
+                    position.update(side=side, size=rest, avgPrice=price)
+            return closing + rest
+        if reduce_only:
+            return 0.0
+        size = position["size"] + qty
+        position["avgPrice"] = (position["avgPrice"] * position["size"] + price * qty) / size
+        position.update(side=side, size=size)
+        return qty
+
+    def set_trading_stop(self, symbol, last_price, params):
+        """Параметры set_trading_stop. Возвращает текст ошибки или None."""
+        position = self.positions.get(symbol)
+        if not position or not position["size"]:
+            return "can not set tp/sl/ts for zero position"
+        direction = 1 if position["side"] == "Buy" else -1
+        stop_loss = params.get("stopLoss")
+        if stop_loss not in (None, ""):
+            stop_loss = float(stop_loss)
+            if stop_loss and direction * (last_price - stop_loss) <= 0:
+                return f"StopLoss:{_fmt(stop_loss)} set for {position['side']} position should be on the other side of LastPrice"
+            position["stopLoss"] = stop_loss
+        take_profit = params.get("takeProfit")
+        if take_profit not in (None, ""):
+            position["takeProfit"] = float(take_profit)
+        trailing_stop = params.get("trailingStop")
+        if trailing_stop not in (None, ""):
+            position["trailingStop"] = float(trailing_stop)
+            position["activePrice"] = float(params.get("activePrice") or 0)
+            position["trailingActive"] = False
+            position["extreme"] = last_price
+        return None
+
+    def triggered(self, symbol, price):
+        """Проверяет стопы позиции по последней цене. Возвращает тип сработавшего стопа или None."""
+        position = self.positions.get(symbol)
+        if not position or not position["size"]:
+            return None
+        direction = 1 if position["side"] == "Buy" else -1
+        if position["trailingStop"]:
+            if not position["trailingActive"]:
+                active_price = position["activePrice"]
+                if not active_price or direction * (price - active_price) >= 0:
+                    position["trailingActive"] = True
+                    position["extreme"] = price
+            if position["trailingActive"]:
+                position["extreme"] = max(position["extreme"], price) if direction > 0 else min(position["extreme"], price)
+                if direction * (price - (position["extreme"] - direction * position["trailingStop"])) <= 0:
+                    return "TrailingStop"
+        if position["stopLoss"] and direction * (price - position["stopLoss"]) <= 0:
+            return "StopLoss"
+        if position["takeProfit"] and direction * (price - position["takeProfit"]) >= 0:
+            return "TakeProfit"
+        return None
+
+    def view(self, symbol, mark_price=0.0):
+        """Позиция в формате ответа get_positions / топика position."""
+        position = self.position(symbol)
+        direction = 1 if position["side"] == "Buy" else -1
+        unrealised = direction * (mark_price - position["avgPrice"]) * position["size"] if position["size"] else 0.0
+        return {
+            "symbol": symbol,
+            "category": "linear",
+            "side": position["side"],
+            "size": _fmt(position["size"]),
+            "avgPrice": _fmt(position["avgPrice"]),
+            "entryPrice": _fmt(position["avgPrice"]),
+            "positionIdx": 0,
+            "markPrice": _fmt(mark_price),
+            "positionValue": _fmt(position["avgPrice"] * position["size"]),
+            "unrealisedPnl": _fmt(unrealised),
+            "cumRealisedPnl": _fmt(position["cumRealisedPnl"]),
+            "stopLoss": _fmt(position["stopLoss"]),
+            "takeProfit": _fmt(position["takeProfit"]),
+            "trailingStop": _fmt(position["trailingStop"]),
+            "activePrice": _fmt(position["activePrice"]),
+            "updatedTime": str(int(time.time() * 1000)),
+        }
+
+    @staticmethod
+    def _flat(position):
+        position.update(side="", size=0.0, avgPrice=0.0, stopLoss=0.0, takeProfit=0.0, trailingStop=0.0,
+                        activePrice=0.0, trailingActive=False, extreme=0.0)
+
+
+class ExchangeSimulator:
+    """Подмножество Bybit v5, которым пользуется бот: REST, публичный и приватный WebSocket.
+
+    Книги ведутся лентами (синтетической или записанной), рыночные ордера исполняются
+    по книге, стопы срабатывают по последней цене (середине книги).
+    """
+
+    def __init__(self, latency_ms=0, rate_limit=DEFAULT_RATE_LIMIT, taker_fee=TAKER_FEE):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit
+        self.markets = {}
+        self.account = SimulatedAccount(taker_fee)
+        self.public_subscribers = defaultdict(set)  # топик -> очереди соединений
+        self.private_connections = []  # {"outbox", "topics"} приватных соединений
+        self.stats = {"requests": defaultdict(int), "orders": 0, "fills": 0, "stops_triggered": 0, "rate_limited": 0}
+        self._windows = {}  # (ключ, путь) -> (секунда, число запросов)
+        self._feeds = []
+
+    def add_market(self, symbol, tick_size, qty_step):
+        market = self.markets[symbol] = SimulatedMarket(symbol, tick_size, qty_step)
+        return market
+
+    def add_synthetic(self, symbol, price, interval=0.1, volatility=0.0005, levels=SYNTHETIC_LEVELS, skew=1.0):
+        """Синтетическая книга: случайное блуждание середины, levels уровней на сторону.
+
+        skew — отношение объема асков к объему бидов (больше 1 — перевес асков).
+        """
+        market = self.add_market(symbol, _tick_size(price), _qty_step(price))
+        self._feeds.append(self._synthetic_feed(market, price, interval, volatility, levels, skew))
+        return market
+
+    def add_recorded(self, symbol, root=RECORDINGS_DIR, start_ts=None, end_ts=None, speed=1.0):
+        """Книга из записи OrderBookRecorder; speed — ускорение времени (0 — без пауз)."""
+        replay = OrderBookReplay(symbol, root)
+        first = next(replay.messages(start_ts, end_ts), None)
+        if first is None:
+            raise ValueError(f"Нет записей книги {symbol}")
+        prices = first[3]["price"][first[3]["price"] > 0]
+        price = float(prices.mean()) if len(prices) else 1.0
+        market = self.add_market(symbol, _tick_size(price), _qty_step(price))
+        self._feeds.append(self._recorded_feed(market, replay, start_ts, end_ts, speed))
+        return market
+
+    async def start_feeds(self):
+        for feed in self._feeds:
+            asyncio.get_running_loop().create_task(feed)
+
+    # Ленты книг
+
+    async def _synthetic_feed(self, market, price, interval, volatility, levels, skew):
+        tick = market.tick_size
+        previous_bids, previous_asks = {}, {}
+        while True:
+            price *= math.exp(random.gauss(0, volatility))
+            mid = round(price / tick)
+            bids = {round((mid - i) * tick, 10): round(random.uniform(1, 100) / price * 1000, 6) for i in range(1, levels + 1)}
+            asks = {round((mid + i) * tick, 10): round(skew * random.uniform(1, 100) / price * 1000, 6) for i in range(1, levels + 1)}
+            delta_bids = [(p, s) for p, s in bids.items() if previous_bids.get(p) != s]
+            delta_bids += [(p, 0.0) for p in previous_bids if p not in bids]
+            delta_asks = [(p, s) for p, s in asks.items() if previous_asks.get(p) != s]
+            delta_asks += [(p, 0.0) for p in previous_asks if p not in asks]
+            previous_bids, previous_asks = bids, asks
+            self.on_book(market, delta_bids, delta_asks, False)
+            await asyncio.sleep(interval)
+
+    async def _recorded_feed(self, market, replay, start_ts, end_ts, speed):
+        started, first_ts = time.monotonic(), None
+        for ts, _, snapshot, rows in replay.messages(start_ts, end_ts):
+            if first_ts is None:
+                first_ts = ts
+            if speed:
+                delay = (ts - first_ts) / 1000 / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+            bids = list(zip(rows["price"][rows["side"] > 0].tolist(), rows["size"][rows["side"] > 0].tolist()))
+            asks = list(zip(rows["price"][rows["side"] < 0].tolist(), rows["size"][rows["side"] < 0].tolist()))
+            self.on_book(market, bids, asks, snapshot)
+        logger.info(f"Запись книги {market.symbol} воспроизведена до конца")
+
+    def on_book(self, market, bids, asks, snapshot):
+        """Применяет обновление книги, рассылает orderbook и tickers, проверяет стопы."""
+        last_price = market.last_price
+        bids, asks = market.apply(bids, asks, snapshot)
+        now = int(time.time() * 1000)
+        data = {"s": market.symbol, "b": [[_fmt(p), _fmt(s)] for p, s in bids],
+                "a": [[_fmt(p), _fmt(s)] for p, s in asks], "u": market.update_id, "seq": market.update_id}
+        for depth in (1, 50, 200, 500):
+            topic = f"orderbook.{depth}.{market.symbol}"
+            if self.public_subscribers.get(topic):
+                self._publish(topic, {"topic": topic, "type": "delta", "ts": now, "data": data, "cts": now})
+        if market.last_price != last_price:
+            topic = f"tickers.{market.symbol}"
+            if self.public_subscribers.get(topic):
+                self._publish(topic, {"topic": topic, "type": "delta", "ts": now, "data": market.ticker()})
+            stop_type = self.account.triggered(market.symbol, market.last_price)
+            if stop_type:
+                self.stats["stops_triggered"] += 1
+                position = self.account.positions[market.symbol]
+                close_side = "Sell" if position["side"] == "Buy" else "Buy"
+                logger.info(f"Сработал {stop_type} {market.symbol} по цене {_fmt(market.last_price)}")
+                self.place_market_order(market, close_side, position["size"], True, stop_type)
+
+    def _publish(self, topic, message):
+        raw = json.dumps(message)
+        for outbox in list(self.public_subscribers.get(topic, ())):
+            outbox.put_nowait(raw)
+
+    def _publish_private(self, topic, data):
+        now = int(time.time() * 1000)
+        for connection in list(self.private_connections):
+            for subscribed in connection["topics"]:
+                if subscribed.split(".")[0] == topic:
+                    message = {"id": uuid.uuid4().hex, "topic": subscribed, "creationTime": now, "data": data}
+                    connection["outbox"].put_nowait(json.dumps(message))
+
+    # Торговля
+
+    def place_market_order(self, market, side, qty, reduce_only=False, stop_order_type="", order_link_id=""):
+        """Исполняет рыночный ордер и рассылает order, execution и position. Возвращает (ордер, ошибка)."""
+        self.stats["orders"] += 1
+        order_id = str(uuid.uuid4())
+        price, filled = market.fill(side, qty)
+        filled = self.account.execute(market.symbol, side, filled, price, reduce_only) if filled else 0.0
+        now = str(int(time.time() * 1000))
+        order = {
+            "orderId": order_id, "orderLinkId": order_link_id, "symbol": market.symbol, "category": "linear",
+            "side": side, "orderType": "Market", "qty": _fmt(qty), "cumExecQty": _fmt(filled),
+            "avgPrice": _fmt(price if filled else 0.0), "reduceOnly": reduce_only, "stopOrderType": stop_order_type,
+            "orderStatus": "Filled" if filled >= qty else ("PartiallyFilledCanceled" if filled else "Cancelled"),
+            "createdTime": now, "updatedTime": now,
+        }
+        self._publish_private("order", [order])
+        if not filled:
+            return order, "no liquidity" if not reduce_only else "reduce-only order has no position to reduce"
+        self.stats["fills"] += 1
+        fee = filled * price * self.account.taker_fee
+        self._publish_private("execution", [{
+            "orderId": order_id, "orderLinkId": order_link_id, "symbol": market.symbol, "category": "linear",
+            "side": side, "execId": str(uuid.uuid4()), "execPrice": _fmt(price), "execQty": _fmt(filled),
+            "execFee": _fmt(fee), "execType": "Trade", "orderType": "Market", "stopOrderType": stop_order_type,
+            "isMaker": False, "execTime": now,
+        }])
+        self._publish_private("position", [self.account.view(market.symbol, market.last_price)])
+        return order, None
+
+    def check_rate_limit(self, api_key, path):
+        """Окно в одну секунду на ключ и эндпоинт. Возвращает (разрешено, заголовки X-Bapi-Limit-*)."""
+        second = int(time.time())
+        window_second, count = self._windows.get((api_key, path), (second, 0))
+        if window_second != second:
+            count = 0
+        count += 1
+        self._windows[(api_key, path)] = (second, count)
+        headers = {
+            "X-Bapi-Limit": str(self.rate_limit),
+            "X-Bapi-Limit-Status": str(max(self.rate_limit - count, 0)),
+            "X-Bapi-Limit-Reset-Timestamp": str((second + 1) * 1000),
+        }
+        return count <= self.rate_limit, headers
+
+
+simulator = ExchangeSimulator()
+
+app = Quart(__name__)
+
+
+def _response(result, ret_code=0, ret_msg="OK", headers=None):
+    response = jsonify({"retCode": ret_code, "retMsg": ret_msg, "result": result, "retExtInfo": {},
+                        "time": int(time.time() * 1000)})
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
+
+
+async def _private(handler):
+    """Проверка ключа и лимита приватного эндпоинта, затем вызов обработчика с параметрами запроса."""
+    api_key = request.headers.get("X-BAPI-API-KEY")
+    if not api_key or not request.headers.get("X-BAPI-SIGN"):
+        return _response({}, RET_AUTH_ERROR, "Invalid api_key")
+    allowed, headers = simulator.check_rate_limit(api_key, request.path)
+    if not allowed:
+        simulator.stats["rate_limited"] += 1
+        return _response({}, RET_RATE_LIMIT, "Too many visits!", headers)
+    if request.method == "GET":
+        params = dict(request.args)
+    else:
+        params = json.loads(await request.get_data(as_text=True) or "{}")
+    result, ret_code, ret_msg = handler(params)
+    return _response(result, ret_code, ret_msg, headers)
+
+
+@app.before_request
+async def before_request():
+    simulator.stats["requests"][request.path] += 1
+    if simulator.latency_ms:
+        await asyncio.sleep(simulator.latency_ms / 1000)
+
+
+@app.before_serving
+async def startup():
+    await simulator.start_feeds()
+
+
+@app.route('/v5/market/time', methods=['GET'])
+async def market_time():
+    now = time.time_ns()
+    return _response({"timeSecond": str(now // 10 ** 9), "timeNano": str(now)})
+
+
+@app.route('/v5/market/instruments-info', methods=['GET'])
+async def instruments_info():
+    symbol = request.args.get("symbol")
+    instruments = [market.instrument() for market in simulator.markets.values() if not symbol or market.symbol == symbol]
+    return _response({"category": request.args.get("category", "linear"), "list": instruments, "nextPageCursor": ""})
+
+
+@app.route('/v5/market/tickers', methods=['GET'])
+async def tickers():
+    symbol = request.args.get("symbol")
+    result = [market.ticker() for market in simulator.markets.values() if not symbol or market.symbol == symbol]
+    return _response({"category": request.args.get("category", "linear"), "list": result})
+
+
+@app.route('/v5/market/orderbook', methods=['GET'])
+async def orderbook():
+    market = simulator.markets.get(request.args.get("symbol", ""))
+    if market is None:
+        return _response({}, RET_PARAMS_ERROR, "params error: symbol invalid")
+    bids, asks = market.levels(int(request.args.get("limit", 25)))
+    return _response({
+        "s": market.symbol, "b": [[_fmt(p), _fmt(s)] for p, s in bids], "a": [[_fmt(p), _fmt(s)] for p, s in asks],
+        "ts": int(time.time() * 1000), "u": market.update_id, "seq": market.update_id,
+    })
+
+
+def _get_positions(params):
+    symbol = params.get("symbol")
+    if symbol:
+        if symbol not in simulator.markets:
+            return {}, RET_PARAMS_ERROR, "params error: symbol invalid"
+        symbols = [symbol]
+    else:
+        symbols = [item for item, position in simulator.account.positions.items() if position["size"]]
+    result = [simulator.account.view(item, simulator.markets[item].last_price) for item in symbols]
+    return {"category": "linear", "list": result, "nextPageCursor": ""}, 0, "OK"
+
+
+def _place_order(params):
+    market = simulator.markets.get(params.get("symbol", ""))
+    if market is None:
+        return {}, RET_SYMBOL_NOT_FOUND, "symbol not exist"
+    if params.get("orderType") != "Market":
+        return {}, RET_PARAMS_ERROR, "only Market orders are supported by the simulator"
+    side = params.get("side")
+    qty = float(params.get("qty") or 0)
+    if side not in ("Buy", "Sell") or qty <= 0:
+        return {}, RET_PARAMS_ERROR, "params error: side or qty invalid"
+    # Как и биржа, ордер со стопом не с той стороны цены отклоняется целиком
+    direction = 1 if side == "Buy" else -1
+    stop_loss = float(params.get("stopLoss") or 0)
+    if stop_loss and direction * (market.last_price - stop_loss) <= 0:
+        return {}, RET_PARAMS_ERROR, f"StopLoss:{_fmt(stop_loss)} set for {side} position should be on the other side of LastPrice"
+    take_profit = float(params.get("takeProfit") or 0)
+    if take_profit and direction * (take_profit - market.last_price) <= 0:
+        return {}, RET_PARAMS_ERROR, f"TakeProfit:{_fmt(take_profit)} set for {side} position should be on the other side of LastPrice"
+    order, error = simulator.place_market_order(market, side, qty, bool(params.get("reduceOnly")),
+                                                order_link_id=params.get("orderLinkId", ""))
+    if error:
+        return {}, RET_PARAMS_ERROR, error
+    # Стоп-лосс и тейк-профит, переданные вместе с ордером
+    if params.get("stopLoss") or params.get("takeProfit"):
+        simulator.account.set_trading_stop(market.symbol, market.last_price, params)
+        simulator._publish_private("position", [simulator.account.view(market.symbol, market.last_price)])
+    return {"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]}, 0, "OK"
+
+
+def _cancel_all_orders(params):
+    # Рыночные ордера исполняются сразу, активных ордеров на симуляторе нет
+    return {"list": [], "success": "1"}, 0, "OK"
+
+
+def _set_trading_stop(params):
+    market = simulator.markets.get(params.get("symbol", ""))
+    if market is None:
+        return {}, RET_SYMBOL_NOT_FOUND, "symbol not exist"
+    error = simulator.account.set_trading_stop(market.symbol, market.last_price, params)
+    if error:
+        return {}, RET_PARAMS_ERROR, error
+    simulator._publish_private("position", [simulator.account.view(market.symbol, market.last_price)])
+    return {}, 0, "OK"
+
+
+@app.route('/v5/position/list', methods=['GET'])
+async def position_list():
+    return await _private(_get_positions)
+
+
+@app.route('/v5/order/create', methods=['POST'])
+async def order_create():
+    return await _private(_place_order)
+
+
+@app.route('/v5/order/cancel-all', methods=['POST'])
+async def order_cancel_all():
+    return await _private(_cancel_all_orders)
+
+
+@app.route('/v5/position/trading-stop', methods=['POST'])
+async def trading_stop():
+    return await _private(_set_trading_stop)
+
+
+@app.route('/simulator/stats', methods=['GET'])
+async def simulator_stats():
+    return jsonify({
+        **simulator.stats,
+        "realised_pnl": simulator.account.realised_pnl,
+        "positions": {symbol: simulator.account.view(symbol, simulator.markets[symbol].last_price)
+                      for symbol, position in simulator.account.positions.items() if position["size"]},
+    })
+
+
+async def _connection(handle_message, outbox):
+    """Чтение запросов клиента и отправка сообщений из очереди соединения."""
+    async def writer():
+        while True:
+            await websocket.send(await outbox.get())
+
+    writer_task = asyncio.get_running_loop().create_task(writer())
+    try:
+        while True:
+            raw = await websocket.receive()
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            op = message.get("op")
+            if op == "ping":
+                outbox.put_nowait(json.dumps({"op": "pong", "success": True, "ret_msg": "pong", "conn_id": ""}))
+                continue
+            handle_message(op, message.get("args", []))
+            outbox.put_nowait(json.dumps({"op": op, "success": True, "ret_msg": "", "conn_id": ""}))
+    finally:
+        writer_task.cancel()
+
+
+@app.websocket('/v5/public/linear')
+async def public_ws():
+    outbox = asyncio.Queue()
+    topics = set()
+
+    def handle(op, args):
+        for topic in args:
+            if op == "subscribe":
+                topics.add(topic)
+                simulator.public_subscribers[topic].add(outbox)
+                _send_snapshot(topic, outbox)
+            elif op == "unsubscribe":
+                topics.discard(topic)
+                simulator.public_subscribers[topic].discard(outbox)
+
+    try:
+        await _connection(handle, outbox)
+    finally:
+        for topic in topics:
+            simulator.public_subscribers[topic].discard(outbox)
+
+
+def _send_snapshot(topic, outbox):
+    """Первое сообщение подписки: snapshot книги или тикера."""
+    parts = topic.split(".")
+    market = simulator.markets.get(parts[-1])
+    if market is None or not market.book.ready:
+        return
+    now = int(time.time() * 1000)
+    if parts[0] == "orderbook":
+        bids, asks = market.levels(int(parts[1]))
+        data = {"s": market.symbol, "b": [[_fmt(p), _fmt(s)] for p, s in bids],
+                "a": [[_fmt(p), _fmt(s)] for p, s in asks], "u": market.update_id, "seq": market.update_id}
+        outbox.put_nowait(json.dumps({"topic": topic, "type": "snapshot", "ts": now, "data": data, "cts": now}))
+    elif parts[0] == "tickers":
+        outbox.put_nowait(json.dumps({"topic": topic, "type": "snapshot", "ts": now, "data": market.ticker()}))
+
+
+@app.websocket('/v5/private')
+async def private_ws():
+    connection = {"outbox": asyncio.Queue(), "topics": set()}
+
+    def handle(op, args):
+        if op == "subscribe":
+            connection["topics"].update(args)
+        elif op == "unsubscribe":
+            connection["topics"].difference_update(args)
+
+    simulator.private_connections.append(connection)
+    try:
+        await _connection(handle, connection["outbox"])
+    finally:
+        simulator.private_connections.remove(connection)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный симулятор Bybit v5 для нагрузочных тестов бота")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--synthetic", nargs="*", default=[], metavar="SYMBOL:PRICE",
+                        help="синтетические книги, например BTCUSDT:60000")
+    parser.add_argument("--interval", type=float, default=0.1, help="период обновления синтетической книги, секунды")
+    parser.add_argument("--skew", type=float, default=1.0, help="отношение объема асков к бидам в синтетических книгах")
+    parser.add_argument("--replay", nargs="*", default=[], metavar="SYMBOL", help="книги из записей OrderBookRecorder")
+    parser.add_argument("--root", default=RECORDINGS_DIR)
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение воспроизведения записей (0 — без пауз)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка каждого ответа REST")
+    parser.add_argument("--rate-limit", type=int, default=DEFAULT_RATE_LIMIT, help="лимит приватных эндпоинтов, запросов в секунду")
+    args = parser.parse_args()
+
+    simulator.latency_ms = args.latency_ms
+    simulator.rate_limit = args.rate_limit
+    for item in args.synthetic:
+        symbol, price = item.split(":")
+        simulator.add_synthetic(symbol.upper(), float(price), args.interval, skew=args.skew)
+    for symbol in args.replay:
+        simulator.add_recorded(symbol.upper(), args.root, speed=args.speed)
+
+    logger.info(f"Симулятор: REST http://127.0.0.1:{args.port}, WebSocket ws://127.0.0.1:{args.port}")
+    logger.info(f"Для бота: BYBIT_REST_URL=http://127.0.0.1:{args.port} BYBIT_WS_URL=ws://127.0.0.1:{args.port}")
+    config = Config()
+    config.bind = [f"0.0.0.0:{args.port}"]
+    asyncio.run(serve(app, config))
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+# Настройка логирования
+logger = logging.getLogger("InstrumentRegistry")
+
+# Файл кэша для быстрого старта
+INSTRUMENTS_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instruments_cache.json")
+
+# Перезагрузка при запросе неизвестного символа не чаще, чем раз в столько секунд
+MIN_RELOAD_INTERVAL = 60
+
+# Суффиксы котируемой валюты и множители-префиксы ("1000PEPEUSDT") для поиска похожих символов
+QUOTE_SUFFIXES = ("USDT", "USDC", "PERP", "USD")
+MULTIPLIER_PREFIX = re.compile(r"^10+(?=[A-Z])")
+
+# Общий экземпляр на процесс
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _parse_instrument(instrument):
+    """Оставляет из ответа get_instruments_info только нужные для ордеров поля."""
+    lot_size_filter = instrument.get("lotSizeFilter", {})
+    price_filter = instrument.get("priceFilter", {})
+    return {
+        "symbol": instrument["symbol"],
+        "status": instrument.get("status", ""),
+        "tickSize": float(price_filter.get("tickSize") or 0),
+        "minOrderQty": float(lot_size_filter.get("minOrderQty") or 1),
+        "qtyStep": float(lot_size_filter.get("qtyStep") or lot_size_filter.get("basePrecision") or 1),
+        "maxOrderQty": float(lot_size_filter.get("maxOrderQty") or lot_size_filter.get("maxMktOrderQty") or 0),
+    }
+
+
+def symbol_base(symbol):
+    """Базовая монета символа без множителя и котируемой валюты: 1000PEPEUSDT -> PEPE."""
+    base = MULTIPLIER_PREFIX.sub("", symbol.upper())
+    for suffix in QUOTE_SUFFIXES:
+        if base.endswith(suffix) and len(base) > len(suffix):
+            return base[:-len(suffix)]
+    return base
+
+
+def round_price(price, tick_size):
+    """Округляет цену до ближайшего кратного шага цены инструмента."""
+    if not tick_size:
+        return price
+    tick = Decimal(str(tick_size))
+    return float((Decimal(str(price)) / tick).quantize(Decimal(1), rounding=ROUND_HALF_UP) * tick)
+
+
+def format_price(price, tick_size):
+    """Цена для запроса к Bybit: округление до шага цены и запись без экспоненты (0.00001172, а не 1.172e-05)."""
+    value = Decimal(str(price))
+    if tick_size:
+        tick = Decimal(str(tick_size))
+        value = (value / tick).quantize(Decimal(1), rounding=ROUND_HALF_UP) * tick
+    return format(value.normalize(), "f")
+
+
+def round_qty(qty, qty_step):
+    """Округляет количество вниз до кратного шага количества (в том числе целого шага больше 1)."""
+    if not qty_step:
+        return qty
+    step = Decimal(str(qty_step))
+    return float((Decimal(str(qty)) / step).to_integral_value(ROUND_DOWN) * step)
+
+
+class InstrumentRegistry:
+    """Справочник инструментов Bybit, проиндексированный по символу.
+
+    Загружается один раз (или из файла кэша), затем обновляется в фоне раз в ttl секунд.
+    """
+
+    def __init__(self, session, categories=("linear",), ttl=3600, cache_path=INSTRUMENTS_CACHE_PATH):
+        self.session = session
+        self.categories = list(categories)
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.instruments = {}  # категория -> {символ -> инструмент}
+        self.updated_at = {}  # категория -> время загрузки
+        self.tradable = {}  # категория -> множество торгуемых символов
+        self.bases = {}  # категория -> {базовая монета -> символы}
+        self.reload_attempts = {}  # категория -> время последней перезагрузки по неизвестному символу
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._refresh_thread = None
+
+    def start(self):
+        """Загружает справочник из файла кэша, устаревшие категории — с биржи, и запускает фоновое обновление."""
+        self.load_cache()
+        for category in self.categories:
+            if self.age(category) > self.ttl:
+                try:
+                    self.refresh(category)
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки инструментов {category}: {e}")
+        if not self._refresh_thread:
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, name="instruments-refresh", daemon=True)
+            self._refresh_thread.start()
+        return self
+
+    def age(self, category="linear"):
+        return time.time() - self.updated_at.get(category, 0)
+
+    def refresh(self, category="linear"):
+        """Загружает все инструменты категории постранично."""
+        instruments = {}
+        cursor = None
+        while True:
+            params = {"category": category, "limit": 1000}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.session.get_instruments_info(**params)
+            if response.get("retCode") != 0:
+                logger.error(f"Ошибка загрузки инструментов {category}: {response.get('retMsg')}")
+                return False
+            result = response.get("result", {})
+            for instrument in result.get("list", []):
+                instruments[instrument["symbol"]] = _parse_instrument(instrument)
+            cursor = result.get("nextPageCursor")
+            if not cursor:
+                break
+
+        with self._lock:
+            self.instruments[category] = instruments
+            self.updated_at[category] = time.time()
+            if category not in self.categories:
+                self.categories.append(category)
+            self._index(category)
+        logger.info(f"Загружено инструментов {category}: {len(instruments)}")
+        self.save_cache()
+        return True
+
+    def get(self, symbol, category="linear"):
+        """Параметры инструмента или None.
+
+        Неизвестная категория загружается при первом обращении; если символа нет
+        (например, новый листинг), справочник перезагружается не чаще раза в минуту.
+        """
+        instrument = self.instruments.get(category, {}).get(symbol)
+        if instrument is None and self._reload_due(category):
+            self._reload(category)
+            instrument = self.instruments.get(category, {}).get(symbol)
+        return instrument
+
+    def _reload_due(self, category):
+        last_attempt = max(self.updated_at.get(category, 0), self.reload_attempts.get(category, 0))
+        return time.time() - last_attempt > MIN_RELOAD_INTERVAL
+
+    def _reload(self, category):
+        # Одна перезагрузка за раз; попытка учитывается и при ошибке, чтобы не повторять ее на каждом запросе
+        with self._reload_lock:
+            if not self._reload_due(category):
+                return
+            self.reload_attempts[category] = time.time()
+            try:
+                self.refresh(category)
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки инструментов {category}: {e}")
+
+    def symbols(self, category="linear"):
+        return self.instruments.get(category, {}).keys()
+
+    def is_tradable(self, symbol, category="linear"):
+        """Проверка символа по локальному индексу.
+
+        Неизвестный символ (новый листинг) перезагружает справочник, как в get(), не чаще раза в минуту.
+        """
+        if symbol in self.tradable.get(category, ()):
+            return True
+        if symbol not in self.instruments.get(category, {}) and self._reload_due(category):
+            self._reload(category)
+        return symbol in self.tradable.get(category, ())
+
+    def suggest(self, symbol, category="linear", limit=3):
+        """Похожие торгуемые символы: та же монета с другим суффиксом или множителем."""
+        candidates = self.bases.get(category, {}).get(symbol_base(symbol), [])
+        return [candidate for candidate in candidates if candidate != symbol][:limit]
+
+    def _index(self, category):
+        tradable = set()
+        bases = {}
+        for symbol, instrument in self.instruments[category].items():
+            if instrument.get("status", "Trading") != "Trading":
+                continue
+            tradable.add(symbol)
+            bases.setdefault(symbol_base(symbol), []).append(symbol)
+        for symbols in bases.values():
+            # Сначала USDT-пары, затем более короткие символы
+            symbols.sort(key=lambda item: (not item.endswith("USDT"), len(item)))
+        self.tradable[category] = tradable
+        self.bases[category] = bases
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ошибка чтения кэша инструментов {self.cache_path}: {e}")
+            return False
+        with self._lock:
+            for category, entry in cache.items():
+                self.instruments[category] = entry["instruments"]
+                self.updated_at[category] = entry["updated_at"]
+                if category not in self.categories:
+                    self.categories.append(category)
+                self._index(category)
+        return True
+
+    def save_cache(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            cache = {
+                category: {"updated_at": self.updated_at[category], "instruments": instruments}
+                for category, instruments in self.instruments.items()
+            }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f"Ошибка записи кэша инструментов {self.cache_path}: {e}")
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(min(self.ttl, 60))
+            for category in list(self.categories):
+                if self.age(category) > self.ttl:
+                    try:
+                        self.refresh(category)
+                    except Exception as e:
+                        logger.error(f"Ошибка обновления инструментов {category}: {e}")
+
+
+def get_instrument_registry(session, categories=("linear",), ttl=3600):
+    """Возвращает общий для процесса InstrumentRegistry (загружается при первом вызове).
+
+    Категории, которых еще нет в уже созданном справочнике, загружаются сразу.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = InstrumentRegistry(session, categories, ttl).start()
+        for category in categories:
+            if category not in _registry.instruments:
+                try:
+                    _registry.refresh(category)
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки инструментов {category}: {e}")
+        return _registry
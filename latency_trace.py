@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Этапы обработки вебхука по порядку
+STAGES = ("webhook", "watch_started", "first_book_read", "signal", "order_sent", "order_acked", "stop_set")
+# Этапы сделки: сбрасываются после нее, чтобы следующая сделка за то же наблюдение тоже попала в замеры
+TRADE_STAGES = STAGES[STAGES.index("signal"):]
+
+# Сколько последних замеров хранить по каждому этапу
+MAX_SAMPLES = 10000
+
+# Общий экземпляр на процесс
+_trace = None
+_trace_lock = threading.Lock()
+
+
+class LatencyTrace:
+    """Время этапов от вебхука до подтверждения ордера и установки стопа, по символам.
+
+    begin(symbol) открывает трассу при получении вебхука; mark(symbol, stage) записывает
+    время от вебхука до этапа (мс) — только первое наступление этапа в трассе.
+    finish_trade(symbol) сбрасывает этапы сделки, end(symbol) закрывает трассу.
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.traces = {}  # символ -> {этап: время perf_counter}
+        self.samples = {stage: deque(maxlen=max_samples) for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def begin(self, symbol):
+        with self._lock:
+            self.traces[symbol] = {"webhook": time.perf_counter()}
+            self.samples["webhook"].append(0.0)
+
+    def mark(self, symbol, stage):
+        now = time.perf_counter()
+        with self._lock:
+            trace = self.traces.get(symbol)
+            if trace is None or stage in trace:
+                return
+            trace[stage] = now
+            self.samples[stage].append((now - trace["webhook"]) * 1000)
+
+    def finish_trade(self, symbol):
+        with self._lock:
+            trace = self.traces.get(symbol)
+            if trace:
+                for stage in TRADE_STAGES:
+                    trace.pop(stage, None)
+
+    def end(self, symbol):
+        with self._lock:
+            self.traces.pop(symbol, None)
+
+    def percentiles(self):
+        """p50/p95/p99 и максимум времени от вебхука до каждого этапа, мс."""
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+        result = {}
+        for stage in STAGES:
+            values = samples[stage]
+            if not len(values):
+                result[stage] = {"count": 0}
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[stage] = {
+                "count": len(values),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(values.max()), 3),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self.traces.clear()
+            for values in self.samples.values():
+                values.clear()
+
+
+def get_latency_trace():
+    """Возвращает общий для процесса LatencyTrace."""
+    global _trace
+    with _trace_lock:
+        if _trace is None:
+            _trace = LatencyTrace()
+        return _trace
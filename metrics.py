@@ -0,0 +1,153 @@
+import threading
+from bisect import bisect_left
+from functools import partial
+
+# Границы корзин гистограмм задержек по умолчанию, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    """Метрика с метками: значения по набору меток создаются value_factory при первом обращении."""
+
+    kind = None
+
+    def __init__(self, name, documentation, value_factory, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._value_factory = value_factory
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        value = self._values.get(values)
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(values, self._value_factory())
+        return value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(self._values.items()):
+            lines.extend(self._render_value(values, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, _CounterValue, labelnames)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_value(self, values, value):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {value.value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, partial(_HistogramValue, self.buckets), labelnames)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_value(self, values, value):
+        with value._lock:
+            counts = list(value.counts)
+            total = value.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', le))} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и их вывод в текстовом формате Prometheus.
+
+    Наблюдение — поиск корзины и увеличение счетчика под коротким локом
+    (доли микросекунды), поэтому метрики можно держать включенными постоянно.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса и метрики горячих путей
+registry = MetricsRegistry()
+
+API_LATENCY = registry.histogram("bybit_api_latency_seconds", "Время запроса к REST API Bybit", ("endpoint",))
+API_QUEUE_WAIT = registry.histogram("bybit_api_queue_wait_seconds", "Ожидание запроса в очереди шлюза и лимитах", ("endpoint",))
+API_ERRORS = registry.counter("bybit_api_errors_total", "Ошибки запросов к REST API Bybit", ("endpoint",))
+LOOP_LAG = registry.histogram("loop_lag_seconds", "Задержка от времени биржи до обработки обновления", ("loop",))
+EVALUATE_TIME = registry.histogram("orderbook_evaluate_seconds", "Время оценки книги ордеров",
+                                   buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+SIGNALS = registry.counter("signals_total", "Подтвержденные сигналы дисбаланса книги", ("side",))
+ORDERS = registry.counter("orders_total", "Размещение ордеров", ("result",))
+STOP_UPDATES = registry.counter("stop_updates_total", "Обновления стоп-лосса", ("result",))
+TELEGRAM_LATENCY = registry.histogram("telegram_send_seconds", "Время отправки сообщения в Telegram")
+TELEGRAM_ERRORS = registry.counter("telegram_errors_total", "Неудачные отправки в Telegram")
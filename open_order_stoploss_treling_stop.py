@@ -1,9 +1,11 @@
 import time
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 import logging
 import os
 from telegram_message import send_message_to_telegram
+from instruments import get_instrument_registry
+from order_entry import OrderEntry
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -21,7 +23,13 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API с реальными ключами
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000)
+session = get_gateway(key, secret)
+
+# Справочник инструментов: загружается один раз и обновляется в фоне
+instrument_registry = get_instrument_registry(session)
+
+# Ордера входа с приложенным стоп-лоссом
+order_entry = OrderEntry(session, instrument_registry)
 
 # Функция для получения текущей цены монеты
 def get_current_price(symbol):
@@ -46,18 +54,13 @@ def get_current_price(symbol):
 # Функция для получения минимального значения qty и шага qty
 def get_qty_limits(symbol):
     try:
-        response = session.get_instruments_info(category="linear")
-        if response.get("retCode") == 0:
-            instruments = response.get("result", {}).get("list", [])
-            for instrument in instruments:
-                if instrument.get("symbol") == symbol:
-                    lot_size_filter = instrument.get("lotSizeFilter", {})
-                    min_qty = float(lot_size_filter.get("minOrderQty", 1))
-                    step_size = float(lot_size_filter.get("qtyStep", 1))
-                    logger.info(f"Минимальное значение qty для {symbol}: {min_qty}, шаг qty: {step_size}")
-                    return min_qty, step_size
-        else:
-            logger.error(f"Ошибка получения информации о символе {symbol}: {response.get('retMsg')}")
+        instrument = instrument_registry.get(symbol)
+        if instrument:
+            min_qty = instrument["minOrderQty"]
+            step_size = instrument["qtyStep"]
+            logger.info(f"Минимальное значение qty для {symbol}: {min_qty}, шаг qty: {step_size}")
+            return min_qty, step_size
+        logger.error(f"Инструмент {symbol} не найден в справочнике.")
     except Exception as e:
         logger.error(f"Ошибка при получении ограничений qty для {symbol}: {e}")
     return 1, 1
@@ -85,63 +88,6 @@ def is_position_open(symbol):
         logger.error(f"Ошибка при проверке позиций для {symbol}: {e}")
         return False
 
-# Функция для установки трейлинг-стопа и стоп-лосса
-def set_trailing_or_stop_loss(symbol, qty, entry_price, side, trailing_stop_percent=1, stop_loss_percent=3):
-    try:
-        if side == "Buy":  # Логика для Long
-            trailing_stop_distance = entry_price * (trailing_stop_percent / 100)
-            stop_loss_price = entry_price * (1 - (stop_loss_percent / 100))
-        elif side == "Sell":  # Логика для Short
-            trailing_stop_distance = entry_price * (trailing_stop_percent / 100)
-            stop_loss_price = entry_price * (1 + (stop_loss_percent / 100))
-        else:
-            raise ValueError(f"Некорректное значение side: {side}")
-
-        # Установка трейлинг-стопа
-        trailing_stop_response = session.place_order(
-            category="linear",
-            symbol=symbol,
-            side="Sell" if side == "Buy" else "Buy",  # Закрытие позиции
-            orderType="Market",
-            qty=str(qty),
-            triggerBy="LastPrice",
-            reduceOnly=True,
-            closeOnTrigger=True,
-            triggerPrice=str(entry_price - trailing_stop_distance if side == "Buy" else entry_price + trailing_stop_distance),
-            trailingStop=str(trailing_stop_distance),
-            triggerDirection=2 if side == "Buy" else 1  # Направление триггера
-        )
-        if trailing_stop_response.get("retCode") == 0:
-            logger.info(f"Успешно установлен трейлинг-стоп для {symbol}.")
-            send_message_to_telegram(f"Успешно установлен трейлинг-стоп для {symbol}.")
-        else:
-            logger.error(f"Ошибка установки трейлинг-стопа: {trailing_stop_response.get('retMsg')}")
-            send_message_to_telegram(f"Ошибка установки трейлинг-стопа: {trailing_stop_response.get('retMsg')}")
-
-        # Установка стоп-лосса
-        stop_loss_response = session.place_order(
-            category="linear",
-            symbol=symbol,
-            side="Sell" if side == "Buy" else "Buy",  # Закрытие позиции
-            orderType="Market",
-            qty=str(qty),
-            triggerBy="LastPrice",
-            reduceOnly=True,
-            closeOnTrigger=True,
-            triggerPrice=str(stop_loss_price),
-            triggerDirection=2 if side == "Buy" else 1  # Направление триггера
-        )
-        if stop_loss_response.get("retCode") == 0:
-            logger.info(f"Успешно установлен стоп-лосс для {symbol} на {stop_loss_price} USDT.")
-            send_message_to_telegram(f"Успешно установлен стоп-лосс для {symbol} на {stop_loss_price} USDT.")
-        else:
-            logger.error(f"Ошибка установки стоп-лосса: {stop_loss_response.get('retMsg')}")
-            send_message_to_telegram(f"Ошибка установки стоп-лосса: {stop_loss_response.get('retMsg')}")
-
-    except Exception as e:
-        logger.error(f"Ошибка при установке защитных ордеров: {e}")
-        send_message_to_telegram(f"Ошибка при установке защитных ордеров: {e}")
-
 # Функция для открытия позиции
 def open_position_with_protection(symbol, side, dollar_value, trailing_stop_percent, stop_loss_percent):
     try:
@@ -171,20 +117,12 @@ def open_position_with_protection(symbol, side, dollar_value, trailing_stop_perc
         qty = round_qty(qty, step_size)
         logger.info(f"Рассчитанное и округлённое количество для {symbol}: {qty}")
 
-        # Размещение ордера
-        response = session.place_order(
-            category="linear",
-            symbol=symbol,
-            side=side,
-            orderType="Market",
-            qty=str(qty),
-            timeInForce="IOC",
-            reduceOnly=False
-        )
+        # Ордер входа со стоп-лоссом; трейлинг-стоп ставится следующим запросом
+        response = order_entry.open(symbol, side, qty, entry_price, stop_loss_percent,
+                                    trailing_stop_percent=trailing_stop_percent)
         if response.get("retCode") == 0:
             logger.info(f"Успешно открыта позиция {side} для {symbol}. Ответ API: {response}")
             send_message_to_telegram(f"Успешно открыта позиция {side} для {symbol}. Ответ API: {response}")
-            set_trailing_or_stop_loss(symbol, qty, entry_price, side, trailing_stop_percent, stop_loss_percent)
         else:
             logger.error(f"Ошибка открытия позиции {side} для {symbol}: {response.get('retMsg')}")
             send_message_to_telegram(f"Ошибка открытия позиции {side} для {symbol}: {response.get('retMsg')}")
@@ -0,0 +1,139 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+# Раз в столько изменений итог стороны пересчитывается заново,
+# чтобы не накапливалась ошибка округления float
+RESUM_INTERVAL = 1000
+
+
+class BookSide:
+    """Одна сторона книги: цены по возрастанию и объемы в array('d') с текущим итогом объема."""
+
+    def __init__(self):
+        self.prices = array('d')
+        self.sizes = array('d')
+        self.total = 0.0
+        self._changes = 0
+
+    def __len__(self):
+        return len(self.prices)
+
+    def load(self, levels):
+        """Заполняет сторону из списка [цена, объем] строк snapshot."""
+        book = sorted((float(price), float(size)) for price, size in levels if float(size) > 0)
+        self.prices = array('d', [price for price, _ in book])
+        self.sizes = array('d', [size for _, size in book])
+        self.total = sum(self.sizes)
+        self._changes = 0
+
+    def set(self, price, size):
+        """Вставляет, меняет или удаляет (size == 0) уровень, обновляя итог за O(1) арифметики."""
+        i = bisect_left(self.prices, price)
+        exists = i < len(self.prices) and self.prices[i] == price
+        if size == 0:
+            if exists:
+                self.total -= self.sizes[i]
+                del self.prices[i]
+                del self.sizes[i]
+        elif exists:
+            self.total += size - self.sizes[i]
+            self.sizes[i] = size
+        else:
+            self.prices.insert(i, price)
+            self.sizes.insert(i, size)
+            self.total += size
+
+        self._changes += 1
+        if self._changes >= RESUM_INTERVAL or not self.prices:
+            self.total = sum(self.sizes)
+            self._changes = 0
+
+    def get(self, price):
+        i = bisect_left(self.prices, price)
+        if i < len(self.prices) and self.prices[i] == price:
+            return self.sizes[i]
+        return 0.0
+
+
+class LocalOrderBook:
+    """Локальная книга ордеров, собираемая из snapshot и delta сообщений Bybit."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = BookSide()  # лучший бид — последний элемент
+        self.asks = BookSide()  # лучший аск — первый элемент
+        self.update_id = 0  # поле "u" из сообщений Bybit
+        self.seq = 0
+        self.ts = 0  # время биржи в мс
+        self.ready = False  # False, пока не получен snapshot
+        self.version = 0  # номер локального обновления
+        self._cond = threading.Condition()
+
+    def apply_snapshot(self, bids, asks, update_id, seq=0, ts=0):
+        with self._cond:
+            self.bids.load(bids)
+            self.asks.load(asks)
+            self._mark_updated(update_id, seq, ts)
+            self.ready = True
+
+    def apply_delta(self, bids, asks, update_id, seq=0, ts=0):
+        """Применяет delta. Возвращает False при пропуске номера обновления."""
+        with self._cond:
+            if not self.ready or update_id != self.update_id + 1:
+                return False
+            self._apply_levels(self.bids, bids)
+            self._apply_levels(self.asks, asks)
+            self._mark_updated(update_id, seq, ts)
+            return True
+
+    def invalidate(self):
+        """Помечает книгу устаревшей до прихода нового snapshot."""
+        with self._cond:
+            self.ready = False
+            self.update_id = 0
+
+    @staticmethod
+    def _apply_levels(side, levels):
+        for price, size in levels:
+            side.set(float(price), float(size))  # Нулевой объем означает удаление уровня
+
+    def _mark_updated(self, update_id, seq, ts):
+        self.update_id = update_id
+        self.seq = seq
+        self.ts = ts
+        self.version += 1
+        self._cond.notify_all()
+
+    def wait_update(self, last_version, timeout=None):
+        """Ждет обновления книги после версии last_version. Возвращает текущую версию."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.ready and self.version != last_version, timeout)
+            return self.version
+
+    def read_locked(self, fn):
+        """Вызывает fn(bids, asks) под блокировкой книги.
+
+        Внутри fn можно брать буферы сторон без копирования (np.frombuffer), но ссылки
+        на них нельзя сохранять после возврата: array('d') не изменяет размер, пока буфер экспортирован.
+        """
+        with self._cond:
+            return fn(self.bids, self.asks)
+
+    def best_bid(self):
+        return self.bids.prices[-1] if self.bids.prices else 0.0
+
+    def best_ask(self):
+        return self.asks.prices[0] if self.asks.prices else 0.0
+
+    def volumes(self):
+        with self._cond:
+            return self.bids.total, self.asks.total
+
+    def percentages(self):
+        """Доля бидов и асков в общем объеме книги, в процентах."""
+        total_bid_volume, total_ask_volume = self.volumes()
+        total_volume = total_bid_volume + total_ask_volume
+        if total_volume <= 0:
+            return 0, 0
+        return total_bid_volume / total_volume * 100, total_ask_volume / total_volume * 100
@@ -0,0 +1,132 @@
+import logging
+
+from pybit.exceptions import InvalidRequestError
+
+from instruments import format_price
+from metrics import STOP_UPDATES
+
+# Настройка логирования
+logger = logging.getLogger("OrderEntry")
+
+# Фрагменты текста ошибки Bybit, по которым видно, что отклонены именно стоп-лосс/тейк-профит
+PROTECTION_ERROR_MARKERS = ("stoploss", "takeprofit", "tp/sl", "tpsl", "stop_loss", "take_profit")
+
+
+def protection_prices(side, entry_price, tick_size=0, stop_loss_percent=None, take_profit_percent=None,
+                      trailing_stop_percent=None):
+    """Цены защиты позиции от цены входа, округленные до шага цены инструмента.
+
+    Возвращает словарь параметров Bybit (stopLoss, takeProfit, trailingStop) в виде строк
+    с десятичной записью; не заданные проценты в него не попадают.
+    """
+    direction = 1 if side == "Buy" else -1
+    prices = {}
+    if stop_loss_percent:
+        prices["stopLoss"] = entry_price * (1 - direction * stop_loss_percent / 100)
+    if take_profit_percent:
+        prices["takeProfit"] = entry_price * (1 + direction * take_profit_percent / 100)
+    if trailing_stop_percent:
+        # Трейлинг-стоп задается расстоянием от экстремума цены, а не ценой; не меньше одного шага
+        prices["trailingStop"] = max(entry_price * trailing_stop_percent / 100, tick_size)
+    return {name: format_price(price, tick_size) for name, price in prices.items()}
+
+
+def is_protection_error(error):
+    message = str(getattr(error, "message", error)).lower()
+    return any(marker in message for marker in PROTECTION_ERROR_MARKERS)
+
+
+class OrderEntry:
+    """Открытие позиции рыночным ордером, к которому сразу приложены стоп-лосс и тейк-профит.
+
+    Защита передается в самом place_order, поэтому позиция не остается без стопа между
+    запросами. Отдельный set_trading_stop нужен только для трейлинг-стопа (Bybit не
+    принимает его в ордере) и если биржа отклонила защиту в ордере.
+    """
+
+    def __init__(self, session, instrument_registry, category="linear", trigger_by="LastPrice"):
+        self.session = session
+        self.instrument_registry = instrument_registry
+        self.category = category
+        self.trigger_by = trigger_by
+
+    def open(self, symbol, side, qty, entry_price, stop_loss_percent=None, take_profit_percent=None,
+             trailing_stop_percent=None):
+        """Размещает ордер входа с защитой. Возвращает ответ place_order; ошибки входа пробрасываются.
+
+        Если задан только трейлинг-стоп, к ордеру прикладывается стоп-лосс на расстоянии
+        трейлинг-стопа — до установки трейлинг-стопа позиция уже защищена.
+        """
+        side = side.capitalize()
+        instrument = self.instrument_registry.get(symbol, self.category) or {}
+        percents = (stop_loss_percent or trailing_stop_percent, take_profit_percent, trailing_stop_percent)
+        prices = protection_prices(side, entry_price, instrument.get("tickSize", 0), *percents)
+        trailing_stop = prices.pop("trailingStop", None)
+
+        order = {
+            "category": self.category,
+            "symbol": symbol,
+            "side": side,
+            "orderType": "Market",
+            "qty": str(qty),
+            "timeInForce": "IOC",
+        }
+        protection = dict(prices, tpslMode="Full")
+        if "stopLoss" in prices:
+            protection["slTriggerBy"] = self.trigger_by
+        if "takeProfit" in prices:
+            protection["tpTriggerBy"] = self.trigger_by
+
+        pending = {}
+        if prices:
+            try:
+                response = self.session.place_order(**order, **protection)
+                logger.info(f"Открыта позиция {side} {qty} {symbol} с защитой {prices}")
+            except InvalidRequestError as e:
+                if not is_protection_error(e):
+                    raise
+                # Биржа не приняла стопы в ордере (например, цена ушла за стоп) — входим без них
+                # и считаем защиту заново от фактической цены входа
+                logger.warning(f"Защита в ордере {symbol} отклонена ({e.message}), ставим ее отдельным запросом")
+                response = self.session.place_order(**order)
+                fill_price = self.position_price(symbol) or entry_price
+                pending = protection_prices(side, fill_price, instrument.get("tickSize", 0), *percents)
+                pending.pop("trailingStop", None)
+        else:
+            response = self.session.place_order(**order)
+            logger.info(f"Открыта позиция {side} {qty} {symbol} без защиты")
+
+        if trailing_stop:
+            pending["trailingStop"] = trailing_stop
+        if pending:
+            self.set_trading_stop(symbol, pending)
+        return response
+
+    def position_price(self, symbol):
+        """Средняя цена входа открытой позиции или None."""
+        try:
+            response = self.session.get_positions(category=self.category, symbol=symbol)
+            for position in response.get("result", {}).get("list", []):
+                if float(position.get("size") or 0) > 0:
+                    return float(position.get("avgPrice") or 0) or None
+        except Exception as e:
+            logger.error(f"Ошибка получения позиции {symbol}: {e}")
+        return None
+
+    def set_trading_stop(self, symbol, params):
+        """Дополнительный запрос set_trading_stop для открытой позиции. Возвращает True при успехе."""
+        try:
+            self.session.set_trading_stop(
+                category=self.category,
+                symbol=symbol,
+                tpslMode="Full",
+                positionIdx=0,
+                **params
+            )
+            logger.info(f"Установлена защита позиции {symbol}: {params}")
+            STOP_UPDATES.labels("ok").inc()
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка установки защиты позиции {symbol}: {e}")
+            STOP_UPDATES.labels("error").inc()
+            return False
@@ -0,0 +1,152 @@
+import logging
+import threading
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger("OrderBookFeatures")
+
+# Признаки, для которых считается скользящий z-score
+ZSCORE_FEATURES = ("spread_bps", "microprice_bps", "top_imbalance", "depth_imbalance", "band_imbalance")
+
+
+class RollingZScore:
+    """Скользящие среднее и дисперсия по окну из window последних векторов за O(1) на обновление."""
+
+    def __init__(self, window, size):
+        self.window = window
+        self.values = np.zeros((window, size))
+        self.sum = np.zeros(size)
+        self.sum_sq = np.zeros(size)
+        self.count = 0
+        self.position = 0
+
+    def update(self, vector):
+        """Добавляет вектор и возвращает его z-score относительно окна (включая сам вектор)."""
+        if self.count == self.window:
+            old = self.values[self.position]
+            self.sum -= old
+            self.sum_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.position] = vector
+        self.sum += vector
+        self.sum_sq += vector * vector
+        self.position = (self.position + 1) % self.window
+
+        mean = self.sum / self.count
+        variance = np.maximum(self.sum_sq / self.count - mean * mean, 0.0)
+        std = np.sqrt(variance)
+        return np.divide(vector - mean, std, out=np.zeros_like(vector), where=std > 0)
+
+
+def _imbalance(bid_volume, ask_volume):
+    total = bid_volume + ask_volume
+    return float((bid_volume - ask_volume) / total) if total > 0 else 0.0
+
+
+class OrderBookFeatures:
+    """Признаки книги одного символа по верхним levels уровням каждой стороны.
+
+    Стороны книги читаются без копирования (np.frombuffer по array('d')), поэтому
+    расчет занимает O(levels) векторных операций независимо от глубины книги.
+    """
+
+    def __init__(self, levels=10, band_bps=10, window=300):
+        self.levels = levels
+        self.band_bps = band_bps
+        # Вес уровня убывает с удалением от лучшей цены: 1, 1/2, 1/3, ...
+        self.weights = 1.0 / np.arange(1, levels + 1)
+        self.zscore = RollingZScore(window, len(ZSCORE_FEATURES))
+        self.features = None
+
+    def update(self, book):
+        """Пересчитывает признаки по текущему состоянию книги. Возвращает словарь или None."""
+        features = book.read_locked(self._compute)
+        if features is None:
+            return None
+        vector = np.array([features[name] for name in ZSCORE_FEATURES])
+        for name, value in zip(ZSCORE_FEATURES, self.zscore.update(vector)):
+            features[f"{name}_z"] = float(value)
+        features["ts"] = book.ts
+        self.features = features
+        return features
+
+    def _compute(self, bids, asks):
+        if not len(bids) or not len(asks):
+            return None
+        # Лучший бид — в конце массива, лучший аск — в начале
+        bid_prices = np.frombuffer(bids.prices)[::-1][:self.levels]
+        bid_sizes = np.frombuffer(bids.sizes)[::-1][:self.levels]
+        ask_prices = np.frombuffer(asks.prices)[:self.levels]
+        ask_sizes = np.frombuffer(asks.sizes)[:self.levels]
+
+        best_bid, best_ask = float(bid_prices[0]), float(ask_prices[0])
+        best_bid_size, best_ask_size = float(bid_sizes[0]), float(ask_sizes[0])
+        mid = (best_bid + best_ask) / 2
+        spread = best_ask - best_bid
+        top_volume = best_bid_size + best_ask_size
+        microprice = (best_ask * best_bid_size + best_bid * best_ask_size) / top_volume if top_volume > 0 else mid
+
+        # Объемы в полосе band_bps от середины: стороны отсортированы, граница — одним бинарным поиском
+        band = mid * self.band_bps / 10000
+        band_bid_volume = bid_sizes[:np.searchsorted(-bid_prices, -(mid - band), side="right")].sum()
+        band_ask_volume = ask_sizes[:np.searchsorted(ask_prices, mid + band, side="right")].sum()
+
+        return {
+            "mid": mid,
+            "spread": spread,
+            "spread_bps": spread / mid * 10000,
+            "microprice": microprice,
+            "microprice_bps": (microprice - mid) / mid * 10000,
+            "top_imbalance": _imbalance(best_bid_size, best_ask_size),
+            "depth_imbalance": _imbalance(
+                float(np.dot(bid_sizes, self.weights[:len(bid_sizes)])),
+                float(np.dot(ask_sizes, self.weights[:len(ask_sizes)]))
+            ),
+            "band_imbalance": _imbalance(float(band_bid_volume), float(band_ask_volume)),
+        }
+
+
+class FeatureStage:
+    """Признаки книг всех символов OrderBookStream, пересчитываемые на каждое обновление книги."""
+
+    def __init__(self, stream, levels=10, band_bps=10, window=300):
+        self.levels = levels
+        self.band_bps = band_bps
+        self.window = window
+        self.symbols = {}  # символ -> OrderBookFeatures
+        self._listeners = []
+        self._lock = threading.Lock()
+        stream.add_listener(self._on_book_update)
+
+    def add_listener(self, callback):
+        """callback(symbol, features) вызывается после каждого пересчета признаков."""
+        self._listeners.append(callback)
+
+    def get(self, symbol):
+        """Последние признаки символа или None."""
+        features = self.symbols.get(symbol)
+        return features.features if features else None
+
+    def remove(self, symbol):
+        with self._lock:
+            self.symbols.pop(symbol, None)
+
+    def _on_book_update(self, symbol, book, message):
+        features = self.symbols.get(symbol)
+        if features is None:
+            with self._lock:
+                features = self.symbols.setdefault(symbol, OrderBookFeatures(self.levels, self.band_bps, self.window))
+        try:
+            result = features.update(book)
+        except Exception as e:
+            logger.error(f"Ошибка расчета признаков книги {symbol}: {e}")
+            return
+        if result is None:
+            return
+        for callback in self._listeners:
+            try:
+                callback(symbol, result)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика признаков {symbol}: {e}")
@@ -1,12 +1,13 @@
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
 from threading import Thread
 from datetime import datetime, timedelta
+from telegram_message import send_message_to_telegram
+from bybit_rest import BybitRestClient
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -25,9 +26,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Жестко заданный список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # Ваши ключи API
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -36,45 +34,14 @@ if not key or not secret:
     logger.error("API_KEY или API_SECRET не заданы. Проверьте файл .env.")
     exit(1)
 
-# Bybit API URL
-BASE_URL = "https://api.bybit.com"
-
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
-
-# Функция для получения времени с сервера Bybit
-def get_server_time():
-    try:
-        url = f"{BASE_URL}/v3/public/time"
-        response = requests.get(url)
-        response.raise_for_status()
-        server_time = response.json().get("time", 0)
-        return int(server_time)
-    except Exception as e:
-        logger.error(f"Ошибка при запросе времени сервера Bybit: {e}")
-        send_message_to_telegram(f"Ошибка при запросе времени сервера Bybit: {e}")
-        return 0
+# Клиент Bybit API: постоянное соединение и смещение часов, обновляемое в фоне
+client = BybitRestClient(key, secret).start()
 
 # Функция для отправки запросов к Bybit API
 def send_request(endpoint, payload):
     try:
-        url = f"{BASE_URL}{endpoint}"
-        headers = {
-            "X-BYBIT-API-KEY": key
-        }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return client.request("POST", endpoint, payload, auth=True)
+    except Exception as e:
         logger.error(f"Ошибка при выполнении запроса к Bybit API: {e}")
         send_message_to_telegram(f"Ошибка при выполнении запроса к Bybit API: {e}")
         return None
@@ -82,29 +49,23 @@ def send_request(endpoint, payload):
 # Функция открытия позиции
 def open_position(symbol, side):
     try:
-        # Получение серверного времени для выполнения запроса
-        server_time = get_server_time()
-        if server_time == 0:
-            raise ValueError("Не удалось получить серверное время.")
-
-        # Параметры запроса
+        # Параметры запроса; время и подпись добавляет клиент
         payload = {
             "category": "linear",
             "symbol": symbol,
             "side": side,
-            "order_type": "Market",
+            "orderType": "Market",
             "qty": "1",  # Пример количества контракта
-            "reduce_only": False,
-            "timestamp": server_time
+            "reduceOnly": False
         }
 
         # Отправка запроса на создание ордера
         response = send_request("/v5/order/create", payload)
-        if response:
+        if response and response.get("retCode") == 0:
             logger.info(f"Открыта позиция {side} для {symbol}. Ответ API: {response}")
             send_message_to_telegram(f"Открыта позиция {side} для {symbol}.")
         else:
-            raise ValueError("Не удалось открыть позицию.")
+            raise ValueError(f"Не удалось открыть позицию: {response.get('retMsg') if response else 'нет ответа'}")
 
     except Exception as e:
         logger.error(f"Ошибка при открытии позиции для {symbol}: {e}")
@@ -124,7 +85,7 @@ def webhook():
         logger.info(f'Получен символ из вебхука: {symbol}')
 
         # Запускаем анализ в отдельном потоке
-        Thread(target=open_position, args=(symbol, "BUY")).start()
+        Thread(target=open_position, args=(symbol, "Buy")).start()
 
         return jsonify({'status': 'success', 'symbol': symbol}), 200
     except Exception as e:
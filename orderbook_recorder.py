@@ -0,0 +1,178 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger("OrderBookRecorder")
+
+# Каталог записей по умолчанию: <каталог>/<символ>/<дата UTC>.bin и .idx
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+# Одна строка — один уровень книги из сообщения snapshot/delta (34 байта)
+RECORD_DTYPE = np.dtype([
+    ("ts", "<i8"),  # время биржи, мс
+    ("update_id", "<i8"),  # поле "u"
+    ("price", "<f8"),
+    ("size", "<f8"),  # 0 — удаление уровня
+    ("side", "i1"),  # 1 — бид, -1 — аск, 0 — сообщение без уровней
+    ("flags", "u1"),
+])
+# Индекс: положение каждого snapshot в файле записи
+INDEX_DTYPE = np.dtype([("ts", "<i8"), ("row", "<i8")])
+
+FLAG_MESSAGE_START = 1  # первая строка сообщения
+FLAG_SNAPSHOT = 2  # строка snapshot (книга целиком)
+
+# Как часто в запись кладется полный снимок книги (точка для перемотки), секунды
+CHECKPOINT_INTERVAL = 60
+# Как часто сбрасывать буферы файлов на диск, секунды
+FLUSH_INTERVAL = 1.0
+
+
+def record_day(ts):
+    """Дата UTC для времени биржи ts в мс."""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def record_paths(root, symbol, day):
+    """Пути файла записи и индекса символа за день."""
+    base = os.path.join(root, symbol, day)
+    return f"{base}.bin", f"{base}.idx"
+
+
+def message_rows(ts, update_id, bids, asks, snapshot):
+    """Строки записи одного сообщения книги."""
+    levels = [(ts, update_id, float(price), float(size), 1, 0) for price, size in bids]
+    levels += [(ts, update_id, float(price), float(size), -1, 0) for price, size in asks]
+    if not levels:
+        levels = [(ts, update_id, 0.0, 0.0, 0, 0)]
+    rows = np.array(levels, dtype=RECORD_DTYPE)
+    rows["flags"] = FLAG_SNAPSHOT if snapshot else 0
+    rows["flags"][0] |= FLAG_MESSAGE_START
+    return rows
+
+
+class _DayFile:
+    """Открытые файлы записи и индекса символа за один день."""
+
+    def __init__(self, root, symbol, day):
+        self.day = day
+        data_path, index_path = record_paths(root, symbol, day)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        self.data = open(data_path, "ab")
+        self.index = open(index_path, "ab")
+        self.rows = os.path.getsize(data_path) // RECORD_DTYPE.itemsize
+
+    def write(self, rows, snapshot_ts=None):
+        if snapshot_ts is not None:
+            self.index.write(np.array([(snapshot_ts, self.rows)], dtype=INDEX_DTYPE).tobytes())
+        self.data.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class OrderBookRecorder:
+    """Запись книг ордеров из OrderBookStream в бинарные файлы по символу и дню.
+
+    Обработчик потока только кладет сообщение в очередь; преобразование в
+    структурированные массивы NumPy и запись на диск выполняет отдельный поток.
+    Каждый файл дня начинается с полного снимка книги, далее снимок повторяется
+    раз в checkpoint_interval секунд, чтобы чтение можно было начать с любого места.
+    """
+
+    def __init__(self, stream, root=RECORDINGS_DIR, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.root = root
+        self.checkpoint_interval_ms = checkpoint_interval * 1000
+        self.messages = 0
+        self.rows = 0
+        self._checkpoints = {}  # символ -> (день, время последнего снимка)
+        self._files = {}  # символ -> _DayFile
+        self._queue = queue.Queue()
+        self._running = False
+        self._thread = None
+        stream.add_listener(self._on_book_update)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="orderbook-recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Дописывает очередь и закрывает файлы."""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout)
+        for day_file in self._files.values():
+            day_file.close()
+        self._files.clear()
+
+    def stats(self):
+        return {"queue_depth": self._queue.qsize(), "messages": self.messages, "rows": self.rows, "symbols": len(self._files)}
+
+    def _on_book_update(self, symbol, book, message):
+        if not self._running:
+            return
+        ts = message.get("ts", 0)
+        day = record_day(ts)
+        checkpoint = self._checkpoints.get(symbol)
+        if (message.get("type") == "snapshot" or checkpoint is None or checkpoint[0] != day
+                or ts - checkpoint[1] >= self.checkpoint_interval_ms):
+            # Снимок книги после применения сообщения заменяет само сообщение
+            self._checkpoints[symbol] = (day, ts)
+            bids, asks = book.read_locked(lambda bids, asks: (
+                list(zip(bids.prices, bids.sizes)), list(zip(asks.prices, asks.sizes))
+            ))
+            self._queue.put((symbol, day, ts, book.update_id, bids, asks, True))
+        else:
+            data = message.get("data", {})
+            self._queue.put((symbol, day, ts, data.get("u", 0), data.get("b", []), data.get("a", []), False))
+
+    def _run(self):
+        last_flush = time.time()
+        while self._running or not self._queue.empty():
+            try:
+                items = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                items = []
+            # Забираем все накопившееся одной пачкой
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for symbol, day, ts, update_id, bids, asks, snapshot in items:
+                try:
+                    self._write(symbol, day, ts, update_id, bids, asks, snapshot)
+                except Exception as e:
+                    logger.error(f"Ошибка записи книги {symbol}: {e}")
+
+            if time.time() - last_flush >= FLUSH_INTERVAL:
+                for day_file in self._files.values():
+                    day_file.flush()
+                last_flush = time.time()
+
+    def _write(self, symbol, day, ts, update_id, bids, asks, snapshot):
+        day_file = self._files.get(symbol)
+        if day_file is None or day_file.day != day:
+            if day_file is not None:
+                day_file.close()
+            day_file = self._files[symbol] = _DayFile(self.root, symbol, day)
+        rows = message_rows(ts, update_id, bids, asks, snapshot)
+        day_file.write(rows, ts if snapshot else None)
+        self.messages += 1
+        self.rows += len(rows)
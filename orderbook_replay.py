@@ -0,0 +1,149 @@
+import logging
+import os
+
+import numpy as np
+
+from order_book import LocalOrderBook
+from orderbook_recorder import (
+    FLAG_MESSAGE_START, FLAG_SNAPSHOT, INDEX_DTYPE, RECORD_DTYPE, RECORDINGS_DIR, record_day, record_paths
+)
+
+# Настройка логирования
+logger = logging.getLogger("OrderBookReplay")
+
+# Сколько строк записи переводить в списки Python за раз при восстановлении книги
+CHUNK_ROWS = 1 << 18
+
+
+class RecordedDay:
+    """Запись книги символа за один день, отображенная в память (np.memmap).
+
+    Файл не читается целиком: поиск по времени — бинарный поиск по колонке ts,
+    сообщения отдаются срезами memmap без копирования.
+    """
+
+    def __init__(self, root, symbol, day):
+        self.symbol = symbol
+        self.day = day
+        data_path, index_path = record_paths(root, symbol, day)
+        rows = os.path.getsize(data_path) // RECORD_DTYPE.itemsize
+        self.records = np.memmap(data_path, dtype=RECORD_DTYPE, mode="r", shape=(rows,)) if rows else np.empty(0, RECORD_DTYPE)
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE) if os.path.exists(index_path) else np.empty(0, INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def row_at(self, ts):
+        """Номер первой строки со временем >= ts."""
+        if ts is None:
+            return 0
+        row = int(np.searchsorted(self.records["ts"], ts, side="left"))
+        # Не разрываем сообщение: отступаем к его первой строке
+        while 0 < row < len(self.records) and not self.records["flags"][row] & FLAG_MESSAGE_START:
+            row -= 1
+        return row
+
+    def end_row(self, ts):
+        """Номер строки, следующей за последним сообщением со временем < ts."""
+        if ts is None:
+            return len(self.records)
+        return self.row_at(ts)
+
+    def checkpoint_row(self, ts):
+        """Строка последнего полного снимка книги не позже ts (0, если снимков нет)."""
+        if ts is None or not len(self.index):
+            return 0
+        i = int(np.searchsorted(self.index["ts"], ts, side="right")) - 1
+        return int(self.index["row"][max(i, 0)])
+
+    def messages(self, start_ts=None, end_ts=None):
+        """Сообщения в диапазоне времени: (ts, update_id, snapshot, rows).
+
+        rows — срез memmap без копирования; rows["price"], rows["size"] и rows["side"] — его колонки.
+        """
+        start, end = self.row_at(start_ts), self.end_row(end_ts)
+        if start >= end:
+            return
+        flags = self.records["flags"][start:end]
+        starts = np.flatnonzero(flags & FLAG_MESSAGE_START) + start
+        bounds = np.append(starts, end)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            rows = self.records[lo:hi]
+            first = rows[0]
+            yield int(first["ts"]), int(first["update_id"]), bool(first["flags"] & FLAG_SNAPSHOT), rows
+
+
+class OrderBookReplay:
+    """Чтение записанных книг символа за произвольный диапазон времени."""
+
+    def __init__(self, symbol, root=RECORDINGS_DIR):
+        self.symbol = symbol
+        self.root = root
+
+    def days(self, start_ts=None, end_ts=None):
+        """Дни с записями в диапазоне, по возрастанию."""
+        directory = os.path.join(self.root, self.symbol)
+        if not os.path.isdir(directory):
+            return []
+        days = sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".bin"))
+        first = record_day(start_ts) if start_ts is not None else None
+        last = record_day(end_ts) if end_ts is not None else None
+        return [day for day in days if (first is None or day >= first) and (last is None or day <= last)]
+
+    def messages(self, start_ts=None, end_ts=None):
+        for day in self.days(start_ts, end_ts):
+            yield from RecordedDay(self.root, self.symbol, day).messages(start_ts, end_ts)
+
+    def books(self, start_ts=None, end_ts=None):
+        """Восстанавливает книгу и выдает (ts, book) после каждого сообщения в [start_ts, end_ts).
+
+        Чтение начинается с ближайшего снимка до start_ts. book — один и тот же изменяемый
+        объект LocalOrderBook; его состояние актуально только до следующей итерации.
+        """
+        book = LocalOrderBook(self.symbol)
+        for day in self.days(start_ts, end_ts):
+            recording = RecordedDay(self.root, self.symbol, day)
+            start = recording.checkpoint_row(start_ts)
+            end = recording.end_row(end_ts)
+            pending = None  # [ts, update_id, snapshot, bids, asks] — собираемое сообщение
+
+            for lo in range(start, end, CHUNK_ROWS):
+                chunk = recording.records[lo:min(lo + CHUNK_ROWS, end)]
+                columns = zip(
+                    chunk["ts"].tolist(), chunk["update_id"].tolist(), chunk["price"].tolist(),
+                    chunk["size"].tolist(), chunk["side"].tolist(), chunk["flags"].tolist()
+                )
+                for ts, update_id, price, size, side, flags in columns:
+                    if flags & FLAG_MESSAGE_START:
+                        if pending and self._apply(book, pending) and (start_ts is None or pending[0] >= start_ts):
+                            yield pending[0], book
+                        pending = [ts, update_id, bool(flags & FLAG_SNAPSHOT), [], []]
+                    if side > 0:
+                        pending[3].append((price, size))
+                    elif side < 0:
+                        pending[4].append((price, size))
+
+            if pending and self._apply(book, pending) and (start_ts is None or pending[0] >= start_ts):
+                yield pending[0], book
+
+    def percentages(self, start_ts=None, end_ts=None):
+        """Время и доля бидов в объеме книги (%) после каждого сообщения — для подбора порогов сигнала."""
+        timestamps = []
+        bid_percentages = []
+        for ts, book in self.books(start_ts, end_ts):
+            timestamps.append(ts)
+            bid_percentages.append(book.percentages()[0])
+        return np.array(timestamps, dtype=np.int64), np.array(bid_percentages)
+
+    def _apply(self, book, message):
+        ts, update_id, snapshot, bids, asks = message
+        if snapshot:
+            book.apply_snapshot(bids, asks, update_id, 0, ts)
+            return True
+        if not book.ready:
+            return False  # До ближайшего снимка восстановить книгу нельзя
+        if not book.apply_delta(bids, asks, update_id, 0, ts):
+            logger.warning(f"Пропуск обновлений в записи {self.symbol}: u={update_id} после {book.update_id}")
+            book.invalidate()
+            return False
+        return True
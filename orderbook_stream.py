@@ -0,0 +1,93 @@
+import logging
+import threading
+
+from bybit_ws import BybitWebSocket, PUBLIC_WS_URLS
+from order_book import LocalOrderBook
+
+# Настройка логирования
+logger = logging.getLogger("OrderBookStream")
+
+
+class OrderBookStream:
+    """Поток книг ордеров Bybit (orderbook.<depth>) с локальными книгами по символам."""
+
+    def __init__(self, category="linear", depth=50, ws_class=BybitWebSocket):
+        self.category = category
+        self.depth = depth
+        self.books = {}
+        self._refs = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._ws = ws_class(
+            PUBLIC_WS_URLS[category],
+            on_message=self._on_message,
+            on_reconnect=self._on_reconnect
+        )
+
+    def topic(self, symbol):
+        return f"orderbook.{self.depth}.{symbol}"
+
+    def subscribe(self, symbol):
+        """Подписывается на книгу символа и возвращает локальную книгу."""
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = LocalOrderBook(symbol)
+            self._refs[symbol] = self._refs.get(symbol, 0) + 1
+            first = self._refs[symbol] == 1
+        self._ws.start()
+        if first:
+            self._ws.subscribe([self.topic(symbol)])
+        return book
+
+    def unsubscribe(self, symbol):
+        with self._lock:
+            refs = self._refs.get(symbol, 0) - 1
+            if refs > 0:
+                self._refs[symbol] = refs
+                return
+            self._refs.pop(symbol, None)
+            self.books.pop(symbol, None)
+        self._ws.unsubscribe([self.topic(symbol)])
+
+    def add_listener(self, callback):
+        """callback(symbol, book, message) вызывается после каждого применения snapshot/delta."""
+        self._listeners.append(callback)
+
+    def get_book(self, symbol):
+        return self.books.get(symbol)
+
+    def _on_reconnect(self):
+        # После переподключения Bybit заново присылает snapshot по каждой подписке
+        for book in list(self.books.values()):
+            book.invalidate()
+
+    def _on_message(self, message):
+        data = message.get("data", {})
+        symbol = data.get("s")
+        book = self.books.get(symbol)
+        if book is None:
+            return
+
+        update_id = data.get("u", 0)
+        seq = data.get("seq", 0)
+        ts = message.get("ts", 0)
+
+        if message.get("type") == "snapshot" or update_id == 1:
+            book.apply_snapshot(data.get("b", []), data.get("a", []), update_id, seq, ts)
+        elif not book.ready:
+            return  # Ждем snapshot после переподписки
+        elif not book.apply_delta(data.get("b", []), data.get("a", []), update_id, seq, ts):
+            logger.warning(
+                f"Пропуск обновлений книги {symbol}: ожидался u={book.update_id + 1}, получен u={update_id}. "
+                f"Запрос нового snapshot."
+            )
+            book.invalidate()
+            self._ws.resubscribe(self.topic(symbol))
+            return
+
+        for callback in self._listeners:
+            try:
+                callback(symbol, book, message)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика книги ордеров {symbol}: {e}")
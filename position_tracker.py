@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from bybit_ws import BybitWebSocket, PRIVATE_WS_URL
+
+# Настройка логирования
+logger = logging.getLogger("PositionTracker")
+
+# Сколько последних исполнений хранить в памяти
+EXECUTIONS_HISTORY = 1000
+
+# Статусы, после которых ордер больше не хранится в таблице активных
+FINAL_ORDER_STATUSES = {"Filled", "Cancelled", "Rejected", "Deactivated", "PartiallyFilledCanceled"}
+
+# Общий экземпляр на процесс
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def _normalize_position(position):
+    # В WebSocket цена входа приходит как entryPrice, в REST — как avgPrice
+    if not position.get("avgPrice") and position.get("entryPrice"):
+        position["avgPrice"] = position["entryPrice"]
+    return position
+
+
+class PositionTracker:
+    """Таблица позиций в памяти, обновляемая из приватных топиков position, order и execution.
+
+    Ключ таблицы — (symbol, positionIdx). Пока WebSocket не подключен и не аутентифицирован,
+    ожидание событий работает через опрос get_positions.
+    """
+
+    def __init__(self, session, api_key, api_secret, category="linear", settle_coin="USDT", poll_interval=5,
+                 ws_class=BybitWebSocket):
+        self.session = session
+        self.category = category
+        self.settle_coin = settle_coin
+        self.poll_interval = poll_interval
+        self.positions = {}  # (symbol, positionIdx) -> позиция
+        self.orders = {}  # orderId -> активный ордер
+        self.executions = deque(maxlen=EXECUTIONS_HISTORY)
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._ws = ws_class(
+            PRIVATE_WS_URL,
+            on_message=self._on_message,
+            on_reconnect=self._on_reconnect,
+            api_key=api_key,
+            api_secret=api_secret
+        )
+
+    @property
+    def running(self):
+        # Только после подтвержденной аутентификации: иначе позиции не придут и нужен опрос REST
+        return self._ws.is_ready()
+
+    def start(self):
+        """Загружает текущие позиции через REST и подписывается на приватные топики."""
+        self._ws.subscribe([f"position.{self.category}", f"order.{self.category}", f"execution.{self.category}"])
+        self._ws.start()
+        self.refresh()
+        return self
+
+    def add_listener(self, callback):
+        """callback(topic, data) вызывается на каждое приватное событие."""
+        self._listeners.append(callback)
+
+    def refresh(self, symbol=None):
+        """Перезагружает позиции через REST (при старте, переподключении или без WebSocket)."""
+        params = {"category": self.category}
+        if symbol:
+            params["symbol"] = symbol
+        else:
+            params["settleCoin"] = self.settle_coin
+        response = self.session.get_positions(**params)
+        if response.get("retCode") != 0:
+            logger.error(f"Ошибка получения позиций: {response.get('retMsg')}")
+            return
+        with self._cond:
+            if symbol:
+                for key in [key for key in self.positions if key[0] == symbol]:
+                    del self.positions[key]
+            else:
+                self.positions.clear()
+            for position in response.get("result", {}).get("list", []):
+                self._store_position(position)
+            self._cond.notify_all()
+
+    def get_position(self, symbol):
+        """Открытая позиция по символу (size > 0) или None."""
+        with self._cond:
+            return self._find_open(symbol)
+
+    def is_open(self, symbol):
+        return self.get_position(symbol) is not None
+
+    def wait_position_opened(self, symbol, timeout=10):
+        """Ждет открытия позиции. Возвращает позицию или None по таймауту."""
+        return self._wait(symbol, lambda: self._find_open(symbol), timeout)
+
+    def wait_position_closed(self, symbol, timeout=None):
+        """Ждет закрытия позиции. Возвращает True, если позиция закрыта."""
+        return self._wait(symbol, lambda: self._find_open(symbol) is None, timeout)
+
+    def _wait(self, symbol, predicate, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if not self.running:
+                # Без WebSocket состояние обновляется опросом REST
+                try:
+                    self.refresh(symbol)
+                except Exception as e:
+                    logger.error(f"Ошибка получения позиции {symbol}: {e}")
+            with self._cond:
+                result = predicate()
+                if result:
+                    return result
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return result
+                # Даже с WebSocket просыпаемся раз в poll_interval: поток мог отключиться или не пройти auth
+                wait_time = self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+                self._cond.wait(wait_time)
+
+    def _find_open(self, symbol):
+        for (position_symbol, _), position in self.positions.items():
+            if position_symbol == symbol and float(position.get("size") or 0) > 0:
+                return position
+        return None
+
+    def _store_position(self, position):
+        key = (position["symbol"], int(position.get("positionIdx", 0)))
+        self.positions[key] = _normalize_position(dict(position))
+
+    def _on_reconnect(self):
+        # За время разрыва могли быть пропущены события — перечитываем позиции в фоне
+        threading.Thread(target=self._safe_refresh, daemon=True).start()
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления позиций после переподключения: {e}")
+
+    def _on_message(self, message):
+        topic = message.get("topic", "")
+        data = message.get("data", [])
+        with self._cond:
+            if topic.startswith("position"):
+                for position in data:
+                    if position.get("category", self.category) == self.category:
+                        self._store_position(position)
+            elif topic.startswith("order"):
+                for order in data:
+                    if order.get("orderStatus") in FINAL_ORDER_STATUSES:
+                        self.orders.pop(order.get("orderId"), None)
+                    else:
+                        self.orders[order.get("orderId")] = order
+            elif topic.startswith("execution"):
+                self.executions.extend(data)
+            self._cond.notify_all()
+
+        for callback in self._listeners:
+            try:
+                callback(topic, data)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {topic}: {e}")
+
+
+def get_position_tracker(session, api_key, api_secret, category="linear"):
+    """Возвращает общий для процесса PositionTracker (запускается при первом вызове)."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PositionTracker(session, api_key, api_secret, category)
+            try:
+                _tracker.start()
+            except Exception as e:
+                logger.error(f"Ошибка запуска отслеживания позиций: {e}")
+        return _tracker
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+
+# Настройка логирования
+logger = logging.getLogger("PriceService")
+
+# Общие экземпляры на процесс, по категориям
+_price_services = {}
+_price_service_lock = threading.Lock()
+
+
+class PriceService:
+    """Снимок цен всех тикеров категории, получаемый одним запросом get_tickers.
+
+    Все мониторы позиций читают цены из одного снимка в памяти; снимок
+    обновляется не чаще, чем раз в max_staleness секунд.
+    """
+
+    def __init__(self, session, category="linear", max_staleness=1.0):
+        self.session = session
+        self.category = category
+        self.max_staleness = max_staleness
+        self.prices = {}  # символ -> lastPrice
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Загружает цены всех тикеров категории одним запросом."""
+        response = self.session.get_tickers(category=self.category)
+        if response.get("retCode") != 0:
+            logger.error(f"Ошибка получения тикеров {self.category}: {response.get('retMsg')}")
+            return
+        self.prices = {
+            ticker["symbol"]: float(ticker.get("lastPrice") or 0)
+            for ticker in response.get("result", {}).get("list", [])
+        }
+        self.updated_at = time.time()
+
+    def age(self):
+        """Возраст снимка в секундах."""
+        return time.time() - self.updated_at
+
+    def get_price(self, symbol):
+        """Цена символа из снимка; 0, если символ не найден."""
+        if self.age() > self.max_staleness:
+            with self._lock:
+                # Пока один поток обновляет снимок, остальные ждут и используют его результат
+                if self.age() > self.max_staleness:
+                    self.refresh()
+        return self.prices.get(symbol, 0)
+
+
+def get_price_service(session, category="linear", max_staleness=1.0):
+    """Возвращает общий для процесса PriceService категории (создается при первом вызове)."""
+    with _price_service_lock:
+        if category not in _price_services:
+            _price_services[category] = PriceService(session, category, max_staleness)
+        return _price_services[category]
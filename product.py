@@ -1,10 +1,15 @@
 from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from telegram_message import send_message_to_telegram
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -23,9 +28,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Жестко заданный список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # Ваши ключи API из переменных окружения
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -35,22 +37,15 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API
-session = HTTP(api_key=key, api_secret=secret, testnet=False)
-
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    success = True
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
-            success = False
-    return success
+session = get_gateway(key, secret)
+
+# Пул проверок книги ордеров: вебхук отвечает сразу, проверка выполняется в фоне
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="orderbook-check")
+
+# Результаты проверок: job_id -> задача (хранятся последние MAX_JOBS)
+MAX_JOBS = 1000
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
 
 # Форматирование книги ордеров
 def format_order_book(response):
@@ -63,7 +58,7 @@ def check_order_book(symbol):
     try:
         if not symbol:
             logger.error("Символ не задан.")
-            return
+            return None
 
         logger.info(f'Проверка книги ордеров для символа: {symbol}')
         response = session.get_orderbook(
@@ -74,7 +69,7 @@ def check_order_book(symbol):
 
         if not response:
             logger.warning(f'Нет данных для символа {symbol}.')
-            return
+            return None
 
         bids, asks = format_order_book(response)
 
@@ -87,7 +82,7 @@ def check_order_book(symbol):
 
         if total_bid_volume + total_ask_volume == 0:
             logger.info(f'Объем ордеров для символа {symbol} равен нулю.')
-            return
+            return {'bid_percentage': 0, 'ask_percentage': 0}
 
         # Рассчитываем проценты
         bid_percentage = (total_bid_volume / (total_bid_volume + total_ask_volume)) * 100
@@ -106,8 +101,31 @@ def check_order_book(symbol):
             logger.info(message)
             send_message_to_telegram(message)
 
+        return {'bid_percentage': round(bid_percentage, 2), 'ask_percentage': round(ask_percentage, 2)}
+
     except Exception as e:
         logger.error(f"Ошибка при проверке книги ордеров для {symbol}: {e}")
+        raise
+
+# Выполнение проверки в пуле с сохранением результата
+def run_job(job, symbol):
+    job['status'] = 'running'
+    try:
+        result = check_order_book(symbol)
+        job.update(status='done', result=result, finished_at=time.time())
+    except Exception as e:
+        job.update(status='error', error=str(e), finished_at=time.time())
+
+# Постановка проверки в очередь
+def submit_job(symbol):
+    job_id = uuid.uuid4().hex
+    job = {'status': 'queued', 'symbol': symbol, 'created_at': time.time()}
+    with jobs_lock:
+        jobs[job_id] = job
+        while len(jobs) > MAX_JOBS:
+            jobs.popitem(last=False)
+    executor.submit(run_job, job, symbol)
+    return job_id
 
 # Вебхук для получения символов
 @app.route('/webhook', methods=['POST'])
@@ -124,14 +142,22 @@ def webhook():
         symbol = data.upper()
         logger.info(f'Получен символ из вебхука: {symbol}')
 
-        # Проверяем книгу ордеров для указанного символа
-        check_order_book(symbol)
+        # Проверка книги ордеров выполняется в пуле, ответ не ждет Bybit и Telegram
+        job_id = submit_job(symbol)
 
-        return jsonify({'status': 'success'}), 200
+        return jsonify({'status': 'accepted', 'job_id': job_id}), 202
     except Exception as e:
         logger.error(f"Ошибка в обработке вебхука: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Результат проверки книги ордеров
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify({'job_id': job_id, **job}), 200
+
 if __name__ == "__main__":
     # Запуск ngrok туннеля
     public_url = ngrok.connect(5000, bind_tls=True).public_url
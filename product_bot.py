@@ -1,13 +1,15 @@
 from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
 from threading import Thread
 from datetime import datetime, timedelta
+from orderbook_stream import OrderBookStream
+from instruments import get_instrument_registry
+from telegram_message import send_message_to_telegram
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,9 +28,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Жестко заданный список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # Ваши ключи API из переменных окружения
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -38,44 +37,19 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API
-session = HTTP(api_key=key, api_secret=secret, testnet=False)
-
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    success = True
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
-            success = False
-    return success
+session = get_gateway(key, secret)
+
+# Локальные книги ордеров из WebSocket
+order_book_stream = OrderBookStream(category="spot", depth=50)
+
+# Символ должен торговаться в обеих категориях; справочник загружается при старте
+SYMBOL_CATEGORIES = ("linear", "spot")
+instrument_registry = get_instrument_registry(session, categories=SYMBOL_CATEGORIES)
 
 # Функция проверки корректности символа
 def is_symbol_valid(symbol):
-    try:
-        # Проверяем, доступна ли книга ордеров для символа
-        response = session.get_orderbook(
-            category="linear",
-            symbol=symbol,
-            limit=1
-        )
-        if 'result' in response and response['result']:
-            return True
-        return False
-    except Exception as e:
-        logger.error(f"Ошибка при проверке символа {symbol}: {e}")
-        return False
-
-# Форматирование книги ордеров
-def format_order_book(response):
-    bids = response.get('b', [])
-    asks = response.get('a', [])
-    return bids, asks
+    # Проверка по локальному справочнику: анализ идет по спотовой книге, а позиция открывается на фьючерсах
+    return all(instrument_registry.is_tradable(symbol, category) for category in SYMBOL_CATEGORIES)
 
 # Функция открытия фьючерсной позиции
 def open_futures_position(symbol, side):
@@ -100,51 +74,37 @@ def analyze_order_book(symbol):
 
     send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
 
+    # Книга обновляется из WebSocket, условие проверяется на каждом delta
+    book = order_book_stream.subscribe(symbol)
+    version = 0
+
     while datetime.now() < end_time:
         try:
-            response = session.get_orderbook(
-                category="spot",
-                symbol=symbol,
-                limit=50
-            ).get('result')
-
-            if not response:
-                logger.warning(f'Нет данных для символа {symbol}. Пропуск анализа.')
-                time.sleep(5)
-                continue
-
-            bids, asks = format_order_book(response)
-
-            bid_volumes = [float(bid[1]) for bid in bids if bid[1] != '0']
-            ask_volumes = [float(ask[1]) for ask in asks if ask[1] != '0']
-
-            total_bid_volume = sum(bid_volumes)
-            total_ask_volume = sum(ask_volumes)
-
-            if total_bid_volume + total_ask_volume == 0:
-                logger.info(f'Объем ордеров для символа {symbol} равен нулю. Пропуск анализа.')
-                time.sleep(5)
-                continue
+            version = book.wait_update(version, timeout=5)
+            if not book.ready:
+                continue  # Книга еще не получена или ждет нового snapshot
 
-            bid_percentage = (total_bid_volume / (total_bid_volume + total_ask_volume)) * 100
-            ask_percentage = (total_ask_volume / (total_bid_volume + total_ask_volume)) * 100
+            bid_percentage, ask_percentage = book.percentages()
 
-            logger.info(
+            logger.debug(
                 f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%."
             )
 
             # Условия для открытия позиции
             if bid_percentage > 85:
+                order_book_stream.unsubscribe(symbol)
                 open_futures_position(symbol, "BUY")
                 return
             elif ask_percentage > 85:
+                order_book_stream.unsubscribe(symbol)
                 open_futures_position(symbol, "SELL")
                 return
 
         except Exception as e:
             logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
+            time.sleep(5)
 
-        time.sleep(5)
+    order_book_stream.unsubscribe(symbol)
 
     # Завершение анализа без выполнения условий
     logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
@@ -165,9 +125,12 @@ def webhook():
 
         # Проверяем валидность символа
         if not is_symbol_valid(symbol):
-            logger.error(f"Неверное название монеты: {symbol}")
-            send_message_to_telegram(f"Неверное название монеты: {symbol}. Анализ не начат.")
-            return jsonify({'error': f'Неверное название монеты: {symbol}'}), 400
+            suggestions = instrument_registry.suggest(symbol, SYMBOL_CATEGORIES[0])
+            hint = f" Возможно, имелось в виду: {', '.join(suggestions)}." if suggestions else ""
+            logger.error(f"Неверное название монеты: {symbol}.{hint}")
+            # Уведомление не задерживает ответ вебхука
+            send_message_to_telegram(f"Неверное название монеты: {symbol}. Анализ не начат.{hint}")
+            return jsonify({'error': f'Неверное название монеты: {symbol}', 'suggestions': suggestions}), 400
 
         # Запускаем анализ в отдельном потоке
         Thread(target=analyze_order_book, args=(symbol,)).start()
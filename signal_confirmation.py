@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+
+# Коды сторон в кольцевом буфере
+SIDE_CODES = {"Buy": 1, "Sell": -1}
+
+
+class _SymbolSignals:
+    """Кольцевой буфер последних N сигналов символа со счетчиками по сторонам."""
+
+    def __init__(self, n):
+        self.readings = np.zeros(n, dtype=np.int8)
+        self.position = 0
+        self.counts = {1: 0, -1: 0}
+        self.side = 0  # Сторона текущей непрерывной серии сигналов
+        self.since = None  # Время начала серии, мс
+
+
+class SignalConfirmation:
+    """Подтверждение сигнала по последним обновлениям книги.
+
+    Сигнал срабатывает, если сторона встречалась не менее k раз из последних
+    n обновлений или (при duration > 0) держится непрерывно не меньше duration
+    секунд. Каждое обновление обрабатывается за O(1).
+    """
+
+    def __init__(self, k=3, n=5, duration=0.0):
+        if not 0 < k <= n:
+            raise ValueError("Должно выполняться 0 < k <= n")
+        self.k = k
+        self.n = n
+        self.duration_ms = duration * 1000
+        self.symbols = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol, side, ts):
+        """Добавляет сигнал ("Buy", "Sell" или None) со временем ts в мс.
+
+        Возвращает подтвержденную сторону или None.
+        """
+        code = SIDE_CODES.get(side, 0)
+        with self._lock:
+            state = self.symbols.get(symbol)
+            if state is None:
+                state = self.symbols[symbol] = _SymbolSignals(self.n)
+
+            old = int(state.readings[state.position])
+            if old:
+                state.counts[old] -= 1
+            state.readings[state.position] = code
+            state.position = (state.position + 1) % self.n
+            if code:
+                state.counts[code] += 1
+
+            if code != state.side:
+                state.side = code
+                state.since = ts
+            if not code:
+                return None
+            if state.counts[code] >= self.k:
+                return side
+            if self.duration_ms and ts - state.since >= self.duration_ms:
+                return side
+            return None
+
+    def reset(self, symbol):
+        """Сбрасывает историю символа (после открытия сделки или окончания наблюдения)."""
+        with self._lock:
+            self.symbols.pop(symbol, None)
+
+    def counts(self, symbol):
+        """Число сигналов Buy и Sell среди последних n обновлений."""
+        state = self.symbols.get(symbol)
+        if state is None:
+            return {"Buy": 0, "Sell": 0}
+        return {"Buy": state.counts[1], "Sell": state.counts[-1]}
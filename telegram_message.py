@@ -1,7 +1,14 @@
 import requests
 import os
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import logging
+from metrics import TELEGRAM_ERRORS, TELEGRAM_LATENCY
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -16,14 +23,108 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 # Жестко заданный список chat_id
 CHAT_IDS = [1395854084, 525006772]
 
+# Сообщения, пришедшие в течение этого времени, склеиваются в одно
+COALESCE_WINDOW = 0.5
+# Максимальная длина сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+# Сколько раз повторять отправку после 429 или сетевой ошибки
+MAX_RETRIES = 3
+
+
+class TelegramDispatcher:
+    """Фоновая отправка уведомлений в Telegram.
+
+    send() только ставит сообщение в очередь. Рабочий поток склеивает пачку
+    сообщений в одно и рассылает его во все чаты параллельно через общую
+    HTTP-сессию, соблюдая retry_after из ответов 429.
+    """
+
+    def __init__(self, token, chat_ids, coalesce_window=COALESCE_WINDOW):
+        self.url = f'https://api.telegram.org/bot{token}/sendMessage'
+        self.chat_ids = list(chat_ids)
+        self.coalesce_window = coalesce_window
+        self._queue = queue.Queue()
+        self._http = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.chat_ids), 1), thread_name_prefix="telegram")
+        self._thread = threading.Thread(target=self._run, name="telegram-dispatcher", daemon=True)
+        self._thread.start()
+
+    def send(self, message):
+        """Ставит сообщение в очередь и сразу возвращает управление."""
+        self._queue.put(str(message))
+        return True
+
+    def flush(self, timeout=5):
+        """Ждет отправки всех сообщений из очереди (например, перед выходом из скрипта)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        while True:
+            messages = [self._queue.get()]
+            # Собираем все, что пришло за окно склейки
+            deadline = time.time() + self.coalesce_window
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    messages.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                for text in self._batch(messages):
+                    list(self._executor.map(lambda chat_id: self._send_to_chat(chat_id, text), self.chat_ids))
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщений в Telegram: {e}")
+            finally:
+                for _ in messages:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _batch(messages):
+        """Склеивает сообщения в тексты не длиннее лимита Telegram."""
+        texts = []
+        current = ""
+        for message in messages:
+            message = message[:MAX_MESSAGE_LENGTH]
+            if current and len(current) + 1 + len(message) > MAX_MESSAGE_LENGTH:
+                texts.append(current)
+                current = message
+            else:
+                current = f"{current}\n{message}" if current else message
+        if current:
+            texts.append(current)
+        return texts
+
+    def _send_to_chat(self, chat_id, text):
+        payload = {'chat_id': chat_id, 'text': text}
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                started = time.perf_counter()
+                response = self._http.post(self.url, json=payload, timeout=10)
+                TELEGRAM_LATENCY.observe(time.perf_counter() - started)
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                    logger.warning(f"Лимит Telegram для чата {chat_id}, повтор через {retry_after} с")
+                    time.sleep(retry_after)
+                    continue
+                response.raise_for_status()
+                logger.info(f"Сообщение отправлено в чат {chat_id}")
+                return True
+            except requests.RequestException as e:
+                logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+                if attempt < MAX_RETRIES:
+                    time.sleep(2 ** attempt)
+        TELEGRAM_ERRORS.inc()
+        return False
+
+
+dispatcher = TelegramDispatcher(TELEGRAM_BOT_TOKEN, CHAT_IDS)
+# Скрипты завершаются сразу после сделки — даем очереди отправиться
+atexit.register(dispatcher.flush)
+
 
 def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
\ No newline at end of file
+    return dispatcher.send(message)
@@ -1,14 +1,16 @@
 from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
 from threading import Thread
 from datetime import datetime, timedelta
+from orderbook_stream import OrderBookStream
+from position_tracker import get_position_tracker
 from open_order_tekprofit_stoploss import open_position_with_protection
+from telegram_message import send_message_to_telegram
 
 # Параметры для открытия ордера
 dollar_value = 10
@@ -32,9 +34,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # API-ключи
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -44,29 +43,16 @@ if not key or not secret:
     exit(1)
 
 # Сессия API
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=10000)
-
-# Глобальный флаг состояния сделки
-is_trade_open = False
+session = get_gateway(key, secret)
 
+# Локальные книги ордеров из WebSocket
+order_book_stream = OrderBookStream(category="linear", depth=50)
 
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            requests.post(url, json=payload).raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+# Позиции из приватного WebSocket
+position_tracker = get_position_tracker(session, key, secret)
 
-
-# Форматирование книги ордеров
-def format_order_book(response):
-    bids = response.get('b', [])
-    asks = response.get('a', [])
-    return bids, asks
+# Глобальный флаг состояния сделки
+is_trade_open = False
 
 
 # Функция отмены всех триггеров по символу
@@ -88,13 +74,18 @@ def cancel_all_triggers(symbol):
 def is_position_closed(symbol):
     global is_trade_open
     try:
-        response = session.get_positions(category="linear", symbol=symbol)
+        # Позиции из приватного WebSocket; REST — только если поток недоступен
+        if position_tracker.running:
+            position = position_tracker.get_position(symbol)
+            positions = [position] if position else []
+        else:
+            response = session.get_positions(category="linear", symbol=symbol)
 
-        if not response or 'result' not in response:
-            logger.error(f"Некорректный ответ от API при проверке позиции для {symbol}: {response}")
-            return False
+            if not response or 'result' not in response:
+                logger.error(f"Некорректный ответ от API при проверке позиции для {symbol}: {response}")
+                return False
 
-        positions = response['result'].get('list', [])
+            positions = response['result'].get('list', [])
 
         if isinstance(positions, list):
             for position in positions:
@@ -119,31 +110,26 @@ def analyze_order_book(symbol):
     logger.info(f"Начат анализ для символа {symbol}. Время окончания: {end_time}")
     send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
 
+    # Книга обновляется из WebSocket, условие проверяется на каждом delta
+    book = order_book_stream.subscribe(symbol)
+    version = 0
+
     try:
         while datetime.now() < end_time:
             if is_trade_open:
                 logger.info("Ожидание закрытия позиции.")
                 while not is_position_closed(symbol):
-                    time.sleep(10)
+                    position_tracker.wait_position_closed(symbol, timeout=10)
                 is_trade_open = False
                 logger.info("Позиция закрыта. Анализ продолжается.")
 
-            response = session.get_orderbook(category="linear", symbol=symbol, limit=50).get('result')
-            if not response:
-                raise ValueError(f"Нет данных для символа {symbol}.")
-
-            bids, asks = format_order_book(response)
-
-            bid_volumes = [float(bid[1]) for bid in bids if len(bid) > 1]
-            ask_volumes = [float(ask[1]) for ask in asks if len(ask) > 1]
+            version = book.wait_update(version, timeout=5)
+            if not book.ready:
+                continue  # Книга еще не получена или ждет нового snapshot
 
-            total_bid_volume = sum(bid_volumes)
-            total_ask_volume = sum(ask_volumes)
+            bid_percentage, ask_percentage = book.percentages()
 
-            bid_percentage = (total_bid_volume / (total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
-            ask_percentage = (total_ask_volume / (total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
-
-            logger.info(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
+            logger.debug(f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%.")
 
             if bid_percentage > 60:
                 send_message_to_telegram(f"Биды превышают 60% для {symbol}. Открытие позиции SELL.")
@@ -154,8 +140,6 @@ def analyze_order_book(symbol):
                 open_position(symbol, "BUY")
                 is_trade_open = True
 
-            time.sleep(10)
-
         logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
         send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
 
@@ -163,11 +147,18 @@ def analyze_order_book(symbol):
         logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
         send_message_to_telegram(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
 
+    finally:
+        order_book_stream.unsubscribe(symbol)
+
 
 # Функция открытия позиции
 def open_position(symbol, side):
     try:
         open_position_with_protection(symbol, side, dollar_value, stop_loss_percent, take_profit_percent)
+        # Ждем позицию в потоке позиций, иначе проверка закрытия сработает до ее появления
+        if not position_tracker.wait_position_opened(symbol, timeout=10):
+            logger.warning(f"Позиция {side} для {symbol} не появилась.")
+            return
         logger.info(f"Позиция {side} для {symbol} успешно открыта.")
     except Exception as e:
         logger.error(f"Ошибка при открытии позиции для {symbol}: {e}")
@@ -1,13 +1,14 @@
 from flask import Flask, request, jsonify
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 from dotenv import load_dotenv
 from pyngrok import ngrok
-import requests
 import logging
 import os
 import time
 from threading import Thread
 from datetime import datetime, timedelta
+from orderbook_stream import OrderBookStream
+from telegram_message import send_message_to_telegram
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,9 +27,6 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не задан. Проверьте файл .env.")
     exit(1)
 
-# Жестко заданный список chat_id
-CHAT_IDS = [1395854084, 525006772]
-
 # Ваши ключи API
 key = os.getenv("API_KEY")
 secret = os.getenv("API_SECRET")
@@ -38,25 +36,10 @@ if not key or not secret:
     exit(1)
 
 # Создание сессии API с увеличением recv_window
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=10000)
-
-# Функция отправки сообщений в Telegram
-def send_message_to_telegram(message):
-    for chat_id in CHAT_IDS:
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {'chat_id': chat_id, 'text': message}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
-
-# Форматирование книги ордеров
-def format_order_book(response):
-    bids = response.get('b')
-    asks = response.get('a')
-    return bids, asks
+session = get_gateway(key, secret)
+
+# Локальные книги ордеров из WebSocket
+order_book_stream = OrderBookStream(category="linear", depth=50)
 
 # Функция анализа книги ордеров
 def analyze_order_book(symbol):
@@ -64,32 +47,21 @@ def analyze_order_book(symbol):
     logger.info(f"Начат анализ для символа {symbol}. Время окончания: {end_time}")
     send_message_to_telegram(f"Начат анализ для монеты {symbol}. Время окончания: {end_time.strftime('%H:%M:%S')}")
 
+    # Книга обновляется из WebSocket, условие проверяется на каждом delta
+    book = order_book_stream.subscribe(symbol)
+    version = 0
+
     try:
         while datetime.now() < end_time:
-            response = session.get_orderbook(
-                category="linear",
-                symbol=symbol,
-                limit=50
-            ).get('result')
-
-            if not response:
-                raise ValueError(f"Нет данных для символа {symbol}.")
-
-            bids, asks = format_order_book(response)
+            version = book.wait_update(version, timeout=5)
+            if not book.ready:
+                continue  # Книга еще не получена или ждет нового snapshot
 
-            # Извлечение объемов
-            bid_volumes = [float(bid[1]) for bid in bids if len(bid) > 1]
-            ask_volumes = [float(ask[1]) for ask in asks if len(ask) > 1]
-
-            total_bid_volume = sum(bid_volumes)
-            total_ask_volume = sum(ask_volumes)
-
-            # Расчет процентов бидов и асков
-            bid_percentage = (total_bid_volume / (total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
-            ask_percentage = (total_ask_volume / (total_bid_volume + total_ask_volume)) * 100 if total_bid_volume + total_ask_volume > 0 else 0
+            # Расчет процентов бидов и асков по локальной книге
+            bid_percentage, ask_percentage = book.percentages()
 
             # Логирование текущих данных
-            logger.info(
+            logger.debug(
                 f"Символ: {symbol}, Биды: {bid_percentage:.2f}%, Аски: {ask_percentage:.2f}%."
             )
 
@@ -103,8 +75,6 @@ def analyze_order_book(symbol):
                 open_position(symbol, "BUY")
                 return
 
-            time.sleep(10)
-
         logger.info(f"Анализ для символа {symbol} завершен. Условия не выполнены.")
         send_message_to_telegram(f"Анализ для монеты {symbol} завершен. Условия не выполнены.")
 
@@ -113,12 +83,12 @@ def analyze_order_book(symbol):
         logger.error(error_message)
         send_message_to_telegram(error_message)
 
+    finally:
+        order_book_stream.unsubscribe(symbol)
+
 # Функция открытия позиции
 def open_position(symbol, side):
     try:
-        # Получение серверного времени
-        server_time = int(time.time() * 1000)
-
         # Настройка параметров заказа
         order_params = {
             "category": "linear",
@@ -128,8 +98,7 @@ def open_position(symbol, side):
             "qty": "1",
             "timeInForce": "IOC",
             "reduceOnly": False,
-            "positionIdx": 0,
-            "timestamp": server_time
+            "positionIdx": 0
         }
 
         # Отправка запроса на размещение ордера
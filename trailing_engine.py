@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bybit_ws import BybitWebSocket, PUBLIC_WS_URLS
+from instruments import format_price, round_price
+from metrics import LOOP_LAG, STOP_UPDATES
+
+# Настройка логирования
+logger = logging.getLogger("TrailingStopEngine")
+
+
+def profit_percent(side, entry_price, current_price):
+    """Прибыль позиции в процентах от цены входа."""
+    if side == "Buy":
+        return (current_price - entry_price) / entry_price * 100
+    return (entry_price - current_price) / entry_price * 100
+
+
+class TrailingPosition:
+    """Состояние трейлинг-стопа одной позиции (правила update_trailing_stop)."""
+
+    def __init__(self, symbol, side, entry_price, move_to_entry_at=1, follow_distance=1, tick_size=0, position_idx=0):
+        self.symbol = symbol
+        self.side = side
+        self.entry_price = entry_price
+        self.move_to_entry_at = move_to_entry_at
+        self.follow_distance = follow_distance
+        self.tick_size = tick_size
+        self.position_idx = position_idx
+        self.highest_price = entry_price  # Для Buy — максимальная достигнутая цена
+        self.lowest_price = entry_price  # Для Sell — минимальная достигнутая цена
+        self.target_stop = None  # Последний рассчитанный стоп
+        self.last_stop = None  # Последний стоп, подтвержденный биржей
+        self.sending = False
+
+    def on_price(self, current_price):
+        """Пересчитывает стоп за O(1). Возвращает новый стоп, если он сдвинулся хотя бы на один тик."""
+        if profit_percent(self.side, self.entry_price, current_price) < self.move_to_entry_at:
+            return None
+
+        if self.side == "Buy":
+            self.highest_price = max(self.highest_price, current_price)
+            new_stop = round_price(self.highest_price * (1 - self.follow_distance / 100), self.tick_size)
+            if self.target_stop is not None and new_stop <= self.target_stop:
+                return None
+        else:
+            self.lowest_price = min(self.lowest_price, current_price)
+            new_stop = round_price(self.lowest_price * (1 + self.follow_distance / 100), self.tick_size)
+            if self.target_stop is not None and new_stop >= self.target_stop:
+                return None
+
+        self.target_stop = new_stop
+        return new_stop
+
+
+class TrailingStopEngine:
+    """Трейлинг-стопы всех открытых позиций в одном компоненте.
+
+    Цены приходят из топика tickers публичного WebSocket, закрытие позиций —
+    из PositionTracker. set_trading_stop отправляется в небольшом пуле потоков
+    и только при сдвиге стопа; за время запроса по символу копится только последний стоп.
+    """
+
+    def __init__(self, session, position_tracker, instrument_registry, category="linear", max_workers=4):
+        self.session = session
+        self.position_tracker = position_tracker
+        self.instrument_registry = instrument_registry
+        self.category = category
+        self.positions = {}  # символ -> TrailingPosition
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trailing-stop")
+        self._ws = BybitWebSocket(PUBLIC_WS_URLS[category], on_message=self._on_ticker)
+        position_tracker.add_listener(self._on_private_event)
+
+    def add_position(self, symbol, move_to_entry_at=1, follow_distance=1, timeout=10):
+        """Берет позицию под управление. Возвращает False, если позиция не открылась за timeout секунд."""
+        position = self.position_tracker.wait_position_opened(symbol, timeout)
+        if not position:
+            logger.warning(f"Нет открытой позиции по {symbol}, трейлинг-стоп не обновляется.")
+            return False
+
+        entry_price = float(position.get("avgPrice") or 0)
+        if entry_price == 0:
+            logger.error(f"API не вернул avgPrice (цену входа) для {symbol}")
+            return False
+
+        instrument = self.instrument_registry.get(symbol, self.category) or {}
+        with self._lock:
+            self.positions[symbol] = TrailingPosition(
+                symbol,
+                position["side"],
+                entry_price,
+                move_to_entry_at,
+                follow_distance,
+                tick_size=instrument.get("tickSize", 0),
+                position_idx=int(position.get("positionIdx", 0))
+            )
+        self._ws.start()
+        self._ws.subscribe([f"tickers.{symbol}"])
+        logger.info(f"Мониторинг трейлинг-стопа {symbol}, вход: {entry_price}")
+        return True
+
+    def remove_position(self, symbol):
+        with self._lock:
+            if self.positions.pop(symbol, None) is None:
+                return
+        self._ws.unsubscribe([f"tickers.{symbol}"])
+        logger.info(f"Позиция {symbol} закрыта. Остановка трейлинг-стопа.")
+
+    def positions_count(self):
+        return len(self.positions)
+
+    def on_price(self, symbol, price):
+        """Обрабатывает новую цену символа."""
+        with self._lock:
+            position = self.positions.get(symbol)
+            if position is None or position.on_price(price) is None or position.sending:
+                return
+            position.sending = True
+        self._executor.submit(self._send_stop, position)
+
+    def _send_stop(self, position):
+        while True:
+            with self._lock:
+                stop = position.target_stop
+            try:
+                response = self.session.set_trading_stop(
+                    category=self.category,
+                    symbol=position.symbol,
+                    stopLoss=format_price(stop, position.tick_size),
+                    positionIdx=position.position_idx
+                )
+                if response.get("retCode") == 0:
+                    logger.info(f"Обновлен трейлинг-стоп {position.symbol} на {stop}")
+                    position.last_stop = stop
+                    STOP_UPDATES.labels("ok").inc()
+                else:
+                    logger.error(f"Ошибка обновления стоп-лосса: {response.get('retMsg')}")
+                    STOP_UPDATES.labels("error").inc()
+            except Exception as e:
+                logger.error(f"Ошибка обновления стоп-лосса {position.symbol}: {e}")
+                STOP_UPDATES.labels("error").inc()
+
+            with self._lock:
+                if position.last_stop != stop:
+                    # Запрос не прошел: следующий тик рассчитает стоп заново
+                    position.target_stop = position.last_stop
+                if position.target_stop == position.last_stop or self.positions.get(position.symbol) is not position:
+                    position.sending = False
+                    return
+
+    def _on_ticker(self, message):
+        data = message.get("data", {})
+        if message.get("ts"):
+            LOOP_LAG.labels("tickers").observe(time.time() - message["ts"] / 1000)
+        price = data.get("lastPrice")
+        if price:  # В delta-сообщениях цены может не быть, если она не изменилась
+            self.on_price(data.get("symbol"), float(price))
+
+    def _on_private_event(self, topic, data):
+        if not topic.startswith("position"):
+            return
+        for position in data:
+            if position.get("symbol") in self.positions and float(position.get("size") or 0) == 0:
+                self.remove_position(position["symbol"])
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from pybit.unified_trading import HTTP
+from bybit_gateway import get_gateway
 
 # Загрузка переменных из файла .env
 load_dotenv()
@@ -11,13 +11,8 @@ API_SECRET = os.getenv("API_SECRET")
 if not API_KEY or not API_SECRET:
     raise ValueError("API_KEY или API_SECRET отсутствуют в .env файле")
 
-# Инициализация сессии
-session = HTTP(
-    testnet=False,  # False для боевого режима
-    api_key=API_KEY,
-    api_secret=API_SECRET,
-    recv_window=15000  # Увеличенное окно времени
-)
+# Общая сессия подписывает запросы временем сервера Bybit, поэтому достаточно стандартного окна
+session = get_gateway(API_KEY, API_SECRET, testnet=False)  # False для боевого режима
 
 # Параметры торговли
 USDT_AMOUNT = 10  # Сумма в USDT для открытия позиции
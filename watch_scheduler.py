@@ -0,0 +1,152 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from metrics import EVALUATE_TIME, LOOP_LAG
+
+# Настройка логирования
+logger = logging.getLogger("WatchScheduler")
+
+
+class WatchScheduler:
+    """Центральный планировщик наблюдения за символами.
+
+    Все наблюдения обслуживаются одним потоком-диспетчером, который получает
+    обновления книг из OrderBookStream и вызывает evaluate(symbol, book).
+    Долгие действия (открытие позиции) выполняются в ограниченном пуле потоков.
+    """
+
+    def __init__(self, stream, evaluate, on_expire=None, duration=timedelta(hours=1), max_workers=4):
+        self.stream = stream
+        self.evaluate = evaluate
+        self.on_expire = on_expire
+        self.duration = duration
+        self.watches = {}  # символ -> {"expires_at", "updates", "lag_ms", "last_eval"}
+        self._pending = set()  # символы, уже стоящие в очереди на оценку
+        self._deadlines = []  # куча (expires_at, символ); продленные сроки проверяются при извлечении
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="watch-worker")
+        self._thread = None
+        stream.add_listener(self._on_book_update)
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name="watch-dispatcher", daemon=True)
+        self._thread.start()
+
+    def watch(self, symbol, duration=None):
+        """Начинает наблюдение за символом. Повторный вызов только продлевает срок.
+
+        Возвращает True, если наблюдение новое.
+        """
+        self.start()
+        expires_at = datetime.now() + (duration or self.duration)
+        with self._lock:
+            watch = self.watches.get(symbol)
+            if watch:
+                watch["expires_at"] = max(watch["expires_at"], expires_at)
+                logger.info(f"Символ {symbol} уже отслеживается, срок продлен до {watch['expires_at']}")
+                return False
+            self.watches[symbol] = {"expires_at": expires_at, "updates": 0, "lag_ms": None, "last_eval": None}
+            heapq.heappush(self._deadlines, (expires_at, symbol))
+        self.stream.subscribe(symbol)
+        return True
+
+    def unwatch(self, symbol):
+        with self._lock:
+            if self.watches.pop(symbol, None) is None:
+                return
+        self.stream.unsubscribe(symbol)
+
+    def submit(self, fn, *args):
+        """Выполняет долгое действие в пуле, не блокируя диспетчер."""
+        return self._executor.submit(fn, *args)
+
+    def watched_count(self):
+        return len(self.watches)
+
+    def stats(self):
+        """Состояние наблюдений: срок, число оценок и задержка от времени биржи до оценки."""
+        with self._lock:
+            return {
+                symbol: {
+                    "expires_at": watch["expires_at"].isoformat(timespec="seconds"),
+                    "updates": watch["updates"],
+                    "lag_ms": watch["lag_ms"],
+                    "last_eval": watch["last_eval"],
+                }
+                for symbol, watch in self.watches.items()
+            }
+
+    def _on_book_update(self, symbol, book, message):
+        # Вызывается из потока WebSocket: только ставим символ в очередь,
+        # несколько обновлений одного символа сливаются в одну оценку
+        if symbol not in self.watches:
+            return
+        with self._lock:
+            if symbol in self._pending:
+                return
+            self._pending.add(symbol)
+        self._queue.put(symbol)
+
+    def _run(self):
+        while True:
+            try:
+                symbol = self._queue.get(timeout=1)
+            except queue.Empty:
+                symbol = None
+
+            if symbol is not None:
+                with self._lock:
+                    self._pending.discard(symbol)
+                self._evaluate(symbol)
+
+            self._expire()
+
+    def _evaluate(self, symbol):
+        watch = self.watches.get(symbol)
+        book = self.stream.get_book(symbol)
+        if not watch or not book or not book.ready:
+            return
+        started = time.perf_counter()
+        try:
+            self.evaluate(symbol, book)
+        except Exception as e:
+            logger.error(f"Ошибка при анализе книги ордеров для {symbol}: {e}")
+        EVALUATE_TIME.observe(time.perf_counter() - started)
+        now = time.time()
+        watch["updates"] += 1
+        watch["last_eval"] = round(now, 3)
+        if book.ts:
+            watch["lag_ms"] = int(now * 1000 - book.ts)
+            LOOP_LAG.labels("watch").observe(watch["lag_ms"] / 1000)
+
+    def _expire(self):
+        # Проверяется только ближайший срок: O(1) на обновление, O(log N) на истекшее наблюдение
+        now = datetime.now()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, symbol = heapq.heappop(self._deadlines)
+                watch = self.watches.get(symbol)
+                if watch is None:
+                    continue
+                if watch["expires_at"] > now:
+                    # Срок продлен повторным вебхуком
+                    heapq.heappush(self._deadlines, (watch["expires_at"], symbol))
+                else:
+                    expired.append(symbol)
+        for symbol in expired:
+            self.unwatch(symbol)
+            if self.on_expire:
+                try:
+                    self.on_expire(symbol)
+                except Exception as e:
+                    logger.error(f"Ошибка завершения наблюдения за {symbol}: {e}")